@@ -0,0 +1,159 @@
+import heapq
+from itertools import groupby
+from sqlalchemy import bindparam, delete, func, inspect, insert, select
+from models import AvailabilitySummary, Match
+import statements
+
+# Open slots per (date, location), kept in AvailabilitySummary so a read is
+# a primary key range scan instead of an aggregation over every match.
+# record_change() calls record() for each write, inside the write's
+# transaction, with the match still holding its pre-flush state.
+
+SUMMARY_RANGE = (
+    select(
+        AvailabilitySummary.date,
+        AvailabilitySummary.location,
+        AvailabilitySummary.matches,
+        AvailabilitySummary.max_players,
+        AvailabilitySummary.joined_players,
+    )
+    .where(
+        AvailabilitySummary.date >= bindparam("start"),
+        AvailabilitySummary.date <= bindparam("end"),
+        AvailabilitySummary.matches > 0,
+    )
+    .order_by(AvailabilitySummary.date, AvailabilitySummary.location)
+)
+
+FULL_AGGREGATE = select(
+    Match.date,
+    Match.location,
+    func.count(),
+    func.sum(Match.max_players),
+    func.sum(Match.joined_players),
+).group_by(Match.date, Match.location)
+
+
+def _previous(match, name):
+    # Value as last flushed; equal to the current one if untouched since
+    history = inspect(match).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(match, name)
+
+
+def _contribution(match, value) -> tuple:
+    key = (value(match, "date"), value(match, "location"))
+    return key, (1, value(match, "max_players"), value(match, "joined_players"))
+
+
+def record(session, kind: str, match):
+    """Move the match's contribution between buckets by this change."""
+    deltas = {}
+    if kind != "created":
+        key, totals = _contribution(match, _previous)
+        deltas[key] = tuple(-n for n in totals)
+    if kind != "deleted":
+        key, totals = _contribution(match, getattr)
+        old = deltas.get(key, (0, 0, 0))
+        deltas[key] = tuple(a + b for a, b in zip(old, totals))
+    conn = session.connection()
+    for (day, location), (matches, max_players, joined) in deltas.items():
+        if not (matches or max_players or joined):
+            # A join or leave that didn't move the count (promotion)
+            continue
+        params = {"date": day, "location": location}
+        conn.execute(
+            statements.ADJUST_AVAILABILITY,
+            dict(
+                params,
+                matches=matches,
+                max_players=max_players,
+                joined_players=joined,
+            ),
+        )
+        if matches < 0:
+            conn.execute(statements.DROP_EMPTY_AVAILABILITY, params)
+
+
+def summary(session, start, end) -> list:
+    rows = session.connection().execute(SUMMARY_RANGE, {"start": start, "end": end})
+    return _summary_dicts(rows)
+
+
+def merged_summary(sessions, start, end) -> list:
+    """summary() over several shards, adding up buckets present in more than one."""
+    params = {"start": start, "end": end}
+    streams = [s.connection().execute(SUMMARY_RANGE, params) for s in sessions]
+    merged = heapq.merge(*streams, key=lambda r: (r[0], r[1]))
+    rows = (
+        (d, location, *(sum(column) for column in zip(*(r[2:] for r in group))))
+        for (d, location), group in groupby(merged, key=lambda r: (r[0], r[1]))
+    )
+    return _summary_dicts(rows)
+
+
+def _summary_dicts(rows) -> list:
+    return [
+        {
+            "date": d.isoformat(),
+            "location": location,
+            "matches": matches,
+            "open_slots": max(0, max_players - joined),
+            "joined_players": joined,
+            "max_players": max_players,
+        }
+        for d, location, matches, max_players, joined in rows
+    ]
+
+
+def _aggregate(conn) -> dict:
+    return {(d, loc): (n, mx, j) for d, loc, n, mx, j in conn.execute(FULL_AGGREGATE)}
+
+
+def _stored(conn) -> dict:
+    rows = conn.execute(
+        select(
+            AvailabilitySummary.date,
+            AvailabilitySummary.location,
+            AvailabilitySummary.matches,
+            AvailabilitySummary.max_players,
+            AvailabilitySummary.joined_players,
+        ).where(AvailabilitySummary.matches > 0)
+    )
+    return {(d, loc): (n, mx, j) for d, loc, n, mx, j in rows}
+
+
+def verify(conn) -> list:
+    """Buckets whose stored totals differ from a full aggregation.
+
+    Each entry is ((date, location), stored, expected) with totals as
+    (matches, max_players, joined_players), or None where a side is missing.
+    """
+    stored, expected = _stored(conn), _aggregate(conn)
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(stored.keys() | expected.keys())
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+def rebuild(conn) -> int:
+    """Replace the summary with a full aggregation; returns the bucket count."""
+    buckets = _aggregate(conn)
+    conn.execute(delete(AvailabilitySummary))
+    if buckets:
+        conn.execute(
+            insert(AvailabilitySummary),
+            [
+                {
+                    "date": d,
+                    "location": loc,
+                    "matches": n,
+                    "max_players": mx,
+                    "joined_players": j,
+                }
+                for (d, loc), (n, mx, j) in buckets.items()
+            ],
+        )
+    return len(buckets)
@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram
+from maintenance import WriteLatency
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Online backups of a live database: python cli.py backup, POST /admin/backup.
+#
+# Rollback-journal databases are copied with SQLite's backup API a few pages
+# per step. Each step holds a read lock only while it copies, so a writer
+# waits at most one step; between steps the copy sleeps, and keeps sleeping
+# while writes are slower than BACKUP_MAX_WRITE_MS. WAL databases use
+# VACUUM INTO instead: its read transaction sees a snapshot and never blocks
+# writers, whereas the backup API would restart after every foreign write.
+# The copy is then gzipped to the target with a sha256sum-style sidecar.
+
+BACKUP_SECONDS = Histogram("sqlite_backup_seconds", "Duration of online backups")
+BACKUP_RUNS = Counter(
+    "sqlite_backup_runs", "Online backups by outcome (ok, error)", ["outcome"]
+)
+BACKUP_PROGRESS = Gauge(
+    "sqlite_backup_progress", "Fraction of pages copied by the current backup"
+)
+BACKUP_BYTES = Gauge("sqlite_backup_bytes", "Compressed size of the last backup")
+BACKUP_LAST_SUCCESS = Gauge(
+    "sqlite_backup_last_success_timestamp_seconds", "When the last backup finished"
+)
+BACKUP_PAUSED = Counter(
+    "sqlite_backup_paused_seconds", "Time backups waited for slow writes to pass"
+)
+
+# Stepped copies restarted this often (something kept writing) finish in one
+# pass instead, holding the read lock for the whole copy
+MAX_RESTARTS = 5
+CHUNK_SIZE = 1 << 20
+
+
+class BackupRunning(Exception):
+    """Raised when a backup is requested while another one runs."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+class _Digesting:
+    """Write-only file wrapper hashing everything written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def default_target(region: Optional[str] = None) -> str:
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    name = f"app-{region}-{stamp}" if region else f"app-{stamp}"
+    return os.path.join(settings.BACKUP_DIR, f"{name}.db.gz")
+
+
+class Backups:
+    """Runs one backup at a time and keeps the state of the last one."""
+
+    def __init__(self):
+        self.latency = WriteLatency()
+        self.status = {"state": "idle"}
+        self._lock = threading.Lock()
+        self._tracked = set()
+
+    def run(self, engine, target: str) -> dict:
+        """Back up the engine's database to target now; returns the result."""
+        if not self._lock.acquire(blocking=False):
+            raise BackupRunning()
+        try:
+            return self._run(engine, target)
+        finally:
+            self._lock.release()
+
+    def start(self, jobs) -> dict:
+        """Run [(engine, target), ...] one after the other in the background."""
+        if not self._lock.acquire(blocking=False):
+            raise BackupRunning()
+        self.status = {"state": "running", "targets": [t for _, t in jobs]}
+
+        def work():
+            try:
+                for engine, target in jobs:
+                    self._run(engine, target)
+            except Exception:
+                # Logged and counted by _run
+                pass
+            finally:
+                self._lock.release()
+
+        threading.Thread(target=work, name="sqlite-backup", daemon=True).start()
+        return self.status
+
+    def _run(self, engine, target: str) -> dict:
+        if id(engine) not in self._tracked:
+            self.latency.track(engine)
+            self._tracked.add(id(engine))
+        self.status = {"state": "running", "target": target, "progress": 0.0}
+        BACKUP_PROGRESS.set(0)
+        started = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        copy = f"{target}.db.partial"
+        try:
+            result = self._copy(engine, copy)
+            result.update(_compress(copy, target))
+        except Exception as e:
+            logger.exception("Backup to %s failed", target)
+            BACKUP_RUNS.labels("error").inc()
+            self.status = {"state": "error", "target": target, "error": str(e)}
+            for leftover in (copy, f"{target}.partial"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        os.remove(copy)
+        seconds = time.perf_counter() - started
+        BACKUP_SECONDS.observe(seconds)
+        BACKUP_RUNS.labels("ok").inc()
+        BACKUP_BYTES.set(result["bytes"])
+        BACKUP_LAST_SUCCESS.set(time.time())
+        BACKUP_PROGRESS.set(1)
+        result.update(target=target, seconds=round(seconds, 3))
+        self.status = {"state": "ok", **result}
+        logger.info("Backup written to %s: %s", target, result)
+        return result
+
+    def _copy(self, engine, path: str) -> dict:
+        raw = engine.raw_connection()
+        try:
+            source = raw.driver_connection
+            mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+            if mode.lower() == "wal":
+                source.execute("VACUUM INTO ?", (path,))
+                return {"method": "vacuum_into"}
+            dest = sqlite3.connect(path)
+            try:
+                return self._stepped(source, dest)
+            finally:
+                dest.close()
+        finally:
+            raw.close()
+
+    def _stepped(self, source, dest) -> dict:
+        state = {"steps": 0, "restarts": 0, "remaining": None}
+
+        def progress(status, remaining, total):
+            state["steps"] += 1
+            if state["remaining"] is not None and remaining > state["remaining"]:
+                state["restarts"] += 1
+                if state["restarts"] > MAX_RESTARTS:
+                    raise _Restarted()
+            state["remaining"] = remaining
+            done = 1 - remaining / total if total else 1.0
+            self.status["progress"] = round(done, 3)
+            BACKUP_PROGRESS.set(done)
+            if remaining:
+                self._pause()
+
+        try:
+            source.backup(dest, pages=settings.BACKUP_PAGES, progress=progress)
+        except _Restarted:
+            logger.warning("Backup kept restarting, copying in a single pass")
+            source.backup(dest)
+            method = "single_pass"
+        else:
+            method = "stepped"
+        return {
+            "method": method,
+            "steps": state["steps"],
+            "restarts": state["restarts"],
+        }
+
+    def _pause(self):
+        time.sleep(settings.BACKUP_SLEEP_MS / 1000)
+        waited = 0.0
+        while self.latency.busy(settings.BACKUP_MAX_WRITE_MS):
+            time.sleep(settings.BACKUP_SLEEP_MS / 1000)
+            waited += settings.BACKUP_SLEEP_MS / 1000
+        if waited:
+            BACKUP_PAUSED.inc(waited)
+
+
+def _compress(path: str, target: str) -> dict:
+    """gzip path to target through a .partial file, plus target.sha256."""
+    partial = f"{target}.partial"
+    with open(path, "rb") as src, open(partial, "wb") as out:
+        digesting = _Digesting(out)
+        with gzip.GzipFile(
+            filename=os.path.basename(target)[: -len(".gz")],
+            mode="wb",
+            fileobj=digesting,
+            compresslevel=settings.BACKUP_COMPRESSLEVEL,
+        ) as gz:
+            shutil.copyfileobj(src, gz, CHUNK_SIZE)
+        out.flush()
+        os.fsync(out.fileno())
+        size = out.tell()
+    os.replace(partial, target)
+    checksum = digesting.sha256.hexdigest()
+    with open(f"{target}.sha256", "w") as f:
+        f.write(f"{checksum}  {os.path.basename(target)}\n")
+    return {"bytes": size, "sha256": checksum}
+
+
+backups = Backups()
@@ -0,0 +1,105 @@
+"""Schedule-conflict check cost for users with long participation histories.
+
+    python benchmarks/bench_conflicts.py [participations ...]
+
+Compares the indexed span query in schedule.has_conflict with the naive
+approach of loading every match the user joined and comparing in Python.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+from models import Match, MatchParticipant, User  # noqa: E402
+from schedule import has_conflict, match_span  # noqa: E402
+
+REPEAT = 200
+
+
+# User.id of the player with the long history
+HEAVY = 2
+
+
+def seed(engine, n):
+    base = datetime(2020, 1, 1, 18)
+    matches, participants = [], []
+    for i in range(n):
+        start = base + timedelta(days=i)
+        matches.append(
+            {
+                "id": i + 1,
+                "date": start.date(),
+                "time": start.time(),
+                "location": "Park",
+                "max_players": 10,
+                "joined_players": 1,
+                "organizer_id": 1,
+            }
+        )
+        starts_at, ends_at = match_span(start.date(), start.time())
+        participants.append(
+            {
+                "match_id": i + 1,
+                "user_id": HEAVY,
+                "starts_at": starts_at,
+                "ends_at": ends_at,
+            }
+        )
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [
+                {"id": 1, "external_id": "org", "first_name": "A", "last_name": "B"},
+                {
+                    "id": HEAVY,
+                    "external_id": "heavy",
+                    "first_name": "H",
+                    "last_name": "U",
+                },
+            ],
+        )
+        conn.execute(Match.__table__.insert(), matches)
+        conn.execute(MatchParticipant.__table__.insert(), participants)
+    return base + timedelta(days=n // 2, hours=1)
+
+
+def naive(session, user_id, start, end):
+    rows = session.execute(
+        select(Match.date, Match.time)
+        .join(MatchParticipant, MatchParticipant.match_id == Match.id)
+        .where(MatchParticipant.user_id == user_id)
+    )
+    for d, t in rows:
+        s, e = match_span(d, t)
+        if s < end and e > start:
+            return True
+    return False
+
+
+def main(sizes):
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            SQLModel.metadata.create_all(engine)
+            probe = seed(engine, n)
+            end = probe + timedelta(minutes=90)
+            with Session(engine) as session:
+                for name, fn in (("indexed", has_conflict), ("naive", naive)):
+                    assert fn(session, HEAVY, probe, end)
+                    t0 = time.perf_counter()
+                    for _ in range(REPEAT):
+                        fn(session, HEAVY, probe, end)
+                    per_call = (time.perf_counter() - t0) / REPEAT
+                    print(f"{n:>7} participations {name:>8}: {per_call * 1e6:9.1f} us")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000])
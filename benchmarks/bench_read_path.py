@@ -0,0 +1,95 @@
+"""Compare the ORM read path with the Core column read path in queries.py.
+
+    python benchmarks/bench_read_path.py            # 10k and 100k rows
+    python benchmarks/bench_read_path.py 50000      # custom sizes
+
+For every size a temporary SQLite file is seeded, then each path lists all
+matches and serializes them to JSON. Reported: best-of-N wall time and the
+tracemalloc peak of a single run.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, time as dtime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine, select  # noqa: E402
+from models import Match, MatchRead, User  # noqa: E402
+from queries import dump_rows, list_match_rows  # noqa: E402
+
+REPEAT = 3
+_match_list = TypeAdapter(list[MatchRead])
+
+
+def seed(engine, n):
+    start = date(2025, 1, 1)
+    rows = [
+        {
+            "date": start + timedelta(days=i % 365),
+            "time": dtime(8 + i % 14),
+            "location": f"Pitch {i % 200}",
+            "max_players": 10 + i % 12,
+            "joined_players": i % 10,
+            "organizer_id": 1 + i % 5000,
+        }
+        for i in range(n)
+    ]
+    organizers = [
+        {
+            "id": 1 + i,
+            "external_id": f"user-{i}",
+            "first_name": "Alice",
+            "last_name": "Organizer",
+        }
+        for i in range(5000)
+    ]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), organizers)
+        conn.execute(Match.__table__.insert(), rows)
+
+
+def orm_path(engine):
+    with Session(engine) as session:
+        matches = session.exec(select(Match).order_by(Match.date, Match.time)).all()
+        return _match_list.dump_json([MatchRead.model_validate(m) for m in matches])
+
+
+def core_path(engine):
+    with Session(engine) as session:
+        return dump_rows(list_match_rows(session))
+
+
+def measure(fn, engine):
+    best = float("inf")
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        fn(engine)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(sizes):
+    print(f"{'rows':>8} {'path':>5} {'time ms':>10} {'peak MiB':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            SQLModel.metadata.create_all(engine)
+            seed(engine, n)
+            for name, fn in (("orm", orm_path), ("core", core_path)):
+                best, peak = measure(fn, engine)
+                print(f"{n:>8} {name:>5} {best * 1000:>10.1f} {peak / 2**20:>10.1f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,70 @@
+"""Top-k recommendation latency over an in-memory snapshot of open matches.
+
+    python benchmarks/bench_recommend.py [candidates]
+
+Fills an OpenMatchSnapshot directly (no database) and times top_k with
+NumPy when it is installed and with the pure Python fallback.
+"""
+
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import recommend  # noqa: E402
+
+REPEAT = 20
+
+
+def fill(snapshot, n):
+    rng = random.Random(42)
+    today = date.today()
+    for mid in range(1, n + 1):
+        d = today + timedelta(days=rng.randrange(60))
+        start = (
+            recommend.start_minute(d, datetime.min.time()) + rng.randrange(8, 23) * 60
+        )
+        max_players = rng.randrange(6, 23)
+        snapshot._append(
+            mid, start, rng.randrange(max_players), max_players, f"Pitch {mid % 500}"
+        )
+    snapshot.version = 0
+
+
+def run(snapshot, start, end):
+    return snapshot.top_k(
+        10,
+        start,
+        end,
+        preferred_locations=["Pitch 7", "Pitch 42"],
+        history_locations={"Pitch 7": 0.5, "Pitch 99": 0.3, "Pitch 3": 0.2},
+        mean_minute_of_day=18 * 60,
+        exclude={1, 2, 3},
+    )
+
+
+def main(n):
+    snapshot = recommend.OpenMatchSnapshot()
+    fill(snapshot, n)
+    start = recommend.to_minute(datetime.now())
+    end = start + 30 * 1440
+    numpy = recommend.np
+    for name, np in (("numpy", numpy), ("python", None)):
+        if name == "numpy" and numpy is None:
+            print("numpy: not installed")
+            continue
+        recommend.np = np
+        run(snapshot, start, end)
+        t0 = time.perf_counter()
+        for _ in range(REPEAT):
+            run(snapshot, start, end)
+        per_call = (time.perf_counter() - t0) / REPEAT
+        print(f"{name:>7}: {per_call * 1000:7.2f} ms for top-10 of {n} candidates")
+    recommend.np = numpy
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
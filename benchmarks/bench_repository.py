@@ -0,0 +1,92 @@
+"""Cost of the core endpoints per match store (MATCH_STORE).
+
+    python benchmarks/bench_repository.py [matches]
+
+Drives the app in process with FastAPI's TestClient: create the matches,
+join and leave each once, then list them. The "sqlmodel" store runs on an
+in-memory SQLite database and the "memory" store on the dict-backed
+repository, so the difference is the storage layer and what remains of
+the "memory" time is the application layer (routing, validation,
+idempotency, serialization).
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+import changes  # noqa: E402
+from db import get_session  # noqa: E402
+from main import app  # noqa: E402
+import settings  # noqa: E402
+
+LISTS = 20
+
+
+def headers(uid):
+    return {"X-User-Id": uid, "X-First-Name": "Bench", "X-Last-Name": "User"}
+
+
+def run(store, n):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+
+    def override_get_session():
+        with Session(engine) as s:
+            yield s
+
+    settings.MATCH_STORE = store
+    app.dependency_overrides[get_session] = override_get_session
+    changes.reset()
+    timings = {}
+    with TestClient(app) as client:
+        t = time.perf_counter()
+        ids = [
+            client.post(
+                "/matches",
+                json={
+                    "date": f"2026-01-{i % 28 + 1:02d}",
+                    "time": f"{8 + i % 12:02d}:00:00",
+                    "location": f"Pitch {i % 20}",
+                    "max_players": 10,
+                },
+                headers=headers("org"),
+            ).json()["id"]
+            for i in range(n)
+        ]
+        timings["create"] = (time.perf_counter() - t) / n
+        t = time.perf_counter()
+        for i, mid in enumerate(ids):
+            client.put(f"/matches/{mid}/join", headers=headers(f"u{i % 50}"))
+            client.put(f"/matches/{mid}/leave", headers=headers(f"u{i % 50}"))
+        timings["join+leave"] = (time.perf_counter() - t) / n
+        t = time.perf_counter()
+        for i in range(LISTS):
+            # A write in between, so every list is built rather than cached
+            client.put(f"/matches/{ids[i]}/join", headers=headers("lister"))
+            client.get("/matches")
+        timings["join+list"] = (time.perf_counter() - t) / LISTS
+    app.dependency_overrides.clear()
+    changes.reset()
+    return timings
+
+
+def main(n):
+    print(f"{n} matches, ms per operation")
+    print(f"{'store':<10} {'create':>10} {'join+leave':>12} {'join+list':>12}")
+    for store in ("sqlmodel", "memory"):
+        t = run(store, n)
+        print(
+            f"{store:<10} {t['create'] * 1e3:>10.3f} {t['join+leave'] * 1e3:>12.3f}"
+            f" {t['join+list'] * 1e3:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
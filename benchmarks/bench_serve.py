@@ -0,0 +1,137 @@
+"""Throughput and latency of GET /matches under each serve.py profile.
+
+    python benchmarks/bench_serve.py [seconds] [concurrency]
+
+Starts the app once per profile on a copy of a seeded database, drives
+it with concurrent keep-alive clients for a fixed time and prints
+requests per second with p50/p99 latency.
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from datetime import time as clock
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sqlmodel import SQLModel, create_engine  # noqa: E402
+from models import Match, User  # noqa: E402
+
+PORT = 8765
+MATCHES = 500
+
+
+def seed(path):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            {"id": 1, "external_id": "org", "first_name": "A", "last_name": "B"},
+        )
+        conn.execute(
+            Match.__table__.insert(),
+            [
+                {
+                    "date": date(2025, 12, i % 28 + 1),
+                    "time": clock(8 + i % 12),
+                    "location": f"Pitch {i % 7}",
+                    "max_players": 10,
+                    "joined_players": i % 10,
+                    "organizer_id": 1,
+                }
+                for i in range(MATCHES)
+            ],
+        )
+
+
+def wait_ready(timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+def drive(seconds, concurrency):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def client():
+        local = []
+        with httpx.Client(base_url=f"http://127.0.0.1:{PORT}") as c:
+            while time.monotonic() < stop:
+                t0 = time.perf_counter()
+                c.get("/matches")
+                local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies
+
+
+def run_profile(profile, workdir, seconds, concurrency):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            str(ROOT / "serve.py"),
+            "--profile",
+            profile,
+            "--port",
+            str(PORT),
+            "--drain-seconds",
+            "0",
+        ],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready()
+        drive(1, concurrency)  # warm up caches and connections
+        latencies = sorted(drive(seconds, concurrency))
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    rps = len(latencies) / seconds
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{profile:>10}  {rps:8.0f} req/s  p50 {p50:6.2f} ms  p99 {p99:7.2f} ms")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    with tempfile.TemporaryDirectory() as tmp:
+        seed(Path(tmp) / "app.db")
+        # serve.py is run from the temp dir so it uses the seeded app.db
+        shutil.copytree(ROOT / "static", Path(tmp) / "static")
+        print(f"GET /matches, {MATCHES} matches, {concurrency} clients, {seconds}s")
+        for profile in ("dev", "production"):
+            run_profile(profile, tmp, seconds, concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Write throughput with matches spread over 1, 2 and 4 region shards.
+
+    python benchmarks/bench_shards.py [writers]
+
+Each writer process creates matches through the same path as POST /matches
+(id picked by sharding.next_match_id, record_change, commit), writer i in
+shard i % shards. Writers are processes, like serve.py workers, so the
+GIL is not what is measured: one SQLite file takes one writer at a time
+and commits only overlap once they land in different files.
+"""
+
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+from datetime import date, time as clock
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+from changes import record_change  # noqa: E402
+from models import Match, User  # noqa: E402
+from sharding import next_match_id  # noqa: E402
+
+WRITES_PER_WRITER = 300
+
+
+def writer(path, index, n):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 60})
+    with Session(engine) as session:
+        for i in range(n):
+            m = Match(
+                date=date(2026, 1, 1 + i % 28),
+                time=clock(18),
+                location="Park",
+                max_players=10,
+                organizer_id=1,
+            )
+            m.id = next_match_id(index)
+            session.add(m)
+            session.flush()
+            record_change(session, "created", m)
+            session.commit()
+
+
+def run(tmp, n_shards, writers):
+    paths = [f"{tmp}/shard{n_shards}-{i}.db" for i in range(n_shards)]
+    for path in paths:
+        engine = create_engine(f"sqlite:///{path}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(User(id=1, external_id="org", first_name="A", last_name="B"))
+            session.commit()
+    procs = [
+        Process(
+            target=writer,
+            args=(paths[w % n_shards], w % n_shards, WRITES_PER_WRITER),
+        )
+        for w in range(writers)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    return writers * WRITES_PER_WRITER / elapsed
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    with tempfile.TemporaryDirectory() as tmp:
+        base = None
+        for n_shards in (1, 2, 4):
+            rate = run(tmp, n_shards, writers)
+            base = base or rate
+            print(
+                f"{n_shards} shard(s), {writers} writers: "
+                f"{rate:8.0f} writes/s  ({rate / base:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
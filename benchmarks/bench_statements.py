@@ -0,0 +1,103 @@
+"""Python-side cost of the participant lookup: rebuilt select vs pre-built.
+
+    python benchmarks/bench_statements.py [iterations]
+
+All three variants run the same Core select(MatchParticipant.id) on the
+same connection, against an in-memory SQLite database with a handful of
+rows, so they differ only in how the statement is built and cached:
+rebuilt on every call, as a lambda_stmt, or built once at import
+(statements.PARTICIPANT_ID).
+
+With 20k lookups the pre-built statement took about a quarter of the time
+of the rebuilt one (~48 vs ~200 us/call), and lambda_stmt was the slowest
+(~340 us/call): analysing the lambda's closure on every call costs more
+than building a statement this small.
+"""
+
+import sys
+import time
+from datetime import date, time as dtime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import lambda_stmt, select  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+from models import Match, MatchParticipant, User  # noqa: E402
+import statements  # noqa: E402
+
+
+def rebuilt(conn, match_id, user_id):
+    return conn.execute(
+        select(MatchParticipant.id).where(
+            MatchParticipant.match_id == match_id, MatchParticipant.user_id == user_id
+        )
+    ).first()
+
+
+def lambda_statement(conn, match_id, user_id):
+    stmt = lambda_stmt(
+        lambda: select(MatchParticipant.id).where(
+            MatchParticipant.match_id == match_id, MatchParticipant.user_id == user_id
+        )
+    )
+    return conn.execute(stmt).first()
+
+
+def prebuilt(conn, match_id, user_id):
+    params = {"match_id": match_id, "user_id": user_id}
+    return conn.execute(statements.PARTICIPANT_ID, params).first()
+
+
+def cache_counts():
+    return {
+        label: statements.COMPILED_CACHE.labels(label)._value.get()
+        for label in ("hit", "miss")
+    }
+
+
+def main(iterations):
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        m = Match(
+            date=date(2025, 12, 1),
+            time=dtime(18),
+            location="Park",
+            max_players=10,
+            organizer=User(external_id="org", first_name="A", last_name="B"),
+        )
+        session.add(m)
+        session.flush()
+        players = [
+            User(external_id=f"u{i}", first_name="F", last_name="L") for i in range(10)
+        ]
+        for user in players:
+            session.add(MatchParticipant(match_id=m.id, user=user))
+        session.commit()
+        ids = [user.id for user in players]
+        conn = session.connection()
+
+        variants = (
+            ("rebuilt select", rebuilt),
+            ("lambda_stmt", lambda_statement),
+            ("pre-built", prebuilt),
+        )
+        for name, fn in variants:
+            fn(conn, m.id, ids[0])  # warm the compiled cache
+            before = cache_counts()
+            t0 = time.perf_counter()
+            for i in range(iterations):
+                fn(conn, m.id, ids[i % 10])
+            elapsed = time.perf_counter() - t0
+            after = cache_counts()
+            hits = after["hit"] - before["hit"]
+            misses = after["miss"] - before["miss"]
+            print(
+                f"{name:>15}: {elapsed / iterations * 1e6:7.1f} us/call "
+                f"(cache hits {hits:.0f}, misses {misses:.0f})"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
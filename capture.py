@@ -0,0 +1,129 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import settings
+
+# Sampled request capture for replay.py. A sampled request is serialized to
+# one JSON line and put on a queue; a QueueListener thread writes the lines
+# to a size-rotated file, so the request never waits for the disk. Requests
+# that are not sampled cost one random() call.
+
+# Headers replay needs to act as the same user; nothing else is kept
+CAPTURED_HEADERS = (
+    "x-user-id",
+    "x-first-name",
+    "x-last-name",
+    "x-user-first-name",
+    "x-user-last-name",
+    "idempotency-key",
+    "content-type",
+)
+
+
+class CaptureRecorder:
+    """Queue plus background writer for captured requests."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._logger = logging.getLogger("capture.traffic")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._listener = None
+
+    @property
+    def active(self) -> bool:
+        return self._listener is not None
+
+    def start(self, path: str, max_bytes: int, backups: int):
+        if self.active:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def stop(self):
+        """Write out everything queued and close the file."""
+        if not self.active:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._listener = None
+
+    def record(self, entry: dict):
+        if self.active:
+            self._logger.info(json.dumps(entry, separators=(",", ":")))
+
+
+recorder = CaptureRecorder()
+
+
+class TrafficCapture:
+    """ASGI middleware recording a CAPTURE_RATE sample of HTTP requests."""
+
+    def __init__(self, app, rate: float = None):
+        self.app = app
+        self.rate = settings.CAPTURE_RATE if rate is None else rate
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not recorder.active
+            or random.random() >= self.rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.time()
+        started = time.perf_counter()
+        body = bytearray()
+        status = None
+
+        async def receive_and_keep():
+            message = await receive()
+            if message["type"] == "http.request":
+                if len(body) < settings.CAPTURE_MAX_BODY:
+                    body.extend(message.get("body", b""))
+            return message
+
+        async def send_and_watch(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_keep, send_and_watch)
+        finally:
+            headers = {}
+            for name, value in scope["headers"]:
+                name = name.decode("latin-1")
+                if name in CAPTURED_HEADERS:
+                    headers[name] = value.decode("latin-1")
+            route = scope.get("route")
+            recorder.record(
+                {
+                    "ts": round(started_at, 6),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope["query_string"].decode("latin-1"),
+                    "route": getattr(route, "path", None),
+                    "headers": headers,
+                    "body": bytes(body[: settings.CAPTURE_MAX_BODY]).decode(
+                        "utf-8", "replace"
+                    ),
+                    "status": status or 500,
+                }
+            )
@@ -0,0 +1,71 @@
+import logging
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import availability
+from statements import BUMP_VERSION, CURRENT_VERSION, RECORD_TOMBSTONE
+
+logger = logging.getLogger(__name__)
+
+# kind is one of "created", "joined", "left", "updated", "deleted" (or "reset");
+# match is a plain dict snapshot taken when the change was recorded
+Change = namedtuple("Change", ["kind", "match_id", "version", "match"])
+
+_subscribers = []
+
+
+def subscribe(fn):
+    """Register fn(change) to be called after every committed match change."""
+    _subscribers.append(fn)
+    return fn
+
+
+def current_version(session) -> int:
+    return session.connection().execute(CURRENT_VERSION).scalar() or 0
+
+
+def record_change(session, kind: str, match) -> int:
+    """Bump the data version inside the caller's transaction.
+
+    The match row is stamped with the new version (or a tombstone is left
+    for a deletion) so clients can sync by version, and the availability
+    summary is adjusted. Call it before the change is flushed. Subscribers are only
+    notified once the transaction commits, so a rolled back write never
+    reaches a cache.
+    """
+    version = session.connection().execute(BUMP_VERSION).scalar_one()
+    availability.record(session, kind, match)
+    if kind == "deleted":
+        session.connection().execute(
+            RECORD_TOMBSTONE, {"match_id": match.id, "version": version}
+        )
+    else:
+        match.version = version
+    session.info.setdefault("pending_changes", []).append(
+        Change(kind, match.id, version, match.model_dump())
+    )
+    return version
+
+
+def publish(change: Change):
+    for fn in _subscribers:
+        try:
+            fn(change)
+        except Exception:
+            logger.exception("Change subscriber %r failed", fn)
+
+
+def reset():
+    """Tell every subscriber to drop its state (used when the DB is swapped)."""
+    publish(Change("reset", None, 0, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for change in session.info.pop("pending_changes", []):
+        publish(change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("pending_changes", None)
@@ -0,0 +1,93 @@
+"""Maintenance commands, run next to app.db: python cli.py <command> --help"""
+
+import argparse
+import sys
+import availability
+import backup
+import maintenance
+from db import create_db_and_tables, engine
+
+
+def summary(args) -> int:
+    create_db_and_tables()
+    with engine.begin() as conn:
+        if args.rebuild:
+            print(f"Rebuilt {availability.rebuild(conn)} availability buckets")
+            return 0
+        mismatches = availability.verify(conn)
+    for (day, location), stored, expected in mismatches:
+        print(f"{day} {location}: stored {stored}, expected {expected}")
+    if mismatches:
+        print(f"{len(mismatches)} buckets differ, run with --rebuild to fix them")
+        return 1
+    print("Availability summary matches the matches table")
+    return 0
+
+
+def run_maintenance(args) -> int:
+    create_db_and_tables()
+    if args.convert_auto_vacuum:
+        # Rewrites the whole file once; later frees are reclaimed in steps
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        print("Converted to auto_vacuum=INCREMENTAL")
+    maintenance.scheduler.engine = engine
+    outcomes = [maintenance.scheduler.run_task(name) for name in args.task]
+    for name, outcome in zip(args.task, outcomes):
+        print(f"{name}: {outcome}")
+    return 1 if "error" in outcomes else 0
+
+
+def run_backup(args) -> int:
+    target = args.target or backup.default_target()
+    try:
+        result = backup.backups.run(engine, target)
+    except Exception as e:
+        print(f"Backup failed: {e}")
+        return 1
+    print(
+        f"Wrote {result['bytes']} bytes to {target} ({result['method']}, {result['seconds']}s)"
+    )
+    print(f"sha256 {result['sha256']}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="cli.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser(
+        "summary", help="check the availability summary against a full aggregation"
+    )
+    p.add_argument("--rebuild", action="store_true", help="recompute it instead")
+    p.set_defaults(func=summary)
+
+    p = commands.add_parser("maintenance", help="run database maintenance now")
+    p.add_argument(
+        "--task",
+        action="append",
+        choices=sorted(maintenance.TASKS),
+        help="task to run, repeatable (default: all)",
+    )
+    p.add_argument(
+        "--convert-auto-vacuum",
+        action="store_true",
+        help="switch an existing database to incremental vacuum (runs VACUUM)",
+    )
+    p.set_defaults(func=run_maintenance)
+
+    p = commands.add_parser(
+        "backup", help="online, throttled, gzipped copy of the live database"
+    )
+    p.add_argument("--target", help="output .db.gz path (default: BACKUP_DIR)")
+    p.set_defaults(func=run_backup)
+
+    args = parser.parse_args(argv)
+    if args.command == "maintenance" and not args.task:
+        args.task = list(maintenance.TASKS)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request, Response
+from prometheus_client import Counter
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+ENTITY_CACHE = Counter(
+    "entity_cache_lookups", "EntityBodyCache lookups by result", ["cache", "result"]
+)
+
+# Bodies smaller than this are not worth the CPU or the extra header bytes
+MIN_COMPRESS_SIZE = 512
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def parse_accept_encoding(header: Optional[str]) -> dict:
+    prefs = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        # q may follow other parameters, as in "gzip;level=1;q=0"
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        prefs[token] = q
+    return prefs
+
+
+def choose_encoding(header: Optional[str]) -> str:
+    """Pick the best encoding we can produce, or "identity"."""
+    prefs = parse_accept_encoding(header)
+    best, best_q = "identity", 0.0
+    for encoding in available_encodings():
+        q = prefs.get(encoding, prefs.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    if encoding == "gzip":
+        # mtime=0 keeps the output byte-identical across processes
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+class EncodedBody:
+    """A response body plus its compressed variants, each built at most once."""
+
+    def __init__(
+        self,
+        body: bytes,
+        media_type: str,
+        etag: str,
+        cache_control: str = "no-cache",
+    ):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.cache_control = cache_control
+        self._variants = {"identity": body}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = compress(self.body, encoding)
+                    self._variants[encoding] = data
+        return data
+
+    def precompress(self):
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            for encoding in available_encodings():
+                self.variant(encoding)
+        return self
+
+    def _etag_for(self, encoding: str) -> str:
+        if encoding == "identity":
+            return self.etag
+        return self.etag[:-1] + "-" + encoding + '"'
+
+    def not_modified(self, request: Request) -> bool:
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+        if "*" in tags:
+            return True
+        return any(
+            self._etag_for(encoding) in tags
+            for encoding in ("identity",) + available_encodings()
+        )
+
+    def response(self, request: Request, headers: Optional[dict] = None) -> Response:
+        encoding = "identity"
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            encoding = choose_encoding(request.headers.get("accept-encoding"))
+        out = {
+            "ETag": self._etag_for(encoding),
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if headers:
+            out.update(headers)
+        if self.not_modified(request):
+            return Response(status_code=304, headers=out)
+        if encoding != "identity":
+            out["Content-Encoding"] = encoding
+        if request.method == "HEAD":
+            out["Content-Length"] = str(len(self.variant(encoding)))
+            return Response(headers=out, media_type=self.media_type)
+        return Response(
+            content=self.variant(encoding), headers=out, media_type=self.media_type
+        )
+
+
+class VersionedBodyCache:
+    """Holds the serialized body for the newest data version only."""
+
+    def __init__(self):
+        self._entry = None
+
+    def get(self, version: int) -> Optional[EncodedBody]:
+        entry = self._entry
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def put(self, version: int, body: EncodedBody):
+        entry = self._entry
+        if entry is None or entry[0] <= version:
+            self._entry = (version, body)
+
+    def clear(self):
+        self._entry = None
+
+
+class EntityBodyCache:
+    """Serialized bodies of single entities by id, least recently used first out.
+
+    Each body is stored with the row version it was built from, and get()
+    only returns it for that version: writes made by other processes never
+    reach invalidate() here, so the caller looks the current versions up.
+    Writers in this process call invalidate() after they commit. A reader
+    that missed takes token() before loading and passes it to put(): if
+    anything was invalidated in between, the body it loaded may predate
+    that write and is not stored.
+    """
+
+    def __init__(self, name: str, max_entries: int):
+        self.max_entries = max_entries
+        self._hits = ENTITY_CACHE.labels(name, "hit")
+        self._misses = ENTITY_CACHE.labels(name, "miss")
+        self._entries = OrderedDict()
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version: int) -> Optional[EncodedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            body = None
+            if entry is not None:
+                if entry[0] == version:
+                    body = entry[1]
+                    self._entries.move_to_end(key)
+                else:
+                    del self._entries[key]
+        (self._misses if body is None else self._hits).inc()
+        return body
+
+    def token(self) -> int:
+        return self._invalidations
+
+    def put(self, key, version: int, body: EncodedBody, token: int):
+        with self._lock:
+            if token != self._invalidations:
+                return
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
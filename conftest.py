@@ -8,6 +8,7 @@ from sqlalchemy.pool import StaticPool
 from main import app
 from db import get_session
 import models
+import changes
 
 PROJECT_ROOT = Path(__file__).resolve().parent
 sys.path.insert(0, str(PROJECT_ROOT))
@@ -44,9 +45,12 @@ def client(session):
             session.rollback()
 
     app.dependency_overrides[get_session] = override_get_session
+    # Each test gets a fresh database, so version-keyed caches must start empty
+    changes.reset()
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
+    changes.reset()
 
 
 def headers(uid="u1", first="John", last="Doe"):
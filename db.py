@@ -1,13 +1,54 @@
-from sqlmodel import SQLModel, create_engine, Session
+from fastapi import Request
+from sqlalchemy import event
+from sqlmodel import create_engine, Session
+from migrations import migrate
+from sharding import shards
+import settings
 
+engine = create_engine("sqlite:///app.db", echo=settings.DB_ECHO)
 
-engine = create_engine("sqlite:///app.db", echo=True)
+
+def tune_sqlite(engine, wal: bool = False):
+    """Connection pragmas for a SQLite file engine."""
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Only takes effect when the file is created; freed pages are then
+        # reclaimed by maintenance.incremental_vacuum instead of a VACUUM
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints rather than at every commit
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+tune_sqlite(engine, settings.SQLITE_WAL)
+
+
+def shard_engine(region: str):
+    path = settings.SHARD_PATH.format(region=region)
+    shard = create_engine(f"sqlite:///{path}", echo=settings.DB_ECHO)
+    tune_sqlite(shard, settings.SQLITE_WAL)
+    return shard
+
+
+if settings.SHARD_REGIONS:
+    shards.configure(
+        settings.SHARD_REGIONS,
+        [engine] + [shard_engine(region) for region in settings.SHARD_REGIONS[1:]],
+    )
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    for shard in shards.engines:
+        if shard is not engine:
+            migrate(shard)
+    migrate(engine)
 
 
-def get_session():
-    with Session(engine) as session:
+def get_session(request: Request):
+    # Routes naming a match run on the shard its id points to
+    with Session(shards.engine_for_request(request, engine)) as session:
         yield session
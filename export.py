@@ -0,0 +1,100 @@
+import csv
+import heapq
+import io
+import json
+from itertools import groupby
+from sqlalchemy.orm import aliased
+from models import Match, MatchParticipant, User
+from queries import FIELDS, MATCH_COLUMNS, row_to_dict, select_matches
+
+# Rows fetched from the cursor per round trip; also lines per yielded chunk
+BATCH_SIZE = 1000
+
+# User is already joined once as the organizer
+_player = aliased(User, name="player")
+PARTICIPANT_COLUMNS = (_player.external_id, _player.first_name, _player.last_name)
+
+
+def iter_matches(engine, include_participants=False):
+    """Yield (match_row, participants) in list order using a streaming cursor.
+
+    Rows are plain tuples, never ORM objects, and only BATCH_SIZE of them
+    are buffered at a time, so memory does not grow with the table.
+    """
+    n = len(MATCH_COLUMNS)
+    if include_participants:
+        stmt = (
+            select_matches(*PARTICIPANT_COLUMNS)
+            .outerjoin(MatchParticipant, MatchParticipant.match_id == Match.id)
+            .outerjoin(_player, _player.id == MatchParticipant.user_id)
+            .order_by(Match.date, Match.time, Match.id, MatchParticipant.id)
+        )
+    else:
+        stmt = select_matches().order_by(Match.date, Match.time, Match.id)
+
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=BATCH_SIZE).execute(stmt)
+        if not include_participants:
+            for row in result:
+                yield row, None
+            return
+        # The join repeats the match columns once per participant; rows of
+        # one match are adjacent thanks to the ORDER BY
+        id_index = FIELDS.index("id")
+        for _, rows in groupby(result, key=lambda r: r[id_index]):
+            rows = list(rows)
+            participants = [r[n:] for r in rows if r[n] is not None]
+            yield rows[0][:n], participants
+
+
+def iter_shards(engines, include_participants=False):
+    """iter_matches() over several shard engines, merged back into list order."""
+    order = [FIELDS.index(f) for f in ("date", "time", "id")]
+    return heapq.merge(
+        *(iter_matches(e, include_participants) for e in engines),
+        key=lambda item: [item[0][i] for i in order],
+    )
+
+
+def _source(engine, include_participants):
+    # A list of engines is a sharded database
+    if isinstance(engine, list):
+        return iter_shards(engine, include_participants)
+    return iter_matches(engine, include_participants)
+
+
+def ndjson_chunks(engine, include_participants=False):
+    lines = []
+    for row, participants in _source(engine, include_participants):
+        d = row_to_dict(row)
+        if participants is not None:
+            d["participants"] = [
+                {"user_id": u, "first_name": f, "last_name": last}
+                for u, f, last in participants
+            ]
+        lines.append(json.dumps(d, ensure_ascii=False))
+        if len(lines) >= BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def csv_chunks(engine, include_participants=False):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    header = list(FIELDS) + (["participants"] if include_participants else [])
+    writer.writerow(header)
+    count = 0
+    for row, participants in _source(engine, include_participants):
+        d = row_to_dict(row)
+        values = [d[f] for f in FIELDS]
+        if participants is not None:
+            values.append("; ".join(f"{f} {last} ({u})" for u, f, last in participants))
+        writer.writerow(values)
+        count += 1
+        if count % BATCH_SIZE == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
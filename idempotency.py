@@ -0,0 +1,304 @@
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+from models import IdempotencyRecord
+import settings
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# How long a duplicate waits for the request it is coalesced with
+WAIT_SECONDS = 30
+# How often a duplicate on another worker looks for the stored response
+POLL_SECONDS = 0.05
+# status_code of a key claimed by a request still running; a claim older
+# than WAIT_SECONDS is taken to be abandoned (its worker died)
+PENDING = 0
+
+StoredResponse = namedtuple(
+    "StoredResponse", ["fingerprint", "status_code", "body", "created_at"]
+)
+
+
+class MemoryStore:
+    """Bounded LRU of stored responses with a time-to-live."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, scope) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._entries.get(scope)
+            if stored is None:
+                return None
+            if time.time() - stored.created_at > self.ttl:
+                del self._entries[scope]
+                return None
+            self._entries.move_to_end(scope)
+            return stored
+
+    def put(self, scope, stored: StoredResponse):
+        with self._lock:
+            self._entries[scope] = stored
+            self._entries.move_to_end(scope)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def claim(self, scope, fingerprint) -> bool:
+        # One process: Idempotency already coalesced duplicates in flight
+        return True
+
+    def release(self, scope):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteStore:
+    """Stored responses in the idempotencyrecord table, shared by all workers.
+
+    A request claims its key with a PENDING row before it runs, so of two
+    duplicates on different workers only one executes; put() then fills
+    the row in.
+    """
+
+    def __init__(self, engine, ttl: float):
+        self.engine = engine
+        self.ttl = ttl
+
+    def get(self, scope) -> Optional[StoredResponse]:
+        with Session(self.engine) as session:
+            record = session.get(IdempotencyRecord, scope)
+            if record is None or time.time() - record.created_at > self.ttl:
+                return None
+            return StoredResponse(
+                record.fingerprint, record.status_code, record.body, record.created_at
+            )
+
+    def claim(self, scope, fingerprint) -> bool:
+        """Insert a PENDING row for scope; False if another request holds it."""
+        user_id, key = scope
+        now = time.time()
+        with Session(self.engine) as session:
+            session.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.user_id == user_id,
+                    IdempotencyRecord.key == key,
+                    or_(
+                        IdempotencyRecord.created_at < now - self.ttl,
+                        (IdempotencyRecord.status_code == PENDING)
+                        & (IdempotencyRecord.created_at < now - WAIT_SECONDS),
+                    ),
+                )
+            )
+            claimed = session.execute(
+                insert(IdempotencyRecord)
+                .values(
+                    user_id=user_id,
+                    key=key,
+                    fingerprint=fingerprint,
+                    status_code=PENDING,
+                    body=b"",
+                    created_at=now,
+                )
+                .on_conflict_do_nothing()
+            ).rowcount
+            session.commit()
+        return claimed == 1
+
+    def release(self, scope):
+        """Drop an unfinished claim so a retry can run the request again."""
+        user_id, key = scope
+        with Session(self.engine) as session:
+            session.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.user_id == user_id,
+                    IdempotencyRecord.key == key,
+                    IdempotencyRecord.status_code == PENDING,
+                )
+            )
+            session.commit()
+
+    def put(self, scope, stored: StoredResponse):
+        user_id, key = scope
+        with Session(self.engine) as session:
+            session.execute(
+                insert(IdempotencyRecord)
+                .values(user_id=user_id, key=key, **stored._asdict())
+                .on_conflict_do_update(
+                    index_elements=[IdempotencyRecord.user_id, IdempotencyRecord.key],
+                    set_=stored._asdict(),
+                )
+            )
+            # Expired rows are swept on write; created_at is indexed
+            session.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.created_at < time.time() - self.ttl
+                )
+            )
+            session.commit()
+
+    def clear(self):
+        with Session(self.engine) as session:
+            session.execute(delete(IdempotencyRecord))
+            session.commit()
+
+
+class TieredStore:
+    """Memory in front of SQLite: hot replays never touch the database."""
+
+    def __init__(self, memory: MemoryStore, backing: SQLiteStore):
+        self.memory = memory
+        self.backing = backing
+
+    def get(self, scope) -> Optional[StoredResponse]:
+        stored = self.memory.get(scope)
+        if stored is None:
+            stored = self.backing.get(scope)
+            if stored is not None and stored.status_code != PENDING:
+                self.memory.put(scope, stored)
+        return stored
+
+    def claim(self, scope, fingerprint) -> bool:
+        return self.backing.claim(scope, fingerprint)
+
+    def release(self, scope):
+        self.backing.release(scope)
+
+    def put(self, scope, stored: StoredResponse):
+        self.memory.put(scope, stored)
+        self.backing.put(scope, stored)
+
+    def clear(self):
+        self.memory.clear()
+        self.backing.clear()
+
+
+def build_store():
+    memory = MemoryStore(
+        settings.IDEMPOTENCY_MAX_ENTRIES, settings.IDEMPOTENCY_TTL_SECONDS
+    )
+    if not settings.IDEMPOTENCY_SQLITE:
+        return memory
+    from db import engine
+
+    return TieredStore(memory, SQLiteStore(engine, settings.IDEMPOTENCY_TTL_SECONDS))
+
+
+class Idempotency:
+    """Runs a write at most once per (user, Idempotency-Key).
+
+    The first outcome - success or HTTPException - is stored and replayed
+    for later requests with the same key. Concurrent duplicates wait for
+    the one in flight instead of executing themselves: within a process
+    on an event, across workers by polling the key the store let the
+    first one claim.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        request: Request,
+        user_id: str,
+        fn,
+        response_model,
+        status_code=200,
+        payload=None,
+    ):
+        key = request.headers.get(HEADER)
+        if not key:
+            return fn()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+        scope = (user_id, key)
+        fingerprint = f"{request.method} {request.url.path}"
+        if payload is not None:
+            fingerprint += " " + json.dumps(jsonable_encoder(payload), sort_keys=True)
+
+        stored = self.store.get(scope)
+        if stored is not None and stored.status_code != PENDING:
+            return self._replay(stored, fingerprint)
+
+        with self._lock:
+            done = self._inflight.get(scope)
+            leader = done is None
+            if leader:
+                done = self._inflight[scope] = threading.Event()
+
+        if not leader:
+            done.wait(WAIT_SECONDS)
+            return self._replay(self._finished(scope, 0), fingerprint)
+
+        try:
+            if not self.store.claim(scope, fingerprint):
+                # A duplicate is running on another worker, or just finished
+                return self._replay(self._finished(scope, WAIT_SECONDS), fingerprint)
+            try:
+                result = fn()
+            except HTTPException as exc:
+                if exc.status_code >= 500:
+                    self.store.release(scope)
+                    raise
+                body = {"detail": exc.detail}
+                status = exc.status_code
+            except BaseException:
+                self.store.release(scope)
+                raise
+            else:
+                body = jsonable_encoder(response_model.model_validate(result))
+                status = status_code
+            stored = StoredResponse(
+                fingerprint, status, json.dumps(body).encode(), time.time()
+            )
+            self.store.put(scope, stored)
+            return self._response(stored)
+        finally:
+            with self._lock:
+                del self._inflight[scope]
+            done.set()
+
+    def _finished(self, scope, wait: float) -> StoredResponse:
+        """The stored response of scope, polled for up to wait seconds."""
+        deadline = time.monotonic() + wait
+        while True:
+            stored = self.store.get(scope)
+            if stored is not None and stored.status_code != PENDING:
+                return stored
+            if stored is None or time.monotonic() >= deadline:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is in progress",
+                )
+            time.sleep(POLL_SECONDS)
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        return self._response(stored, {"Idempotent-Replayed": "true"})
+
+    def _response(self, stored: StoredResponse, headers=None) -> Response:
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers=headers,
+        )
@@ -1,12 +1,33 @@
-from fastapi import FastAPI
-from db import create_db_and_tables
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from db import create_db_and_tables, engine
+from routers.admin import router as admin_router
 from routers.matches import router as matches_router
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from routers.reports import router as reports_router
+from routers.series import router as series_router
+from static_assets import StaticAssets
+import capture
+import maintenance
+import memprofile
+import readiness
+import reports
+import repository
+import settings
+from sharding import shards
+import slot_engine
 from prometheus_fastapi_instrumentator import Instrumentator
 
 app = FastAPI(title="Football Match Finder")
 Instrumentator().instrument(app).expose(app)
+if settings.CAPTURE_RATE > 0:
+    app.add_middleware(capture.TrafficCapture)
+if settings.MEMORY_PROFILING and settings.MEMORY_PROFILING_ROUTES:
+    app.add_middleware(memprofile.RouteAllocations)
+
+static_assets = StaticAssets("static")
+
+# Maintenance of the shards other than the default database
+_shard_schedulers = []
 
 
 @app.get("/health")
@@ -14,16 +35,72 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready():
+    """200 while this process takes traffic, 503 while starting or draining.
+
+    Also 503 while the slot engine cannot write its ops to the database.
+    """
+    if not readiness.ready.is_set():
+        return JSONResponse({"status": "not ready"}, status_code=503)
+    if slot_engine.engine.active and not slot_engine.engine.healthy:
+        return JSONResponse({"status": "slot engine behind"}, status_code=503)
+    return {"status": "ready"}
+
+
 @app.on_event("startup")
 def on_startup():
+    if settings.MATCH_STORE not in repository.STORES:
+        raise RuntimeError(f"MATCH_STORE must be one of {', '.join(repository.STORES)}")
+    if settings.MATCH_STORE == "memory" and (settings.SLOT_ENGINE or shards.active):
+        raise RuntimeError("MATCH_STORE=memory does not support SLOT_ENGINE or shards")
     create_db_and_tables()
+    static_assets.load()
+    if settings.MEMORY_PROFILING:
+        memprofile.profiler.start(settings.MEMORY_PROFILING_FRAMES)
+    if settings.CAPTURE_RATE > 0:
+        capture.recorder.start(
+            settings.CAPTURE_PATH, settings.CAPTURE_MAX_BYTES, settings.CAPTURE_BACKUPS
+        )
+    if settings.SLOT_ENGINE:
+        if shards.active:
+            raise RuntimeError("SLOT_ENGINE does not support SHARD_REGIONS")
+        slot_engine.engine.start(engine, settings.SLOT_ENGINE_LOG)
+    if settings.MAINTENANCE and maintenance.runner_lock.acquire(
+        settings.MAINTENANCE_LOCK
+    ):
+        maintenance.scheduler.start(engine)
+        for shard in shards.engines[1:]:
+            scheduler = maintenance.MaintenanceScheduler()
+            scheduler.start(shard)
+            _shard_schedulers.append(scheduler)
+    readiness.ready.set()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    readiness.ready.clear()
+    capture.recorder.stop()
+    maintenance.scheduler.stop()
+    while _shard_schedulers:
+        _shard_schedulers.pop().stop()
+    maintenance.runner_lock.release()
+    slot_engine.engine.stop()
+    reports.jobs.shutdown()
+    memprofile.profiler.stop()
 
 
 app.include_router(matches_router)
+app.include_router(series_router)
+app.include_router(reports_router)
+app.include_router(admin_router)
+
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def static(path: str, request: Request):
+    return static_assets.response(request, path)
 
 
-@app.get("/")
-def root():
-    return FileResponse("static/index.html")
+@app.get("/", include_in_schema=False)
+def root(request: Request):
+    return static_assets.response(request, "index.html")
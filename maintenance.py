@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TASK_SECONDS = Histogram(
+    "sqlite_maintenance_seconds", "Duration of maintenance tasks", ["task"]
+)
+TASK_RUNS = Counter(
+    "sqlite_maintenance_runs",
+    "Maintenance task runs by outcome (ok, deferred, skipped, error)",
+    ["task", "outcome"],
+)
+PAGES_RECLAIMED = Counter(
+    "sqlite_maintenance_pages_reclaimed",
+    "Free pages returned to the file system by incremental vacuum",
+)
+INTEGRITY_OK = Gauge(
+    "sqlite_integrity_ok", "1 if the last quick_check passed, 0 if it failed"
+)
+WRITE_LATENCY = Gauge(
+    "sqlite_write_latency_ms", "Moving average of write statement latency"
+)
+
+# A busy period ends once no write was seen for this long
+LATENCY_WINDOW = 5.0
+# How long a task waits after being deferred for traffic
+DEFER_SECONDS = 30.0
+_WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class WriteLatency:
+    """Moving average of how long write statements take on an engine."""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.average_ms = 0.0
+        self.last_write = 0.0
+
+    def track(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:7].upper().startswith(_WRITES):
+            conn.info["write_started"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("write_started", None)
+        if started is not None:
+            self.observe((time.perf_counter() - started) * 1000)
+
+    def observe(self, ms: float):
+        self.average_ms += self.alpha * (ms - self.average_ms)
+        self.last_write = time.monotonic()
+        WRITE_LATENCY.set(self.average_ms)
+
+    def busy(self, max_ms: Optional[float] = None) -> bool:
+        if max_ms is None:
+            max_ms = settings.MAINTENANCE_MAX_WRITE_MS
+        recent = time.monotonic() - self.last_write < LATENCY_WINDOW
+        return recent and self.average_ms > max_ms
+
+
+class Deferred(Exception):
+    """Raised by a task that stopped early because traffic picked up."""
+
+
+# Tasks take a connection and return a short result for the log
+
+
+def optimize(conn, latency):
+    conn.exec_driver_sql("PRAGMA optimize")
+    return "ok"
+
+
+def _checkpoint(conn, mode):
+    if conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() != "wal":
+        return None
+    busy, log, done = conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one()
+    return f"busy={busy} log={log} checkpointed={done}"
+
+
+def checkpoint(conn, latency):
+    # Copies what it can without waiting for readers or writers
+    return _checkpoint(conn, "PASSIVE")
+
+
+def truncate_checkpoint(conn, latency):
+    # Waits for readers and resets the WAL file to zero bytes
+    return _checkpoint(conn, "TRUNCATE")
+
+
+def incremental_vacuum(conn, latency):
+    if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+        # Only databases created with auto_vacuum=INCREMENTAL (or converted
+        # with "python cli.py maintenance --convert-auto-vacuum") track pages
+        return None
+    reclaimed, previous = 0, None
+    while True:
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if not free or free == previous:
+            # Done, or nothing moved (e.g. a reader pins the pages)
+            break
+        previous = free
+        if latency.busy():
+            PAGES_RECLAIMED.inc(reclaimed)
+            raise Deferred(f"{reclaimed} pages reclaimed before traffic picked up")
+        step = min(free, settings.MAINTENANCE_VACUUM_PAGES)
+        # Each step of the statement frees one page; sqlite3's execute()
+        # steps it only once, executescript() runs it to completion
+        conn.connection.driver_connection.executescript(
+            f"PRAGMA incremental_vacuum({step});"
+        )
+        reclaimed += free - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    PAGES_RECLAIMED.inc(reclaimed)
+    return f"{reclaimed} pages reclaimed"
+
+
+def integrity_check(conn, latency):
+    problems = [r[0] for r in conn.exec_driver_sql("PRAGMA quick_check").all()]
+    ok = problems == ["ok"]
+    INTEGRITY_OK.set(1 if ok else 0)
+    if not ok:
+        logger.error("quick_check found problems: %s", "; ".join(problems[:20]))
+    return "ok" if ok else f"{len(problems)} problems"
+
+
+TASKS = {
+    "optimize": (optimize, "MAINTENANCE_OPTIMIZE_SECONDS"),
+    "checkpoint": (checkpoint, "MAINTENANCE_CHECKPOINT_SECONDS"),
+    "truncate": (truncate_checkpoint, "MAINTENANCE_TRUNCATE_SECONDS"),
+    "vacuum": (incremental_vacuum, "MAINTENANCE_VACUUM_SECONDS"),
+    "integrity": (integrity_check, "MAINTENANCE_INTEGRITY_SECONDS"),
+}
+
+
+class MaintenanceScheduler:
+    """Runs the TASKS on their intervals in one background thread.
+
+    A task that comes due while writes are slow is postponed by
+    DEFER_SECONDS; incremental vacuum also checks between steps.
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.latency = WriteLatency()
+        self._tracked = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._due = {}
+
+    def start(self, engine):
+        self.engine = engine
+        if id(engine) not in self._tracked:
+            self.latency.track(engine)
+            self._tracked.add(id(engine))
+        now = time.monotonic()
+        self._due = {name: now + self._interval(name) for name in TASKS}
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sqlite-maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _interval(self, name) -> float:
+        return getattr(settings, TASKS[name][1])
+
+    def _run(self):
+        while not self._stop.is_set():
+            name = min(self._due, key=self._due.get)
+            wait = self._due[name] - time.monotonic()
+            if wait > 0:
+                self._stop.wait(wait)
+                continue
+            outcome = self.run_task(name)
+            delay = DEFER_SECONDS if outcome == "deferred" else self._interval(name)
+            self._due[name] = time.monotonic() + delay
+
+    def run_task(self, name: str) -> str:
+        """Run one task now; returns its outcome."""
+        fn = TASKS[name][0]
+        if self.latency.busy():
+            outcome, result = "deferred", "writes are slow"
+        else:
+            started = time.perf_counter()
+            try:
+                with self.engine.connect() as conn:
+                    result = fn(conn, self.latency)
+                    conn.commit()
+                outcome = "skipped" if result is None else "ok"
+            except Deferred as e:
+                outcome, result = "deferred", str(e)
+            except Exception:
+                logger.exception("Maintenance task %s failed", name)
+                outcome, result = "error", None
+            TASK_SECONDS.labels(name).observe(time.perf_counter() - started)
+        TASK_RUNS.labels(name, outcome).inc()
+        logger.info("Maintenance %s: %s %s", name, outcome, result or "")
+        return outcome
+
+
+class RunnerLock:
+    """Exclusive lock on a file, so one of several workers runs maintenance.
+
+    The lock is held until release() or until the process exits, when the
+    OS drops it; a worker started later can then take over.
+    """
+
+    def __init__(self):
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, path) -> bool:
+        """Take the lock without waiting; False if another process holds it."""
+        if self._fd is not None:
+            return True
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+scheduler = MaintenanceScheduler()
+runner_lock = RunnerLock()
@@ -0,0 +1,225 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Optional
+
+# Memory debugging with tracemalloc, for workers whose RSS creeps up. Off by
+# default: nothing is traced, the middleware is not installed and the
+# /admin/memory routes answer 501, so a production process pays nothing.
+#
+# With MEMORY_PROFILING=1 tracing starts at startup. POST /admin/memory/snapshots
+# keeps a snapshot and returns its top allocation sites grouped by module
+# (or package, or line); GET /admin/memory/diff compares two of them, which
+# is how growth between two points in time is pinned on, say, the ORM
+# identity map (sqlalchemy.orm.*), pydantic or prometheus_client. With
+# MEMORY_PROFILING_ROUTES=1 as well, RouteAllocations records how much each
+# routers/matches.py route leaves allocated after it returns.
+
+# Snapshots hold every traced block, so only the latest few are kept
+MAX_SNAPSHOTS = 5
+
+# Allocations of the profiler itself and of the import system are noise
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class ProfilingDisabled(Exception):
+    """Raised when a snapshot is asked for while nothing is traced."""
+
+
+class UnknownSnapshot(KeyError):
+    pass
+
+
+_modules = {}
+
+
+def module_of(filename: str) -> str:
+    """Dotted module name of a source file, from the longest sys.path entry."""
+    name = _modules.get(filename)
+    if name is None:
+        name = filename
+        if not filename.startswith("<"):
+            best = ""
+            for entry in sys.path:
+                entry = os.path.abspath(entry or os.curdir)
+                if filename.startswith(entry + os.sep) and len(entry) > len(best):
+                    best = entry
+            if best:
+                rel = os.path.splitext(filename[len(best) + 1 :])[0]
+                parts = rel.split(os.sep)
+                if parts[-1] == "__init__":
+                    parts.pop()
+                name = ".".join(parts)
+        _modules[filename] = name
+    return name
+
+
+def _key(frame, group: str) -> str:
+    if group == "line":
+        return f"{module_of(frame.filename)}:{frame.lineno}"
+    module = module_of(frame.filename)
+    return module.split(".")[0] if group == "package" else module
+
+
+def top(snapshot, group: str = "module", limit: int = 25) -> list:
+    """Largest allocation sites of a snapshot, grouped."""
+    totals = {}
+    for stat in snapshot.statistics("lineno"):
+        entry = totals.setdefault(_key(stat.traceback[0], group), [0, 0])
+        entry[0] += stat.size
+        entry[1] += stat.count
+    rows = sorted(totals.items(), key=lambda item: -item[1][0])[:limit]
+    return [
+        {"site": site, "size": size, "count": count} for site, (size, count) in rows
+    ]
+
+
+def diff(older, newer, group: str = "module", limit: int = 25) -> list:
+    """Sites whose allocations changed the most between two snapshots."""
+    totals = {}
+    for stat in newer.compare_to(older, "lineno"):
+        entry = totals.setdefault(_key(stat.traceback[0], group), [0, 0, 0])
+        entry[0] += stat.size_diff
+        entry[1] += stat.count_diff
+        entry[2] += stat.size
+    rows = sorted(totals.items(), key=lambda item: -abs(item[1][0]))[:limit]
+    return [
+        {"site": site, "size_diff": size_diff, "count_diff": count_diff, "size": size}
+        for site, (size_diff, count_diff, size) in rows
+        if size_diff or count_diff
+    ]
+
+
+class MemoryProfiler:
+    """tracemalloc switch, kept snapshots and per-route allocation totals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()  # id -> (taken at, Snapshot)
+        self._next_id = 1
+        self._routes = {}  # "METHOD /path" -> [requests, net bytes, max bytes]
+        self._started = False
+        self._owns_tracing = False
+
+    @property
+    def active(self) -> bool:
+        return self._started and tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        if self._started:
+            return
+        # Tracing started by PYTHONTRACEMALLOC is used as it is, and left on
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start(frames)
+        self._started = True
+
+    def stop(self):
+        if self._started:
+            self._started = False
+            if self._owns_tracing:
+                tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+            self._routes.clear()
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if self.active else (0, 0)
+        with self._lock:
+            snapshots = [
+                {"id": i, "taken_at": taken}
+                for i, (taken, _) in self._snapshots.items()
+            ]
+        return {
+            "tracing": self.active,
+            "frames": tracemalloc.get_traceback_limit() if self.active else 0,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "snapshots": snapshots,
+        }
+
+    def take(self) -> tuple:
+        """(id, snapshot) of a new snapshot, which is kept for diffs."""
+        if not self.active:
+            raise ProfilingDisabled("Memory profiling is off (MEMORY_PROFILING=1)")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return snapshot_id, snapshot
+
+    def get(self, snapshot_id: int):
+        with self._lock:
+            entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise UnknownSnapshot(snapshot_id)
+        return entry[1]
+
+    def previous(self, snapshot_id: int) -> Optional[int]:
+        """Id of the snapshot kept before snapshot_id, if any."""
+        with self._lock:
+            older = [i for i in self._snapshots if i < snapshot_id]
+        return older[-1] if older else None
+
+    def record_route(self, route: str, allocated: int):
+        with self._lock:
+            entry = self._routes.setdefault(route, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += allocated
+            entry[2] = max(entry[2], allocated)
+
+    def routes(self) -> list:
+        with self._lock:
+            rows = sorted(self._routes.items(), key=lambda item: -item[1][1])
+        return [
+            {
+                "route": route,
+                "requests": requests,
+                "net_bytes": net,
+                "mean_net_bytes": net // requests,
+                "max_net_bytes": largest,
+            }
+            for route, (requests, net, largest) in rows
+        ]
+
+
+profiler = MemoryProfiler()
+
+
+class RouteAllocations:
+    """ASGI middleware: traced memory a routers/matches.py route leaves behind.
+
+    The figure is the change of the process-wide traced total across the
+    request, so requests running at the same time blur into each other; it
+    is meant for comparing routes over many requests, like the growth of
+    a slowly leaking one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.active:
+            await self.app(scope, receive, send)
+            return
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "endpoint", None)
+            if getattr(endpoint, "__module__", None) == "routers.matches":
+                allocated = tracemalloc.get_traced_memory()[0] - before
+                profiler.record_route(f"{scope['method']} {route.path}", allocated)
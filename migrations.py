@@ -0,0 +1,190 @@
+import logging
+from sqlalchemy import String, bindparam, inspect, select, text, update
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel
+import availability
+from models import Match, MatchParticipant
+from schedule import match_span
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 1000
+
+
+def _backfill_participant_spans(conn):
+    rows = conn.execute(
+        select(MatchParticipant.id, Match.date, Match.time).join(
+            Match, Match.id == MatchParticipant.match_id
+        )
+    ).all()
+    stmt = (
+        update(MatchParticipant)
+        .where(MatchParticipant.id == bindparam("pid"))
+        .values(starts_at=bindparam("start"), ends_at=bindparam("end"))
+    )
+    params = []
+    for pid, d, t in rows:
+        start, end = match_span(d, t)
+        params.append({"pid": pid, "start": start, "end": end})
+        if len(params) >= BACKFILL_BATCH:
+            conn.execute(stmt, params)
+            params = []
+    if params:
+        conn.execute(stmt, params)
+
+
+def _backfill_match_versions(conn):
+    # Existing rows count as unchanged since version 0; a client syncing
+    # from 0 gets the full table anyway
+    conn.execute(update(Match).where(Match.version.is_(None)).values(version=0))
+
+
+# (table, column) -> function filling the column for rows that predate it
+BACKFILLS = {
+    ("match", "version"): _backfill_match_versions,
+    ("matchparticipant", "starts_at"): _backfill_participant_spans,
+}
+
+# table -> function filling a table derived from others when it is created
+TABLE_BACKFILLS = {
+    "availabilitysummary": availability.rebuild,
+}
+
+
+# table -> (User.id column, old columns holding X-User-Id and the names) for
+# the tables that repeated the identity header strings before the user table
+USER_REFERENCES = {
+    "match": (
+        "organizer_id",
+        ("organizer_user_id", "organizer_first_name", "organizer_last_name"),
+    ),
+    "matchparticipant": ("user_id", ("user_id", "first_name", "last_name")),
+    "matchwaitlist": ("user_id", ("user_id", "first_name", "last_name")),
+}
+
+
+def _needs_user_ids(inspector, name) -> bool:
+    column, _ = USER_REFERENCES[name]
+    types = {c["name"]: c["type"] for c in inspector.get_columns(name)}
+    return column not in types or isinstance(types[column], String)
+
+
+def _move_users_to_table(conn, inspector, existing_tables) -> dict:
+    """Rebuild tables naming users by string to reference user.id instead.
+
+    SQLite cannot change a column's type, so each table is rebuilt in the
+    order SQLite documents for schema changes: create _new_<table> from the
+    model, fill it with a join on the user table, drop the old table and
+    rename the new one into place. Renaming the old table away instead
+    would make SQLite point the foreign keys of other tables at it.
+    Returns table -> model columns the old table did not have yet, for
+    BACKFILLS.
+    """
+    stale = [
+        name
+        for name in USER_REFERENCES
+        if name in existing_tables and _needs_user_ids(inspector, name)
+    ]
+    if not stale:
+        return {}
+    tables = SQLModel.metadata.tables
+    preparer = conn.dialect.identifier_preparer
+    missing = {}
+    for name in stale:
+        table = tables[name]
+        old_columns = {c["name"] for c in inspector.get_columns(name)}
+        column, (external, first, last) = USER_REFERENCES[name]
+        logger.info("Moving the users of %s to the user table", name)
+        # Identifiers below come from our own metadata, not user input
+        conn.execute(
+            text(
+                f'INSERT INTO "user" (external_id, first_name, last_name) '
+                f'SELECT "{external}", "{first}", "{last}" FROM "{name}" '
+                f"WHERE true ORDER BY id DESC "
+                f"ON CONFLICT (external_id) DO NOTHING"
+            )  # nosec B608
+        )
+        # Index names are global in SQLite; the new table reuses them
+        for index in inspector.get_indexes(name):
+            conn.execute(text(f'DROP INDEX "{index["name"]}"'))  # nosec B608
+        ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.execute(
+            text(
+                ddl.replace(
+                    f"CREATE TABLE {preparer.format_table(table)} ",
+                    f'CREATE TABLE "_new_{name}" ',
+                    1,
+                )
+            )
+        )
+        names, values, missing[name] = [], [], []
+        for c in table.columns:
+            names.append(f'"{c.name}"')
+            if c.name == column:
+                values.append("u.id")
+            elif c.name in old_columns:
+                values.append(f'o."{c.name}"')
+            else:
+                values.append("NULL")
+                missing[name].append(c.name)
+        conn.execute(
+            text(
+                f'INSERT INTO "_new_{name}" ({", ".join(names)}) '
+                f'SELECT {", ".join(values)} FROM "{name}" o '
+                f'JOIN "user" u ON u.external_id = o."{external}"'
+            )  # nosec B608
+        )
+        conn.execute(text(f'DROP TABLE "{name}"'))  # nosec B608
+        conn.execute(text(f'ALTER TABLE "_new_{name}" RENAME TO "{name}"'))
+        for index in table.indexes:
+            index.create(conn)
+    return missing
+
+
+def migrate(engine):
+    """Create missing tables and bring existing ones up to the models.
+
+    create_all() only creates missing tables, so columns and indexes added
+    to existing tables later are applied here. Added columns must be
+    nullable (SQLite can only ADD COLUMN without a default that way).
+    Tables that still name users by string are rebuilt first.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        SQLModel.metadata.create_all(conn)
+        rebuilt = _move_users_to_table(conn, inspector, existing_tables)
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                backfill = TABLE_BACKFILLS.get(table.name)
+                if backfill is not None and existing_tables:
+                    backfill(conn)
+                continue
+            if table.name in rebuilt:
+                # Created from the model; only its backfills are left
+                for name in rebuilt[table.name]:
+                    backfill = BACKFILLS.get((table.name, name))
+                    if backfill is not None:
+                        backfill(conn)
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            added = []
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                ddl = column.type.compile(dialect=conn.dialect)
+                logger.info("Adding column %s.%s", table.name, column.name)
+                conn.execute(
+                    # Identifiers come from our own metadata, not user input
+                    text(
+                        f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {ddl}'
+                    )  # nosec B608
+                )
+                added.append(column.name)
+            # Backfills run once every new column of the table exists
+            for name in added:
+                backfill = BACKFILLS.get((table.name, name))
+                if backfill is not None:
+                    backfill(conn)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -1,7 +1,9 @@
-from typing import Optional
-from sqlmodel import SQLModel, Field
-from sqlalchemy import UniqueConstraint
+from typing import Literal, Optional
+from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index, PrimaryKeyConstraint, UniqueConstraint
+import datetime as dt
 from datetime import date, time
+from pydantic import NaiveDatetime
 
 
 class MatchBase(SQLModel):
@@ -12,29 +14,220 @@ class MatchBase(SQLModel):
     joined_players: int = 0
 
 
+class User(SQLModel, table=True):
+    # Everyone seen in the identity headers (users.py). Other tables refer to
+    # people by this integer id instead of repeating the header strings.
+    id: Optional[int] = Field(default=None, primary_key=True)
+    # X-User-Id
+    external_id: str = Field(unique=True)
+    first_name: str
+    last_name: str
+
+
 class Match(MatchBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    organizer_id: int = Field(foreign_key="user.id")
+    # Loaded in the same SELECT as the match, so MatchRead can be built from
+    # the properties below after the session is gone
+    organizer: User = Relationship(sa_relationship_kwargs={"lazy": "joined"})
+    # Data version of the last change to this row, for GET /matches/changes
+    version: Optional[int] = Field(default=None, index=True)
+    # Set when the row is a materialized occurrence of a recurring series;
+    # occurrence is the series date it stands for (routers/series.py)
+    series_id: Optional[int] = Field(default=None, foreign_key="matchseries.id")
+    occurrence: Optional[date] = None
+    __table_args__ = (
+        # GET /matches walks this in order instead of sorting the table
+        Index("ix_match_date_time", "date", "time"),
+        Index("uix_match_series_occurrence", "series_id", "occurrence", unique=True),
+    )
+
+    # MatchRead keeps the organizer fields it had before users were a table
+    @property
+    def organizer_user_id(self) -> str:
+        return self.organizer.external_id
+
+    @property
+    def organizer_first_name(self) -> str:
+        return self.organizer.first_name
+
+    @property
+    def organizer_last_name(self) -> str:
+        return self.organizer.last_name
+
+
+class MatchCreate(MatchBase):
+    # Shard to store the match in when region sharding is on (sharding.py);
+    # the first region by default
+    region: Optional[str] = None
+
+
+class MatchRead(MatchBase):
+    id: int
+    # Include organizer info so the frontend can render it
     organizer_user_id: str
     organizer_first_name: str
     organizer_last_name: str
 
 
-class MatchCreate(MatchBase):
+class MatchRecommendation(MatchRead):
+    score: float
+
+
+class MatchVersionRead(MatchRead):
+    version: int
+
+
+class MatchChanges(SQLModel):
+    # Pass as ?since= on the next call
+    version: int
+    # True when matches is the whole table and the local copy must be replaced
+    full: bool
+    matches: list[MatchVersionRead]
+    deleted: list[int]
+
+
+class MatchSeriesBase(SQLModel):
+    # Weekly on start_date's weekday, every interval_weeks, through until
+    start_date: date
+    until: Optional[date] = None
+    interval_weeks: int = Field(default=1, ge=1, le=52)
+    time: time
+    location: str
+    max_players: int
+
+
+class MatchSeries(MatchSeriesBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    organizer_user_id: str
+    organizer_first_name: str
+    organizer_last_name: str
+
+
+class MatchSeriesCreate(MatchSeriesBase):
     pass
 
 
-class MatchRead(MatchBase):
+class MatchSeriesRead(MatchSeriesBase):
     id: int
-    # Include organizer info so the frontend can render it
     organizer_user_id: str
     organizer_first_name: str
     organizer_last_name: str
 
 
+class OccurrenceRead(MatchBase):
+    # None until the occurrence is materialized as a Match
+    id: Optional[int]
+    series_id: int
+    occurrence: date
+    organizer_user_id: str
+    organizer_first_name: str
+    organizer_last_name: str
+
+
+class OccurrenceUpdate(SQLModel):
+    # dt.time: a bare "time" here would resolve to the field's own default
+    time: Optional[dt.time] = None
+    location: Optional[str] = None
+    max_players: Optional[int] = Field(default=None, ge=1)
+
+
 class MatchParticipant(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     match_id: int = Field(foreign_key="match.id")
-    user_id: str
-    first_name: str
-    last_name: str
-    __table_args__ = (UniqueConstraint("match_id", "user_id", name="uix_match_user"),)
+    user_id: int = Field(foreign_key="user.id")
+    user: Optional[User] = Relationship()
+    # Copy of the match's time span so conflict checks are a range scan on
+    # (user_id, starts_at) instead of a join over the user's history
+    starts_at: Optional[NaiveDatetime] = None
+    ends_at: Optional[NaiveDatetime] = None
+    __table_args__ = (
+        UniqueConstraint("match_id", "user_id", name="uix_match_user"),
+        Index("ix_participant_user_span", "user_id", "starts_at"),
+    )
+
+
+class MatchWaitlist(SQLModel, table=True):
+    # Queue order is the autoincrement id; (match_id, id) serves both the
+    # head lookup on leave and the position count
+    id: Optional[int] = Field(default=None, primary_key=True)
+    match_id: int = Field(foreign_key="match.id")
+    user_id: int = Field(foreign_key="user.id")
+    user: Optional[User] = Relationship()
+    __table_args__ = (
+        UniqueConstraint("match_id", "user_id", name="uix_waitlist_match_user"),
+        Index("ix_waitlist_match_position", "match_id", "id"),
+    )
+
+
+class WaitlistRead(SQLModel):
+    match_id: int
+    # 1 = next in line
+    position: int
+
+
+class DataVersion(SQLModel, table=True):
+    # Single row (id=1) bumped by every write; caches key their entries on it
+    id: int = Field(default=1, primary_key=True)
+    version: int = 0
+
+
+class MatchTombstone(SQLModel, table=True):
+    # Left behind by delete_match so clients syncing by version see deletions
+    match_id: int = Field(primary_key=True)
+    version: int = Field(index=True)
+
+
+class AvailabilitySummary(SQLModel, table=True):
+    # Totals per day and pitch, adjusted by every write (availability.py)
+    date: date
+    location: str
+    matches: int = 0
+    max_players: int = 0
+    joined_players: int = 0
+    __table_args__ = (PrimaryKeyConstraint("date", "location"),)
+
+
+class AvailabilityRead(SQLModel):
+    date: date
+    location: str
+    matches: int
+    open_slots: int
+    joined_players: int
+    max_players: int
+
+
+class ReportCreate(SQLModel):
+    # attendance: matches played per player; utilisation: slots filled per
+    # location. Both over the matches dated within [from, to].
+    type: Literal["attendance", "utilisation"]
+    start: date = Field(alias="from")
+    end: date = Field(alias="to")
+
+
+class ReportRead(SQLModel):
+    id: str
+    type: str
+    start: date = Field(serialization_alias="from")
+    end: date = Field(serialization_alias="to")
+    # queued, running, done or error
+    status: str
+    # Data version the report was requested at
+    version: int
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    user_id: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    fingerprint: str
+    status_code: int
+    body: bytes
+    created_at: float = Field(index=True)
+
+
+class SlotEngineCheckpoint(SQLModel, table=True):
+    # Last op log sequence number applied to the tables (slot_engine.py)
+    id: int = Field(default=1, primary_key=True)
+    seq: int = 0
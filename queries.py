@@ -0,0 +1,137 @@
+import json
+from collections import namedtuple
+from typing import Optional
+from sqlalchemy import bindparam, select
+from models import Match, MatchTombstone, User
+
+# Read-only query layer: selects plain columns through the session's
+# connection, so no ORM instances, identity map entries or change tracking
+# are created. Column order matches MatchRead so rows serialize identically.
+# The organizer fields come from the User row, so every select of these
+# columns goes through select_matches() for the join.
+MATCH_COLUMNS = (
+    Match.date,
+    Match.time,
+    Match.location,
+    Match.max_players,
+    Match.joined_players,
+    Match.id,
+    User.external_id.label("organizer_user_id"),
+    User.first_name.label("organizer_first_name"),
+    User.last_name.label("organizer_last_name"),
+)
+FIELDS = tuple(c.key for c in MATCH_COLUMNS)
+
+MatchRow = namedtuple("MatchRow", FIELDS)
+
+
+def select_matches(*extra):
+    """SELECT MATCH_COLUMNS (then extra) FROM match JOIN its organizer."""
+    return select(*MATCH_COLUMNS, *extra).join(User, User.id == Match.organizer_id)
+
+
+# id breaks date/time ties, so pages never overlap; ix_match_date_time
+# already holds the rowid, so it costs no sort
+LIST_MATCHES = select_matches().order_by(Match.date, Match.time, Match.id)
+PAGE_MATCHES = LIST_MATCHES.limit(bindparam("limit")).offset(bindparam("offset"))
+GET_MATCH = select_matches().where(Match.id == bindparam("match_id"))
+GET_MATCHES = select_matches().where(Match.id.in_(bindparam("ids", expanding=True)))
+GET_VERSIONED_MATCHES = select_matches(Match.version).where(
+    Match.id.in_(bindparam("ids", expanding=True))
+)
+# Checks cached bodies against the rows: the primary key alone, no join
+ROW_VERSIONS = select(Match.id, Match.version).where(
+    Match.id.in_(bindparam("ids", expanding=True))
+)
+# Delta sync: both served by the index on their version column
+CHANGED_MATCHES = select_matches(Match.version).where(
+    Match.version > bindparam("since")
+)
+ALL_MATCHES = select_matches(Match.version)
+DELETED_MATCHES = select(MatchTombstone.match_id, MatchTombstone.version).where(
+    MatchTombstone.version > bindparam("since")
+)
+
+
+def list_match_rows(session) -> list:
+    return [MatchRow._make(r) for r in session.connection().execute(LIST_MATCHES)]
+
+
+def page_match_rows(session, offset: int, limit: Optional[int]) -> list:
+    # SQLite reads a negative LIMIT as no limit
+    params = {"offset": offset, "limit": -1 if limit is None else limit}
+    rows = session.connection().execute(PAGE_MATCHES, params)
+    return [MatchRow._make(r) for r in rows]
+
+
+def get_match_row(session, match_id: int) -> Optional[MatchRow]:
+    row = session.connection().execute(GET_MATCH, {"match_id": match_id}).first()
+    return MatchRow._make(row) if row is not None else None
+
+
+def get_match_rows(session, ids) -> dict:
+    """Map of id -> MatchRow for the given ids (missing ids are skipped)."""
+    if not ids:
+        return {}
+    rows = session.connection().execute(GET_MATCHES, {"ids": list(ids)})
+    return {r.id: MatchRow._make(r) for r in rows}
+
+
+def get_versioned_rows(session, ids) -> dict:
+    """Map of id -> (MatchRow, row version) for the given ids."""
+    if not ids:
+        return {}
+    rows = session.connection().execute(GET_VERSIONED_MATCHES, {"ids": list(ids)})
+    return {r.id: (MatchRow._make(r[:-1]), r[-1] or 0) for r in rows}
+
+
+def get_row_versions(session, ids) -> dict:
+    """Map of id -> row version for the given ids."""
+    if not ids:
+        return {}
+    rows = session.connection().execute(ROW_VERSIONS, {"ids": list(ids)})
+    return {r.id: r.version or 0 for r in rows}
+
+
+def row_to_dict(row) -> dict:
+    d = dict(zip(FIELDS, row))
+    d["date"] = d["date"].isoformat()
+    d["time"] = d["time"].isoformat()
+    return d
+
+
+def dump_json(data) -> bytes:
+    """Compact UTF-8 JSON, byte for byte what FastAPI's responses contain."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dump_rows(rows) -> bytes:
+    """Serialize rows exactly like FastAPI would serialize list[MatchRead]."""
+    return dump_json([row_to_dict(r) for r in rows])
+
+
+def dump_row(row) -> bytes:
+    return dump_json(row_to_dict(row))
+
+
+def changes_since(session, since: int):
+    """(changed matches as dicts with their version, deleted ids) after since.
+
+    since=0 returns every match. An id both changed and deleted in the
+    window is reported only by its latest event, so the two lists can be
+    applied in any order.
+    """
+    conn = session.connection()
+    if since:
+        rows = conn.execute(CHANGED_MATCHES, {"since": since})
+        deleted = dict(conn.execute(DELETED_MATCHES, {"since": since}).all())
+    else:
+        rows, deleted = conn.execute(ALL_MATCHES), {}
+    changed = []
+    for row in rows:
+        match, version = MatchRow._make(row[:-1]), row[-1] or 0
+        if deleted.get(match.id, -1) > version:
+            continue
+        deleted.pop(match.id, None)
+        changed.append({**row_to_dict(match), "version": version})
+    return changed, sorted(deleted)
@@ -0,0 +1,6 @@
+import threading
+
+# Set once startup has finished; cleared when shutdown or a drain starts
+# (serve.DrainingServer). GET /ready answers 503 while it is clear, so a
+# load balancer stops routing here before in-flight requests are cut off.
+ready = threading.Event()
@@ -0,0 +1,245 @@
+import heapq
+import math
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from models import Match, MatchParticipant
+from changes import current_version, subscribe
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to a pure Python loop
+    np = None
+
+# Score = sum of weighted components, each roughly in [0, 1]. An explicitly
+# requested location outweighs everything inferred from history.
+W_PREFERRED_LOCATION = 4.0
+W_HISTORY_LOCATION = 2.0
+W_TIME_OF_DAY = 1.5
+W_FULLNESS = 1.0
+W_SOON = 1.0
+TIME_OF_DAY_SIGMA = 120  # minutes
+SOON_HALF_LIFE = 3 * 1440  # minutes
+HISTORY_LIMIT = 200
+
+
+def start_minute(d, t) -> int:
+    """Minutes since 0001-01-01, comparable without any timezone handling."""
+    return d.toordinal() * 1440 + t.hour * 60 + t.minute
+
+
+class OpenMatchSnapshot:
+    """Array-backed columns of every match that still has free slots.
+
+    Built once from the database, then patched in place from committed
+    changes. If a change arrives out of sequence (another worker wrote in
+    between) the snapshot is marked stale and rebuilt on the next read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None  # None means "rebuild before use"
+        self._clear()
+
+    def _clear(self):
+        self.ids = array("q")
+        self.starts = array("q")
+        self.joined = array("q")
+        self.max_players = array("q")
+        self.locations = array("q")
+        self._index = {}
+        self.location_codes = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def location_code(self, name: str) -> int:
+        return self.location_codes.setdefault(name, len(self.location_codes))
+
+    def rebuild(self, session):
+        version = current_version(session)
+        rows = session.connection().execute(
+            select(
+                Match.id,
+                Match.date,
+                Match.time,
+                Match.joined_players,
+                Match.max_players,
+                Match.location,
+            ).where(Match.joined_players < Match.max_players)
+        )
+        with self._lock:
+            self._clear()
+            for mid, d, t, joined, max_players, location in rows:
+                self._append(mid, start_minute(d, t), joined, max_players, location)
+            self.version = version
+
+    def ensure_fresh(self, session):
+        if self.version is None or self.version != current_version(session):
+            self.rebuild(session)
+
+    def _append(self, mid, start, joined, max_players, location):
+        self._index[mid] = len(self.ids)
+        self.ids.append(mid)
+        self.starts.append(start)
+        self.joined.append(joined)
+        self.max_players.append(max_players)
+        self.locations.append(self.location_code(location))
+
+    def _remove(self, mid):
+        # Swap with the last element so removal is O(1)
+        pos = self._index.pop(mid, None)
+        if pos is None:
+            return
+        last = len(self.ids) - 1
+        for column in self._columns():
+            column[pos] = column[last]
+            column.pop()
+        if pos != last:
+            self._index[self.ids[pos]] = pos
+
+    def _columns(self):
+        return (self.ids, self.starts, self.joined, self.max_players, self.locations)
+
+    def apply(self, change):
+        with self._lock:
+            if change.kind == "reset" or self.version is None:
+                self.version = None
+                return
+            if change.version != self.version + 1:
+                self.version = None
+                return
+            m = change.match
+            self._remove(change.match_id)
+            if change.kind != "deleted" and m["joined_players"] < m["max_players"]:
+                self._append(
+                    change.match_id,
+                    start_minute(m["date"], m["time"]),
+                    m["joined_players"],
+                    m["max_players"],
+                    m["location"],
+                )
+            self.version = change.version
+
+    def top_k(
+        self,
+        k: int,
+        start: int,
+        end: int,
+        preferred_locations=(),
+        history_locations=None,
+        mean_minute_of_day: Optional[float] = None,
+        exclude=(),
+    ) -> list:
+        """Return up to k (match_id, score) pairs, best first."""
+        with self._lock:
+            preferred = {
+                self.location_codes[name]
+                for name in preferred_locations
+                if name in self.location_codes
+            }
+            history = {
+                self.location_codes[name]: weight
+                for name, weight in (history_locations or {}).items()
+                if name in self.location_codes
+            }
+            # Score on copies so writers are never blocked by a ranking
+            if np is not None:
+                columns = [
+                    np.frombuffer(c, dtype=np.int64).copy() for c in self._columns()
+                ]
+            else:
+                columns = [array("q", c) for c in self._columns()]
+            n_codes = len(self.location_codes)
+        args = (start, end, preferred, history, mean_minute_of_day, set(exclude))
+        if np is not None:
+            return _score_numpy(k, columns, n_codes, *args)
+        return _score_python(k, columns, *args)
+
+
+def _score_numpy(k, columns, n_codes, start, end, preferred, history, mean, exclude):
+    ids, starts, joined, max_players, locations = columns
+    mask = (starts >= start) & (starts <= end) & (joined < max_players)
+    if exclude:
+        mask &= ~np.isin(ids, np.fromiter(exclude, dtype=np.int64))
+    if not mask.any():
+        return []
+    ids, starts, joined, max_players, locations = (
+        c[mask] for c in (ids, starts, joined, max_players, locations)
+    )
+
+    score = W_SOON * np.exp2(-(starts - start) / SOON_HALF_LIFE)
+    score += W_FULLNESS * joined / max_players
+    if preferred:
+        score += W_PREFERRED_LOCATION * np.isin(
+            locations, np.fromiter(preferred, dtype=np.int64)
+        )
+    if history:
+        weights = np.zeros(n_codes)
+        for code, weight in history.items():
+            weights[code] = weight
+        score += W_HISTORY_LOCATION * weights[locations]
+    if mean is not None:
+        diff = np.abs(starts % 1440 - mean)
+        diff = np.minimum(diff, 1440 - diff)
+        score += W_TIME_OF_DAY * np.exp(-0.5 * (diff / TIME_OF_DAY_SIGMA) ** 2)
+
+    k = min(k, len(score))
+    top = np.argpartition(-score, k - 1)[:k]
+    top = top[np.argsort(-score[top], kind="stable")]
+    return [(int(ids[i]), float(score[i])) for i in top]
+
+
+def _score_python(k, columns, start, end, preferred, history, mean, exclude):
+    def scored():
+        for mid, s, joined, max_players, location in zip(*columns):
+            if s < start or s > end or joined >= max_players or mid in exclude:
+                continue
+            score = W_SOON * 2 ** (-(s - start) / SOON_HALF_LIFE)
+            score += W_FULLNESS * joined / max_players
+            if location in preferred:
+                score += W_PREFERRED_LOCATION
+            score += W_HISTORY_LOCATION * history.get(location, 0.0)
+            if mean is not None:
+                diff = abs(s % 1440 - mean)
+                diff = min(diff, 1440 - diff)
+                score += W_TIME_OF_DAY * math.exp(
+                    -0.5 * (diff / TIME_OF_DAY_SIGMA) ** 2
+                )
+            yield score, mid
+
+    return [(mid, score) for score, mid in heapq.nlargest(k, scored())]
+
+
+def user_history(session, user_id: int):
+    """(location weights, mean minute of day, joined match ids) for a User.id."""
+    rows = (
+        session.connection()
+        .execute(
+            select(Match.id, Match.location, Match.time)
+            .join(MatchParticipant, MatchParticipant.match_id == Match.id)
+            .where(MatchParticipant.user_id == user_id)
+            .order_by(Match.date.desc())
+            .limit(HISTORY_LIMIT)
+        )
+        .all()
+    )
+    if not rows:
+        return {}, None, set()
+    counts = Counter(location for _, location, _ in rows)
+    weights = {location: n / len(rows) for location, n in counts.items()}
+    mean = sum(t.hour * 60 + t.minute for _, _, t in rows) / len(rows)
+    return weights, mean, {mid for mid, _, _ in rows}
+
+
+def to_minute(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return start_minute(value.date(), value.time())
+
+
+snapshot = OpenMatchSnapshot()
+subscribe(snapshot.apply)
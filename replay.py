@@ -0,0 +1,187 @@
+"""Replay a traffic capture (capture.py) against a running server.
+
+    python replay.py capture/traffic.jsonl* --base-url http://127.0.0.1:8000 --speed 10
+
+--speed 1 and 10 keep the captured arrival times (compressed tenfold for
+10), so requests overlap the way they did in production; --speed max
+sends everything as fast as the capture's peak concurrency allows.
+Start the server on a copy of the database the capture began with (e.g. a
+python cli.py backup), or captured match ids will not exist.
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# Upper bound on requests in flight when replaying on the original clock
+MAX_WORKERS = 256
+PERCENTILES = (50, 90, 99)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+_DATE_SEGMENT = re.compile(r"/\d{4}-\d{2}-\d{2}(?=/|$)")
+
+
+def load(paths) -> list:
+    """Captured records from all files, oldest first; broken lines are skipped."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def endpoint(record) -> str:
+    route = record.get("route")
+    if not route:
+        route = _DATE_SEGMENT.sub("/{date}", _ID_SEGMENT.sub("/{id}", record["path"]))
+    return f"{record['method']} {route}"
+
+
+def peak_concurrency(records) -> int:
+    """Most requests that were in flight at once when captured."""
+    events = []
+    for r in records:
+        events.append((r["ts"], 1))
+        events.append((r["ts"] + r.get("duration_ms", 0) / 1000, -1))
+    peak = current = 0
+    # Ends sort before starts at the same instant
+    for _, delta in sorted(events):
+        current += delta
+        peak = max(peak, current)
+    return max(peak, 1)
+
+
+def make_sender(client: httpx.Client):
+    """send(record) -> status for an httpx client pointed at the server."""
+
+    def send(record) -> int:
+        url = record["path"]
+        if record.get("query"):
+            url = f"{url}?{record['query']}"
+        body = record.get("body") or None
+        response = client.request(
+            record["method"],
+            url,
+            headers=record.get("headers", {}),
+            content=body.encode() if body else None,
+        )
+        return response.status_code
+
+    return send
+
+
+def replay(records, send, speed=1.0) -> list:
+    """Issue every record through send(); returns per-request results.
+
+    speed=None is "max": no pacing, at most peak_concurrency() at a time.
+    """
+    if not records:
+        return []
+    workers = peak_concurrency(records) if speed is None else MAX_WORKERS
+    results = []
+    lock = threading.Lock()
+
+    def run(record):
+        started = time.perf_counter()
+        try:
+            status = send(record)
+        except Exception:
+            status = None
+        ms = (time.perf_counter() - started) * 1000
+        with lock:
+            results.append((endpoint(record), status, ms, record.get("status")))
+
+    t0 = records[0]["ts"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            if speed is not None:
+                delay = (record["ts"] - t0) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, record)
+    return results
+
+
+def percentile(ordered, q: float) -> float:
+    # Nearest rank
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(results) -> dict:
+    """endpoint -> count, errors, changed status, latency percentiles (ms)."""
+    by_endpoint = defaultdict(list)
+    for result in results:
+        by_endpoint[result[0]].append(result)
+    summary = {}
+    for name, rows in sorted(by_endpoint.items()):
+        latencies = sorted(ms for _, _, ms, _ in rows)
+        summary[name] = {
+            "count": len(rows),
+            "errors": sum(1 for _, s, _, _ in rows if s is None or s >= 500),
+            "changed": sum(1 for _, s, _, orig in rows if orig and s != orig),
+            **{f"p{q}": round(percentile(latencies, q), 2) for q in PERCENTILES},
+            "max": round(latencies[-1], 2),
+        }
+    return summary
+
+
+def parse_speed(value: str):
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive")
+    return speed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="replay.py")
+    parser.add_argument("captures", nargs="+", help="capture files, rotated ones too")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--speed", type=parse_speed, default=1.0, help="1, 10, any factor, or max"
+    )
+    args = parser.parse_args(argv)
+
+    records = load(args.captures)
+    if not records:
+        print("No captured requests")
+        return 1
+    workers = peak_concurrency(records) if args.speed is None else MAX_WORKERS
+    limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+    started = time.perf_counter()
+    with httpx.Client(base_url=args.base_url, limits=limits, timeout=30) as client:
+        results = replay(records, make_sender(client), args.speed)
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.0f}/s)")
+    print(
+        f"{'endpoint':40} {'count':>6} {'errors':>6} {'changed':>7}"
+        + "".join(f" {f'p{q}':>8}" for q in PERCENTILES)
+        + f" {'max':>8}"
+    )
+    for name, s in summarize(results).items():
+        print(
+            f"{name:40} {s['count']:6} {s['errors']:6} {s['changed']:7}"
+            + "".join(f" {s[f'p{q}']:8.2f}" for q in PERCENTILES)
+            + f" {s['max']:8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from prometheus_client import Counter, Histogram
+from changes import subscribe
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Season reports: POST /reports queues a job, GET /reports/{id} polls it.
+#
+# The aggregation runs in a process pool, so it never holds the GIL or a
+# threadpool worker that join/list requests need. Workers open the SQLite
+# file read-only and read it in keyset chunks of REPORT_CHUNK_ROWS, each its
+# own short statement, so no read lock is held between chunks. A report is
+# labelled with the data version it was requested at; finished reports are
+# reused for the same (type, from, to, version), and a request for a report
+# already being computed joins that job.
+
+REPORT_SECONDS = Histogram(
+    "report_seconds", "Time from request to finished season report", ["type"]
+)
+REPORT_JOBS = Counter(
+    "report_jobs", "Report requests by outcome (cached, joined, ok, error)", ["outcome"]
+)
+
+# Workers run below request handlers in the scheduler's eyes
+WORKER_NICENESS = 10
+# Finished or failed jobs kept for GET /reports/{id}
+MAX_JOBS = 1000
+
+
+class ReportUnavailable(Exception):
+    """Raised for a database the worker processes cannot open by path."""
+
+
+def _init_worker():
+    try:
+        os.nice(WORKER_NICENESS)
+    except OSError:
+        pass
+
+
+def _chunks(conn, sql: str, params: tuple, chunk_rows: int):
+    """Rows of sql (selecting a key column first, ordered by it) by keyset."""
+    after = 0
+    while True:
+        rows = conn.execute(sql, (*params, after, chunk_rows)).fetchall()
+        if not rows:
+            return
+        yield from rows
+        after = rows[-1][0]
+
+
+ATTENDANCE_ROWS = (
+    "SELECT p.id, u.external_id, u.first_name, u.last_name, m.location"
+    " FROM matchparticipant p"
+    " JOIN match m ON m.id = p.match_id"
+    ' JOIN "user" u ON u.id = p.user_id'
+    " WHERE m.date >= ? AND m.date <= ? AND p.id > ?"
+    " ORDER BY p.id LIMIT ?"
+)
+SEASON_MATCH_COUNT = "SELECT count(*) FROM match WHERE date >= ? AND date <= ?"
+SEASON_MATCHES = (
+    "SELECT id, location, max_players, joined_players FROM match"
+    " WHERE date >= ? AND date <= ? AND id > ? ORDER BY id LIMIT ?"
+)
+
+
+def attendance(conn, start: str, end: str, chunk_rows: int) -> dict:
+    """Matches played per player in the season, most active first."""
+    matches = conn.execute(SEASON_MATCH_COUNT, (start, end)).fetchone()[0]
+    players = {}
+    locations = defaultdict(set)
+    for _, user_id, first, last, location in _chunks(
+        conn, ATTENDANCE_ROWS, (start, end), chunk_rows
+    ):
+        entry = players.get(user_id)
+        if entry is None:
+            entry = players[user_id] = [first, last, 0]
+        entry[2] += 1
+        locations[user_id].add(location)
+    rows = [
+        {
+            "user_id": user_id,
+            "first_name": first,
+            "last_name": last,
+            "matches": played,
+            "share": round(played / matches, 4) if matches else 0.0,
+            "locations": len(locations[user_id]),
+        }
+        for user_id, (first, last, played) in players.items()
+    ]
+    rows.sort(key=lambda r: (-r["matches"], r["user_id"]))
+    return {"matches": matches, "players": rows}
+
+
+def utilisation(conn, start: str, end: str, chunk_rows: int) -> dict:
+    """Slots offered and filled per location in the season."""
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0])
+    for _, location, max_players, joined in _chunks(
+        conn, SEASON_MATCHES, (start, end), chunk_rows
+    ):
+        t = totals[location]
+        t[0] += 1
+        t[1] += max_players
+        t[2] += joined
+        t[3] += joined >= max_players
+        t[4] += joined == 0
+    rows = [
+        {
+            "location": location,
+            "matches": matches,
+            "slots": slots,
+            "filled": filled,
+            "utilisation": round(filled / slots, 4) if slots else 0.0,
+            "full_matches": full,
+            "empty_matches": empty,
+        }
+        for location, (matches, slots, filled, full, empty) in sorted(totals.items())
+    ]
+    return {"locations": rows}
+
+
+REPORTS = {"attendance": attendance, "utilisation": utilisation}
+
+
+def compute(path: str, kind: str, start: str, end: str, chunk_rows: int) -> dict:
+    """Run one report against the database file; executed in a worker."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, isolation_level=None)
+    try:
+        conn.execute("PRAGMA query_only=1")
+        return REPORTS[kind](conn, start, end, chunk_rows)
+    finally:
+        conn.close()
+
+
+def database_path(engine) -> str:
+    path = engine.url.database
+    if not path or path == ":memory:" or path.startswith("file::memory:"):
+        raise ReportUnavailable("Reports need a database file")
+    return os.path.abspath(path)
+
+
+class ReportJobs:
+    """Queued, running and finished reports plus the result cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._jobs = OrderedDict()  # id -> job dict
+        self._results = OrderedDict()  # (type, from, to, version) -> result
+        self._inflight = {}  # same key -> id of the job computing it
+        self._futures = {}  # id -> future of a job not finished yet
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                # Never fork the server's threads (and their locks) into a worker
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    def submit(self, engine, kind: str, start, end, version: int) -> dict:
+        """Job for the report, reusing a cached result or a running job."""
+        key = (kind, start.isoformat(), end.isoformat(), version)
+        with self._lock:
+            running = self._inflight.get(key)
+            if running is not None:
+                REPORT_JOBS.labels("joined").inc()
+                return dict(self._jobs[running])
+            job = {
+                "id": uuid.uuid4().hex,
+                "type": kind,
+                "start": start,
+                "end": end,
+                "version": version,
+                "status": "queued",
+                "result": None,
+                "error": None,
+            }
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                REPORT_JOBS.labels("cached").inc()
+                job.update(status="done", result=cached)
+                self._add(job)
+                return dict(job)
+            path = database_path(engine)
+            self._add(job)
+            self._inflight[key] = job["id"]
+            started = time.perf_counter()
+            future = self._executor().submit(
+                compute, path, kind, key[1], key[2], settings.REPORT_CHUNK_ROWS
+            )
+            self._futures[job["id"]] = future
+            queued = dict(job)
+        # Runs at once if the worker was quicker than us; the caller still
+        # gets the job as queued
+        future.add_done_callback(lambda f: self._finish(job, key, f, started))
+        return queued
+
+    def _finish(self, job, key, future, started):
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.exception("Report %s %s failed", job["type"], key[1:3])
+            REPORT_JOBS.labels("error").inc()
+            update = {"status": "error", "error": str(e) or type(e).__name__}
+        else:
+            REPORT_SECONDS.labels(job["type"]).observe(time.perf_counter() - started)
+            REPORT_JOBS.labels("ok").inc()
+            update = {"status": "done", "result": result}
+        with self._lock:
+            job.update(update)
+            self._inflight.pop(key, None)
+            self._futures.pop(job["id"], None)
+            if job["status"] == "done":
+                self._results[key] = job["result"]
+                while len(self._results) > settings.REPORT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+
+    def _add(self, job):
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > MAX_JOBS:
+            oldest = next(iter(self._jobs.values()))
+            if oldest["status"] in ("queued", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            future = self._futures.get(job_id)
+            if job["status"] == "queued" and future is not None and future.running():
+                job["status"] = "running"
+            return dict(job)
+
+    def clear(self):
+        """Forget finished work (the database was replaced)."""
+        with self._lock:
+            self._results.clear()
+            self._jobs = OrderedDict(
+                (i, j) for i, j in self._jobs.items() if i in self._futures
+            )
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+jobs = ReportJobs()
+
+
+@subscribe
+def _on_change(change):
+    if change.kind == "reset":
+        jobs.clear()
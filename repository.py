@@ -0,0 +1,439 @@
+import threading
+from contextlib import nullcontext
+from typing import Optional
+from fastapi import Depends, HTTPException, Request
+from sqlmodel import Session
+from changes import current_version, record_change, subscribe
+from db import get_session
+from models import Match, MatchCreate, MatchParticipant
+from queries import (
+    FIELDS,
+    MatchRow,
+    get_match_row,
+    get_row_versions,
+    get_versioned_rows,
+    list_match_rows,
+    page_match_rows,
+)
+from schedule import has_conflict, match_span
+import settings
+from sharding import next_match_id, shards
+import slot_engine
+import statements
+import users
+
+# Storage of matches behind the core endpoints: create, list/page, get, join,
+# leave and delete. MATCH_STORE picks the implementation per request:
+#
+#   sqlmodel  the SQLite tables (and the slot engine or shards when enabled)
+#   memory    a dict behind one lock, nothing persisted; for tests and for
+#             benchmarking the application layer without SQLite
+#
+# Identities are the (X-User-Id, first name, last name) header triple and
+# every method returns MatchRow tuples. Failures raise the HTTPException the
+# route answers with, so both stores behave the same to a client;
+# tests/test_repository.py is the conformance suite they share.
+
+STORES = ("sqlmodel", "memory")
+
+
+class MatchRepository:
+    """Interface of a match store; see the module comment."""
+
+    def version(self) -> int:
+        """Data version; grows with every write."""
+        raise NotImplementedError
+
+    def create(self, organizer: tuple, payload: MatchCreate) -> MatchRow:
+        raise NotImplementedError
+
+    def list(self, offset: int = 0, limit: Optional[int] = None) -> list:
+        """Matches ordered by date and time (then id), optionally one page."""
+        raise NotImplementedError
+
+    def get(self, match_id: int) -> Optional[MatchRow]:
+        raise NotImplementedError
+
+    def get_many(self, ids) -> dict:
+        """id -> (MatchRow, row version) of the ids that exist.
+
+        The row version changes with every write to that match, so it can
+        label a cached or client-held copy of the row.
+        """
+        raise NotImplementedError
+
+    def versions(self, ids) -> dict:
+        """id -> row version of the ids that exist, as in get_many()."""
+        raise NotImplementedError
+
+    def join(self, match_id: int, user: tuple) -> MatchRow:
+        raise NotImplementedError
+
+    def leave(self, match_id: int, user: tuple) -> MatchRow:
+        raise NotImplementedError
+
+    def delete(self, match_id: int, user_id: str) -> None:
+        """Delete a match of organizer user_id (an X-User-Id) nobody joined."""
+        raise NotImplementedError
+
+
+def _not_found():
+    return HTTPException(status_code=404, detail="Match not found")
+
+
+def _to_row(match: Match) -> MatchRow:
+    return MatchRow._make(getattr(match, f) for f in FIELDS)
+
+
+class SQLModelRepository(MatchRepository):
+    """The SQLite tables, through the request's session."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def version(self) -> int:
+        return current_version(self.session)
+
+    def create(self, organizer, payload):
+        m = Match(**payload.model_dump(exclude={"region"}))
+        target = nullcontext(self.session)
+        if shards.active:
+            # The id names the shard, so it is picked inside the INSERT
+            index = shards.index_of_region(payload.region)
+            m.id = next_match_id(index)
+            target = Session(shards.engines[index])
+        with target as s:
+            # Every shard has its own user table
+            m.organizer_id = users.ensure(s, *organizer)
+            s.add(m)
+            s.flush()
+            record_change(s, "created", m)
+            s.commit()
+            s.refresh(m)
+            return _to_row(m)
+
+    def list(self, offset=0, limit=None):
+        if not offset and limit is None:
+            return list_match_rows(self.session)
+        return page_match_rows(self.session, offset, limit)
+
+    def get(self, match_id):
+        return get_match_row(self.session, match_id)
+
+    def get_many(self, ids):
+        return get_versioned_rows(self.session, ids)
+
+    def versions(self, ids):
+        return get_row_versions(self.session, ids)
+
+    def join(self, match_id, user):
+        session = self.session
+        user_pk = users.ensure(session, *user)
+        if slot_engine.engine.active:
+
+            def conflict(row):
+                span = match_span(row["date"], row["time"])
+                return settings.CONFLICT_CHECK and has_conflict(session, user_pk, *span)
+
+            return MatchRow(**slot_engine.engine.join(match_id, user_pk, conflict))
+        match = session.get(Match, match_id)
+        if not match:
+            raise _not_found()
+        if match.joined_players >= match.max_players:
+            raise HTTPException(status_code=400, detail="Match is full")
+
+        existing = (
+            session.connection()
+            .execute(
+                statements.PARTICIPANT_ID, {"match_id": match_id, "user_id": user_pk}
+            )
+            .first()
+        )
+        if existing:
+            raise HTTPException(status_code=400, detail="You already joined this match")
+
+        starts_at, ends_at = match_span(match.date, match.time)
+        if settings.CONFLICT_CHECK and has_conflict(
+            session, user_pk, starts_at, ends_at
+        ):
+            raise HTTPException(
+                status_code=400, detail="You already joined a match at this time"
+            )
+
+        session.add(
+            MatchParticipant(
+                match_id=match_id,
+                user_id=user_pk,
+                starts_at=starts_at,
+                ends_at=ends_at,
+            )
+        )
+        session.connection().execute(
+            statements.DELETE_WAITLIST_OF_USER,
+            {"match_id": match_id, "user_id": user_pk},
+        )
+        match.joined_players += 1
+        session.add(match)
+        record_change(session, "joined", match)
+        session.commit()
+        session.refresh(match)
+        return _to_row(match)
+
+    def leave(self, match_id, user):
+        session = self.session
+        user_pk = users.ensure(session, *user)
+        if slot_engine.engine.active:
+
+            def conflict(queued_pk, row):
+                span = match_span(row["date"], row["time"])
+                return settings.CONFLICT_CHECK and has_conflict(
+                    session, queued_pk, *span
+                )
+
+            return MatchRow(**slot_engine.engine.leave(match_id, user_pk, conflict))
+        match = session.get(Match, match_id)
+        if not match:
+            raise _not_found()
+
+        deleted = session.connection().execute(
+            statements.DELETE_PARTICIPANT, {"match_id": match_id, "user_id": user_pk}
+        )
+        if not deleted.rowcount:
+            raise HTTPException(
+                status_code=400, detail="You have not joined this match"
+            )
+
+        # The DELETE above holds SQLite's write lock, so no other leave can
+        # promote the same waitlist entry before we commit. Queued users who
+        # joined an overlapping match since keep their place but are passed.
+        starts_at, ends_at = match_span(match.date, match.time)
+        head = None
+        queue = session.connection().execute(
+            statements.WAITLIST_QUEUE, {"match_id": match_id}
+        )
+        for entry in queue:
+            if not (
+                settings.CONFLICT_CHECK
+                and has_conflict(session, entry.user_id, starts_at, ends_at)
+            ):
+                head = entry
+                break
+        queue.close()
+        if head:
+            session.connection().execute(
+                statements.DELETE_WAITLIST_ENTRY, {"entry_id": head.id}
+            )
+            session.add(
+                MatchParticipant(
+                    match_id=match_id,
+                    user_id=head.user_id,
+                    starts_at=starts_at,
+                    ends_at=ends_at,
+                )
+            )
+        else:
+            match.joined_players = max(0, match.joined_players - 1)
+        session.add(match)
+        record_change(session, "left", match)
+        session.commit()
+        session.refresh(match)
+        return _to_row(match)
+
+    def delete(self, match_id, user_id):
+        session = self.session
+        if slot_engine.engine.active:
+            slot_engine.engine.delete(match_id, user_id)
+            return
+        match = session.get(Match, match_id)
+        if not match:
+            raise _not_found()
+        _check_delete(match.organizer_user_id, match.joined_players, user_id)
+        record_change(session, "deleted", match)
+        session.connection().execute(
+            statements.DELETE_WAITLIST_OF_MATCH, {"match_id": match_id}
+        )
+        session.delete(match)
+        session.commit()
+
+
+def _check_delete(organizer_user_id: str, joined_players: int, user_id: str):
+    if organizer_user_id != user_id:
+        raise HTTPException(
+            status_code=403, detail="Only the organizer can delete this match"
+        )
+    if joined_players != 0:
+        raise HTTPException(
+            status_code=400, detail="Cannot delete a match with joined players"
+        )
+
+
+class InMemoryRepository(MatchRepository):
+    """Matches in plain dicts behind one lock; lost when the process ends.
+
+    Users are kept by X-User-Id with their latest names, so a rename shows
+    on every match they organize, as with the user table. The waitlist and
+    the other SQL-only features are not modelled (see require_sql_store).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # id -> [date, time, location, max, joined, organizer, row version]
+        self._matches = {}
+        self._players = {}  # id -> set of X-User-Id
+        self._spans = {}  # X-User-Id -> {match id: (start, end)} for conflicts
+        self._users = {}  # X-User-Id -> (first name, last name)
+        self._order = None  # ids sorted like LIST_MATCHES, rebuilt lazily
+        self._next_id = 1
+        self._version = 0
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def version(self):
+        return self._version
+
+    def _row(self, match_id) -> MatchRow:
+        match = self._matches[match_id]
+        day, clock, location, max_players, joined, organizer = match[:6]
+        first, last = self._users[organizer]
+        return MatchRow(
+            day, clock, location, max_players, joined, match_id, organizer, first, last
+        )
+
+    def _bump(self, match_id):
+        self._version += 1
+        self._matches[match_id][6] = self._version
+
+    def _remember(self, user):
+        user_id, first, last = user
+        self._users[user_id] = (first, last)
+        return user_id
+
+    def _existing(self, match_id):
+        match = self._matches.get(match_id)
+        if match is None:
+            raise _not_found()
+        return match
+
+    def create(self, organizer, payload):
+        with self._lock:
+            match_id = self._next_id
+            self._next_id += 1
+            self._matches[match_id] = [
+                payload.date,
+                payload.time,
+                payload.location,
+                payload.max_players,
+                0,
+                self._remember(organizer),
+                0,
+            ]
+            self._players[match_id] = set()
+            self._order = None
+            self._bump(match_id)
+            return self._row(match_id)
+
+    def list(self, offset=0, limit=None):
+        with self._lock:
+            if self._order is None:
+                self._order = sorted(
+                    self._matches, key=lambda i: (*self._matches[i][:2], i)
+                )
+            ids = self._order[offset : None if limit is None else offset + limit]
+            return [self._row(i) for i in ids]
+
+    def get(self, match_id):
+        with self._lock:
+            if match_id not in self._matches:
+                return None
+            return self._row(match_id)
+
+    def get_many(self, ids):
+        with self._lock:
+            return {
+                i: (self._row(i), self._matches[i][6])
+                for i in ids
+                if i in self._matches
+            }
+
+    def versions(self, ids):
+        with self._lock:
+            return {i: self._matches[i][6] for i in ids if i in self._matches}
+
+    def join(self, match_id, user):
+        with self._lock:
+            user_id = self._remember(user)
+            match = self._existing(match_id)
+            if match[4] >= match[3]:
+                raise HTTPException(status_code=400, detail="Match is full")
+            players = self._players[match_id]
+            if user_id in players:
+                raise HTTPException(
+                    status_code=400, detail="You already joined this match"
+                )
+            start, end = match_span(match[0], match[1])
+            spans = self._spans.setdefault(user_id, {})
+            if settings.CONFLICT_CHECK and any(
+                s < end and e > start for s, e in spans.values()
+            ):
+                raise HTTPException(
+                    status_code=400, detail="You already joined a match at this time"
+                )
+            players.add(user_id)
+            spans[match_id] = (start, end)
+            match[4] += 1
+            self._bump(match_id)
+            return self._row(match_id)
+
+    def leave(self, match_id, user):
+        with self._lock:
+            user_id = self._remember(user)
+            match = self._existing(match_id)
+            players = self._players[match_id]
+            if user_id not in players:
+                raise HTTPException(
+                    status_code=400, detail="You have not joined this match"
+                )
+            players.remove(user_id)
+            self._spans[user_id].pop(match_id, None)
+            match[4] = max(0, match[4] - 1)
+            self._bump(match_id)
+            return self._row(match_id)
+
+    def delete(self, match_id, user_id):
+        with self._lock:
+            match = self._existing(match_id)
+            _check_delete(match[5], match[4], user_id)
+            del self._matches[match_id]
+            del self._players[match_id]
+            self._order = None
+            self._version += 1
+
+
+memory = InMemoryRepository()
+
+
+@subscribe
+def _on_change(change):
+    if change.kind == "reset":
+        memory.clear()
+
+
+def get_repository(session: Session = Depends(get_session)) -> MatchRepository:
+    """Route dependency: the match store selected by MATCH_STORE."""
+    if settings.MATCH_STORE == "memory":
+        return memory
+    return SQLModelRepository(session)
+
+
+def require_sql_store(request: Request):
+    """Route dependency for features that read the SQL tables directly."""
+    if settings.MATCH_STORE != "sqlmodel":
+        raise HTTPException(
+            status_code=501,
+            detail=f"{request.url.path} is not available with MATCH_STORE=memory",
+        )
@@ -0,0 +1,101 @@
+import hmac
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+import backup
+from db import engine
+import memprofile
+from sharding import shards
+import settings
+
+
+def require_admin(request: Request):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)]
+)
+
+
+def backup_jobs():
+    """(engine, target) for the database, or for every shard when sharded."""
+    if not shards.active:
+        return [(engine, backup.default_target())]
+    return [
+        (e, backup.default_target(region))
+        for region, e in zip(shards.regions, shards.engines)
+    ]
+
+
+@router.post("/backup", status_code=202)
+def start_backup():
+    """Start an online backup into BACKUP_DIR; poll GET /admin/backup."""
+    try:
+        return backup.backups.start(backup_jobs())
+    except backup.BackupRunning:
+        raise HTTPException(status_code=409, detail="A backup is already running")
+
+
+@router.get("/backup")
+def backup_status():
+    return backup.backups.status
+
+
+def _snapshot(snapshot_id: int):
+    try:
+        return memprofile.profiler.get(snapshot_id)
+    except memprofile.UnknownSnapshot:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@router.get("/memory")
+def memory_status():
+    """Whether tracemalloc runs, traced bytes and the snapshots kept."""
+    return memprofile.profiler.status()
+
+
+@router.post("/memory/snapshots", status_code=201)
+def take_memory_snapshot(
+    group: Literal["module", "package", "line"] = "module",
+    limit: int = Query(25, ge=1, le=500),
+):
+    """Keep a tracemalloc snapshot; returns its largest allocation sites."""
+    try:
+        snapshot_id, snapshot = memprofile.profiler.take()
+    except memprofile.ProfilingDisabled as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {
+        "id": snapshot_id,
+        "previous": memprofile.profiler.previous(snapshot_id),
+        "top": memprofile.top(snapshot, group, limit),
+    }
+
+
+@router.get("/memory/diff")
+def memory_diff(
+    to: int,
+    since: Optional[int] = Query(None, alias="from"),
+    group: Literal["module", "package", "line"] = "module",
+    limit: int = Query(25, ge=1, le=500),
+):
+    """Growth between two snapshots; `from` defaults to the one before `to`."""
+    newer = _snapshot(to)
+    if since is None:
+        since = memprofile.profiler.previous(to)
+        if since is None:
+            raise HTTPException(status_code=400, detail="No earlier snapshot kept")
+    return {
+        "from": since,
+        "to": to,
+        "sites": memprofile.diff(_snapshot(since), newer, group, limit),
+    }
+
+
+@router.get("/memory/routes")
+def memory_by_route():
+    """Memory left allocated per routers/matches.py route (MEMORY_PROFILING_ROUTES)."""
+    return memprofile.profiler.routes()
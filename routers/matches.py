@@ -1,7 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlmodel import Session, select
+import hashlib
+import heapq
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
 from db import get_session
-from models import Match, MatchCreate, MatchRead, MatchParticipant
+from models import (
+    AvailabilityRead,
+    Match,
+    MatchChanges,
+    MatchCreate,
+    MatchRead,
+    MatchRecommendation,
+    MatchWaitlist,
+    WaitlistRead,
+)
+import availability
+from changes import current_version, subscribe
+from compression import EncodedBody, EntityBodyCache, VersionedBodyCache
+from idempotency import Idempotency, build_store
+from export import csv_chunks, ndjson_chunks
+from queries import (
+    changes_since,
+    dump_json,
+    dump_row,
+    dump_rows,
+    get_match_rows,
+    list_match_rows,
+    row_to_dict,
+)
+import recommend
+from repository import (
+    MatchRepository,
+    SQLModelRepository,
+    get_repository,
+    require_sql_store,
+)
+import settings
+from sharding import require_unsharded, shard_of, shards
+from singleflight import SingleFlight
+import slot_engine
+import statements
+import users
 
 
 def require_identity(request: Request):
@@ -18,106 +60,439 @@ def require_identity(request: Request):
     return user_id, first_name, last_name
 
 
+def require_user(request: Request, session):
+    """(User.id, X-User-Id) of the caller; see users.ensure()."""
+    user_id, first_name, last_name = require_identity(request)
+    return users.ensure(session, user_id, first_name, last_name), user_id
+
+
 router = APIRouter(prefix="/matches", tags=["matches"])
 
+# Serialized (and lazily compressed) GET /matches body for the current version
+_list_cache = VersionedBodyCache()
+
+# Serialized single matches by id, labelled with their row version
+_entities = EntityBodyCache("match", settings.MATCH_CACHE_SIZE)
+
+# Identical reads arriving together share one query and serialization
+_flights = SingleFlight()
+
+
+def _flight_key(request: Request, version: int):
+    return request.url.path, request.url.query, version
+
+
+# Retries carrying an Idempotency-Key are answered from here
+idempotency = Idempotency(build_store())
+
+
+@subscribe
+def _on_change(change):
+    if change.kind == "reset":
+        _list_cache.clear()
+        _entities.clear()
+        idempotency.store.clear()
+    else:
+        # Every committed write, including slot engine, series and waitlist
+        # ones that bypass the routes below
+        _entities.invalidate(change.match_id)
+
 
 @router.post("", response_model=MatchRead, status_code=201)
 def create_match(
-    payload: MatchCreate, request: Request, session: Session = Depends(get_session)
+    payload: MatchCreate,
+    request: Request,
+    repo: MatchRepository = Depends(get_repository),
 ):
-    user_id, first_name, last_name = require_identity(request)
-    m = Match(
-        **payload.model_dump(),
-        organizer_user_id=user_id,
-        organizer_first_name=first_name,
-        organizer_last_name=last_name
+    organizer = require_identity(request)
+
+    def create():
+        return repo.create(organizer, payload)._asdict()
+
+    return idempotency.run(
+        request, organizer[0], create, MatchRead, status_code=201, payload=payload
     )
-    session.add(m)
-    session.commit()
-    session.refresh(m)
-    return m
 
 
 @router.get("", response_model=list[MatchRead])
-def list_matches(session: Session = Depends(get_session)):
-    return session.exec(select(Match).order_by(Match.date, Match.time)).all()
+def list_matches(
+    request: Request,
+    ids: list[int] = Query([]),
+    repo: MatchRepository = Depends(get_repository),
+):
+    """Every match, or with ?ids=1&ids=2 only those (unknown ids are left out)."""
+    if ids:
+        return _batch(request, repo, ids)
+    if shards.active:
+        return _list_sharded(request)
+    # Read the version before the rows: a body may then be fresher than its
+    # label, never staler
+    version = repo.version()
+    body = _list_cache.get(version)
+    if body is None:
 
+        def build():
+            data = dump_rows(repo.list())
+            body = EncodedBody(data, "application/json", f'"matches-v{version}"')
+            _list_cache.put(version, body)
+            return body
 
-@router.put("/{match_id}/join", response_model=MatchRead)
-def join_match(
-    match_id: int, request: Request, session: Session = Depends(get_session)
+        body = _flights.do(_flight_key(request, version), build, "/matches")
+    return body.response(request)
+
+
+def _match_bodies(repo: MatchRepository, ids) -> dict:
+    """id -> EncodedBody of each existing match, from _entities when cached.
+
+    Every cached body is checked against the row's current version, so a
+    write committed by another worker is seen on the next read.
+    """
+    token = _entities.token()
+    found, missing = {}, []
+    for match_id, version in _per_shard(repo, "versions", ids).items():
+        body = _entities.get(match_id, version)
+        if body is None:
+            missing.append(match_id)
+        else:
+            found[match_id] = body
+    if missing:
+        for match_id, (row, version) in _per_shard(repo, "get_many", missing).items():
+            body = EncodedBody(
+                dump_row(row), "application/json", f'"match-{match_id}-v{version}"'
+            )
+            _entities.put(match_id, version, body, token)
+            found[match_id] = body
+    return found
+
+
+def _per_shard(repo: MatchRepository, method: str, ids) -> dict:
+    """Merged results of repo.<method>(ids), asked of each id's shard."""
+    if not shards.active:
+        return getattr(repo, method)(ids)
+    by_shard = defaultdict(list)
+    for match_id in ids:
+        if 0 <= shard_of(match_id) < len(shards.engines):
+            by_shard[shard_of(match_id)].append(match_id)
+    found = {}
+    for index, shard_ids in by_shard.items():
+        with Session(shards.engines[index]) as s:
+            found.update(getattr(SQLModelRepository(s), method)(shard_ids))
+    return found
+
+
+def _batch(request: Request, repo: MatchRepository, ids):
+    ids = list(dict.fromkeys(ids))
+    bodies = _match_bodies(repo, ids)
+    parts = [bodies[i] for i in ids if i in bodies]
+    # The batch is as fresh as its rows, so its tag is made of theirs
+    tags = ",".join(b.etag for b in parts).encode()
+    etag = f'"matches-{hashlib.sha1(tags).hexdigest()[:20]}"'
+    data = b"[" + b",".join(b.body for b in parts) + b"]"
+    return EncodedBody(data, "application/json", etag).response(request)
+
+
+def _list_sharded(request: Request):
+    """GET /matches over every shard: a k-way merge of their sorted lists.
+
+    The cache key is the tuple of shard versions; each only grows, so a
+    newer tuple never compares lower than an older one.
+    """
+    with shards.sessions() as sessions:
+        versions = tuple(current_version(s) for s in sessions)
+        body = _list_cache.get(versions)
+        if body is None:
+
+            def build():
+                rows = heapq.merge(
+                    *(list_match_rows(s) for s in sessions),
+                    key=lambda r: (r.date, r.time, r.id),
+                )
+                tag = ".".join(map(str, versions))
+                body = EncodedBody(
+                    dump_rows(rows), "application/json", f'"matches-v{tag}"'
+                )
+                _list_cache.put(versions, body)
+                return body
+
+            body = _flights.do(_flight_key(request, versions), build, "/matches")
+    return body.response(request)
+
+
+@router.get(
+    "/changes",
+    response_model=MatchChanges,
+    dependencies=[Depends(require_unsharded), Depends(require_sql_store)],
+)
+def match_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    session: Session = Depends(get_session),
 ):
-    user_id, first_name, last_name = require_identity(request)
-    match = session.get(Match, match_id)
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
-    if match.joined_players >= match.max_players:
-        raise HTTPException(status_code=400, detail="Match is full")
+    """Matches changed and ids deleted after data version `since`.
 
-    existing = session.exec(
-        select(MatchParticipant).where(
-            MatchParticipant.match_id == match_id, MatchParticipant.user_id == user_id
-        )
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="You already joined this match")
-
-    session.add(
-        MatchParticipant(
-            match_id=match_id,
-            user_id=user_id,
-            first_name=first_name,
-            last_name=last_name,
+    A client keeps its own copy, applies both lists, and passes the
+    returned version next time. since=0, or a version this database never
+    reached (it was replaced), returns the whole table with full=true.
+    """
+    # Read the version first: rows written meanwhile are sent again next
+    # time, which is harmless, instead of being skipped
+    version = current_version(session)
+    full = since == 0 or since > version
+
+    def build():
+        matches, deleted = changes_since(session, 0 if full else since)
+        data = dump_json(
+            {"version": version, "full": full, "matches": matches, "deleted": deleted}
         )
+        etag = f'"changes-{0 if full else since}-v{version}"'
+        return EncodedBody(data, "application/json", etag)
+
+    body = _flights.do(_flight_key(request, version), build, "/matches/changes")
+    return body.response(request)
+
+
+@router.get(
+    "/summary",
+    response_model=list[AvailabilityRead],
+    dependencies=[Depends(require_sql_store)],
+)
+def availability_summary(
+    request: Request,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    session: Session = Depends(get_session),
+):
+    """Open slots per day and location, a week from today by default."""
+    start = start or date.today()
+    end = end or start + timedelta(days=6)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    if shards.active:
+        with shards.sessions() as sessions:
+            tag = ".".join(str(current_version(s)) for s in sessions)
+            data = dump_json(availability.merged_summary(sessions, start, end))
+        etag = f'"summary-{start}-{end}-v{tag}"'
+        return EncodedBody(data, "application/json", etag).response(request)
+    version = current_version(session)
+
+    def build():
+        data = dump_json(availability.summary(session, start, end))
+        etag = f'"summary-{start}-{end}-v{version}"'
+        return EncodedBody(data, "application/json", etag)
+
+    body = _flights.do(_flight_key(request, version), build, "/matches/summary")
+    return body.response(request)
+
+
+@router.get("/export", dependencies=[Depends(require_sql_store)])
+def export_matches(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    include_participants: bool = False,
+    session: Session = Depends(get_session),
+):
+    # The stream outlives the request's session, so it opens its own
+    # connection on the same engine
+    engine = shards.engines if shards.active else session.get_bind()
+    if format == "csv":
+        chunks, media_type = csv_chunks(engine, include_participants), "text/csv"
+    else:
+        chunks = ndjson_chunks(engine, include_participants)
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="matches.{format}"'},
     )
-    match.joined_players += 1
-    session.add(match)
-    session.commit()
-    session.refresh(match)
-    return match
+
+
+@router.get(
+    "/recommend",
+    response_model=list[MatchRecommendation],
+    dependencies=[Depends(require_unsharded), Depends(require_sql_store)],
+)
+def recommend_matches(
+    request: Request,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    location: list[str] = Query([]),
+    limit: int = Query(10, ge=1, le=100),
+    session: Session = Depends(get_session),
+):
+    """Upcoming matches with free slots, ranked for the calling user."""
+    user_id, first_name, last_name = require_identity(request)
+    start = start or datetime.now()
+    end = end or start + timedelta(days=14)
+
+    recommend.snapshot.ensure_fresh(session)
+    user_pk = users.lookup(session, user_id)
+    history, mean_minute, joined_ids = {}, None, set()
+    if user_pk is not None:
+        history, mean_minute, joined_ids = recommend.user_history(session, user_pk)
+    ranked = recommend.snapshot.top_k(
+        limit,
+        recommend.to_minute(start),
+        recommend.to_minute(end),
+        preferred_locations=location,
+        history_locations=history,
+        mean_minute_of_day=mean_minute,
+        exclude=joined_ids,
+    )
+    rows = get_match_rows(session, [mid for mid, _ in ranked])
+    return [
+        {**row_to_dict(rows[mid]), "score": score}
+        for mid, score in ranked
+        if mid in rows
+    ]
+
+
+@router.get("/{match_id}", response_model=MatchRead)
+def get_match(
+    match_id: int, request: Request, repo: MatchRepository = Depends(get_repository)
+):
+    """One match, answered from _entities once it has been read."""
+    body = _match_bodies(repo, [match_id]).get(match_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Match not found")
+    return body.response(request)
+
+
+@router.put("/{match_id}/join", response_model=MatchRead)
+def join_match(
+    match_id: int, request: Request, repo: MatchRepository = Depends(get_repository)
+):
+    user = require_identity(request)
+
+    def join():
+        row = repo.join(match_id, user)
+        _entities.invalidate(match_id)
+        return row._asdict()
+
+    return idempotency.run(request, user[0], join, MatchRead)
 
 
 @router.delete("/{match_id}", status_code=204)
 def delete_match(
-    match_id: int, request: Request, session: Session = Depends(get_session)
+    match_id: int, request: Request, repo: MatchRepository = Depends(get_repository)
 ):
     user_id, first_name, last_name = require_identity(request)
-    match = session.get(Match, match_id)
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+    repo.delete(match_id, user_id)
+    _entities.invalidate(match_id)
+
+
+@router.put("/{match_id}/leave", response_model=MatchRead)
+def leave_match(
+    match_id: int, request: Request, repo: MatchRepository = Depends(get_repository)
+):
+    user = require_identity(request)
+
+    def leave():
+        row = repo.leave(match_id, user)
+        _entities.invalidate(match_id)
+        return row._asdict()
 
-    if match.organizer_user_id != user_id:
-        raise HTTPException(
-            status_code=403, detail="Only the organizer can delete this match"
+    return idempotency.run(request, user[0], leave, MatchRead)
+
+
+def _waitlist_position(session, match_id: int, user_pk: Optional[int]):
+    if user_pk is None:
+        return None
+    params = {"match_id": match_id, "user_id": user_pk}
+    entry_id = (
+        session.connection().execute(statements.WAITLIST_ENTRY_ID, params).scalar()
+    )
+    if entry_id is None:
+        return None
+    return (
+        session.connection()
+        .execute(
+            statements.WAITLIST_POSITION, {"match_id": match_id, "entry_id": entry_id}
         )
-    if match.joined_players != 0:
-        raise HTTPException(
-            status_code=400, detail="Cannot delete a match with joined players"
+        .scalar()
+    )
+
+
+@router.put(
+    "/{match_id}/waitlist",
+    response_model=WaitlistRead,
+    dependencies=[Depends(require_sql_store)],
+)
+def join_waitlist(
+    match_id: int, request: Request, session: Session = Depends(get_session)
+):
+    """Queue for a full match; leave_match hands the next free slot over."""
+    user_pk, user_id = require_user(request, session)
+
+    def enqueue():
+        if slot_engine.engine.active:
+            position = slot_engine.engine.enqueue(match_id, user_pk)
+            return WaitlistRead(match_id=match_id, position=position)
+        match = session.get(Match, match_id)
+        if not match:
+            raise HTTPException(status_code=404, detail="Match not found")
+        existing = (
+            session.connection()
+            .execute(
+                statements.PARTICIPANT_ID, {"match_id": match_id, "user_id": user_pk}
+            )
+            .first()
         )
-    session.delete(match)
-    session.commit()
+        if existing:
+            raise HTTPException(status_code=400, detail="You already joined this match")
+        if match.joined_players < match.max_players:
+            raise HTTPException(
+                status_code=400, detail="Match has free slots, join it directly"
+            )
+        position = _waitlist_position(session, match_id, user_pk)
+        if position is None:
+            session.add(MatchWaitlist(match_id=match_id, user_id=user_pk))
+            session.commit()
+            position = _waitlist_position(session, match_id, user_pk)
+        return WaitlistRead(match_id=match_id, position=position)
 
+    return idempotency.run(request, user_id, enqueue, WaitlistRead)
 
-@router.put("/{match_id}/leave", response_model=MatchRead)
-def leave_match(
+
+@router.get(
+    "/{match_id}/waitlist",
+    response_model=WaitlistRead,
+    dependencies=[Depends(require_sql_store)],
+)
+def waitlist_position(
     match_id: int, request: Request, session: Session = Depends(get_session)
 ):
     user_id, first_name, last_name = require_identity(request)
-    match = session.get(Match, match_id)
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+    # A read: a caller without a User row is on no waitlist
+    user_pk = users.lookup(session, user_id)
+    if slot_engine.engine.active:
+        position = slot_engine.engine.waitlist_position(match_id, user_pk)
+    else:
+        position = _waitlist_position(session, match_id, user_pk)
+    if position is None:
+        raise HTTPException(status_code=404, detail="You are not on the waitlist")
+    return WaitlistRead(match_id=match_id, position=position)
 
-    participant = session.exec(
-        select(MatchParticipant).where(
-            MatchParticipant.match_id == match_id, MatchParticipant.user_id == user_id
-        )
-    ).first()
-    if not participant:
-        raise HTTPException(status_code=400, detail="You have not joined this match")
 
-    session.delete(participant)
-    match.joined_players = max(0, match.joined_players - 1)
-    session.add(match)
+@router.delete(
+    "/{match_id}/waitlist",
+    status_code=204,
+    dependencies=[Depends(require_sql_store)],
+)
+def leave_waitlist(
+    match_id: int, request: Request, session: Session = Depends(get_session)
+):
+    user_id, first_name, last_name = require_identity(request)
+    user_pk = users.lookup(session, user_id)
+    if slot_engine.engine.active:
+        if not slot_engine.engine.dequeue(match_id, user_pk):
+            raise HTTPException(status_code=404, detail="You are not on the waitlist")
+        return
+    params = {"match_id": match_id, "user_id": user_pk}
+    entry_id = (
+        session.connection().execute(statements.WAITLIST_ENTRY_ID, params).scalar()
+    )
+    if entry_id is None:
+        raise HTTPException(status_code=404, detail="You are not on the waitlist")
+    session.connection().execute(
+        statements.DELETE_WAITLIST_ENTRY, {"entry_id": entry_id}
+    )
     session.commit()
-    session.refresh(match)
-    return match
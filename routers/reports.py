@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlmodel import Session
+from changes import current_version
+from db import get_session
+from models import ReportCreate, ReportRead
+import reports
+from repository import require_sql_store
+from routers.admin import require_admin
+from sharding import require_unsharded
+
+# Reports list every player's attendance, so only operators may run them
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"],
+    dependencies=[Depends(require_admin), Depends(require_sql_store)],
+)
+
+
+@router.post(
+    "",
+    response_model=ReportRead,
+    status_code=202,
+    dependencies=[Depends(require_unsharded)],
+)
+def create_report(
+    payload: ReportCreate,
+    response: Response,
+    session: Session = Depends(get_session),
+):
+    """Queue a season report; poll GET /reports/{id} for the result."""
+    if payload.end < payload.start:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    version = current_version(session)
+    try:
+        job = reports.jobs.submit(
+            session.get_bind(), payload.type, payload.start, payload.end, version
+        )
+    except reports.ReportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    if job["status"] == "done":
+        # Answered from the cache
+        response.status_code = 200
+    return job
+
+
+@router.get("/{report_id}", response_model=ReportRead)
+def get_report(report_id: str):
+    job = reports.jobs.get(report_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return job
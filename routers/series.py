@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlmodel import Session
+from db import get_session
+from models import (
+    MatchRead,
+    MatchSeries,
+    MatchSeriesCreate,
+    MatchSeriesRead,
+    OccurrenceRead,
+    OccurrenceUpdate,
+)
+from repository import SQLModelRepository, require_sql_store
+from routers.matches import join_match, require_identity
+import series
+from sharding import require_unsharded
+import slot_engine
+
+# Series and their occurrences live in a single database
+router = APIRouter(
+    prefix="/series",
+    tags=["series"],
+    dependencies=[Depends(require_unsharded), Depends(require_sql_store)],
+)
+
+# Occurrences are generated per request, so bound how many a range can ask for
+MAX_RANGE_DAYS = 366
+
+
+@router.post("", response_model=MatchSeriesRead, status_code=201)
+def create_series(
+    payload: MatchSeriesCreate,
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    user_id, first_name, last_name = require_identity(request)
+    if payload.until is not None and payload.until < payload.start_date:
+        raise HTTPException(status_code=400, detail="'until' is before 'start_date'")
+    s = MatchSeries(
+        **payload.model_dump(),
+        organizer_user_id=user_id,
+        organizer_first_name=first_name,
+        organizer_last_name=last_name,
+    )
+    session.add(s)
+    session.commit()
+    session.refresh(s)
+    return s
+
+
+@router.get("/occurrences", response_model=list[OccurrenceRead])
+def list_occurrences(
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    series_id: Optional[int] = None,
+    session: Session = Depends(get_session),
+):
+    """Occurrences in a date range, four weeks from today by default."""
+    start = start or date.today()
+    end = end or start + timedelta(weeks=4)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' is before 'from'")
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days"
+        )
+    return series.list_occurrences(session, start, end, series_id)
+
+
+def _get_series(session, series_id: int) -> MatchSeries:
+    s = session.get(MatchSeries, series_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return s
+
+
+def _get_occurrence(session, series_id: int, day: date) -> MatchSeries:
+    s = _get_series(session, series_id)
+    if not series.is_occurrence(s, day):
+        raise HTTPException(status_code=404, detail="No occurrence on this date")
+    return s
+
+
+@router.get("/{series_id}", response_model=MatchSeriesRead)
+def get_series(series_id: int, session: Session = Depends(get_session)):
+    return _get_series(session, series_id)
+
+
+@router.put("/{series_id}/occurrences/{day}/join", response_model=MatchRead)
+def join_occurrence(
+    series_id: int,
+    day: date,
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """Join one occurrence; it becomes a regular match from here on."""
+    require_identity(request)
+    s = _get_occurrence(session, series_id, day)
+    match = series.materialize(session, s, day)
+    return join_match(match.id, request, SQLModelRepository(session))
+
+
+@router.patch("/{series_id}/occurrences/{day}", response_model=MatchRead)
+def edit_occurrence(
+    series_id: int,
+    day: date,
+    payload: OccurrenceUpdate,
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """Change the time, location or size of a single occurrence."""
+    user_id, first_name, last_name = require_identity(request)
+    s = _get_occurrence(session, series_id, day)
+    fields = payload.model_dump(exclude_unset=True, exclude_none=True)
+    # Checked before materializing so a rejected edit creates no row
+    series.check_edit(s.organizer_user_id, 0, user_id, fields)
+    if not fields:
+        raise HTTPException(status_code=400, detail="Nothing to change")
+    match = series.materialize(session, s, day)
+    if slot_engine.engine.active:
+        return slot_engine.engine.edit(match.id, user_id, fields)
+    series.check_edit(match.organizer_user_id, match.joined_players, user_id, fields)
+    series.update_match(session, match, fields)
+    session.commit()
+    session.refresh(match)
+    return match
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+import settings
+import statements
+
+
+def match_span(match_date, match_time):
+    """(start, end) of a match, using the configured match length."""
+    start = datetime.combine(match_date, match_time)
+    return start, start + timedelta(minutes=settings.MATCH_DURATION_MINUTES)
+
+
+def has_conflict(session, user_id: int, start: datetime, end: datetime) -> bool:
+    """True if the user already plays in a match overlapping [start, end).
+
+    Runs as a bounded range scan on ix_participant_user_span, so the cost
+    depends on the overlapping rows, not on the length of the history.
+    """
+    earliest = start - timedelta(minutes=settings.MATCH_DURATION_MINUTES)
+    params = {"user_id": user_id, "earliest": earliest, "start": start, "end": end}
+    row = session.connection().execute(statements.PARTICIPANT_CONFLICT, params)
+    return row.first() is not None
@@ -0,0 +1,153 @@
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import bindparam, or_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from changes import record_change
+from models import Match, MatchSeries
+from queries import MATCH_COLUMNS, MatchRow, row_to_dict, select_matches
+from schedule import match_span
+import statements
+import users
+
+# A series is a weekly template; its occurrences only exist as rows once
+# someone joins one or the organizer edits it. Everything else is computed
+# from the template, so storage and list cost follow the materialized
+# occurrences, not the length of the calendar.
+
+SERIES_IN_RANGE = select(MatchSeries).where(
+    MatchSeries.start_date <= bindparam("end"),
+    or_(MatchSeries.until.is_(None), MatchSeries.until >= bindparam("start")),
+)
+
+
+def occurrence_dates(series, start: date, end: date):
+    """Dates of the series' occurrences within [start, end]."""
+    step = timedelta(weeks=series.interval_weeks)
+    last = min(end, series.until) if series.until else end
+    first = series.start_date
+    if start > first:
+        # Jump straight to the first occurrence on or after start
+        first += step * -(-(start - first).days // step.days)
+    day = first
+    while day <= last:
+        yield day
+        day += step
+
+
+def is_occurrence(series, day: date) -> bool:
+    if day < series.start_date or (series.until and day > series.until):
+        return False
+    return (day - series.start_date).days % (7 * series.interval_weeks) == 0
+
+
+def _find(session, series_id: int, day: date) -> Optional[Match]:
+    return session.exec(
+        select(Match).where(Match.series_id == series_id, Match.occurrence == day)
+    ).first()
+
+
+def materialize(session, series, day: date) -> Match:
+    """The Match row standing for an occurrence, created on first use."""
+    match = _find(session, series.id, day)
+    if match is not None:
+        return match
+    # Templates keep the organizer's header values as they were when the
+    # series was created; a newer name on the User row wins
+    organizer_id = users.ensure(
+        session,
+        series.organizer_user_id,
+        series.organizer_first_name,
+        series.organizer_last_name,
+        rename=False,
+    )
+    match = Match(
+        date=day,
+        time=series.time,
+        location=series.location,
+        max_players=series.max_players,
+        organizer_id=organizer_id,
+        series_id=series.id,
+        occurrence=day,
+    )
+    session.add(match)
+    try:
+        session.flush()
+    except IntegrityError:
+        # Another request materialized it first (uix_match_series_occurrence)
+        session.rollback()
+        return _find(session, series.id, day)
+    record_change(session, "created", match)
+    session.commit()
+    return match
+
+
+def check_edit(organizer_user_id, joined_players, user_id, fields: dict):
+    if organizer_user_id != user_id:
+        raise HTTPException(
+            status_code=403, detail="Only the organizer can edit this match"
+        )
+    if fields.get("max_players", joined_players) < joined_players:
+        raise HTTPException(
+            status_code=400, detail="Cannot make a match smaller than its players"
+        )
+
+
+def update_match(session, match, fields: dict):
+    """Apply edited fields to a match inside the caller's transaction."""
+    for name, value in fields.items():
+        setattr(match, name, value)
+    if "time" in fields:
+        start, end = match_span(match.date, match.time)
+        session.connection().execute(
+            statements.UPDATE_PARTICIPANT_SPANS,
+            {"moved_match_id": match.id, "start": start, "end": end},
+        )
+    session.add(match)
+    record_change(session, "updated", match)
+
+
+def list_occurrences(session, start: date, end: date, series_id=None) -> list:
+    """Occurrences of every series (or one) in [start, end], by date and time.
+
+    Materialized occurrences are reported from their Match row, the rest
+    from the template with id None.
+    """
+    stmt = SERIES_IN_RANGE
+    if series_id is not None:
+        stmt = stmt.where(MatchSeries.id == series_id)
+    templates = session.exec(stmt, params={"start": start, "end": end}).all()
+    if not templates:
+        return []
+    rows = session.connection().execute(
+        select_matches(Match.series_id, Match.occurrence).where(
+            Match.series_id.in_([s.id for s in templates]),
+            Match.occurrence >= start,
+            Match.occurrence <= end,
+        )
+    )
+    concrete = {(r.series_id, r.occurrence): r for r in rows}
+    result = []
+    for s in templates:
+        for day in occurrence_dates(s, start, end):
+            row = concrete.get((s.id, day))
+            if row is not None:
+                item = row_to_dict(MatchRow._make(row[: len(MATCH_COLUMNS)]))
+            else:
+                item = {
+                    "date": day.isoformat(),
+                    "time": s.time.isoformat(),
+                    "location": s.location,
+                    "max_players": s.max_players,
+                    "joined_players": 0,
+                    "id": None,
+                    "organizer_user_id": s.organizer_user_id,
+                    "organizer_first_name": s.organizer_first_name,
+                    "organizer_last_name": s.organizer_last_name,
+                }
+            item["series_id"] = s.id
+            item["occurrence"] = day.isoformat()
+            result.append(item)
+    result.sort(key=lambda m: (m["date"], m["time"]))
+    return result
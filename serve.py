@@ -0,0 +1,193 @@
+"""Run the app with a launch profile: python serve.py --profile production
+
+dev mirrors a bare "uvicorn main:app". production picks uvloop and
+httptools when they are installed, one worker per available core,
+keep-alive longer than a load balancer's idle timeout, a connection
+limit, no access log or SQL echo, WAL with background maintenance, and a
+graceful drain on SIGTERM.
+
+Several workers need IDEMPOTENCY_SQLITE, so a retried request finds its
+key whichever worker it lands on, and cannot be combined with SLOT_ENGINE,
+which keeps match state in one process. Of several workers only the one
+holding MAINTENANCE_LOCK runs maintenance.
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import threading
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+import readiness
+
+logger = logging.getLogger(__name__)
+
+# More processes than this only queue up behind SQLite's single writer
+MAX_AUTO_WORKERS = 8
+
+PROFILES = {
+    "dev": {
+        "loop": "asyncio",
+        "http": "h11",
+        "workers": 1,
+        "backlog": 2048,
+        "timeout_keep_alive": 5,
+        "limit_concurrency": None,
+        "timeout_graceful_shutdown": None,
+        "drain_seconds": 0.0,
+        "access_log": True,
+        "db_echo": True,
+        "env": {},
+    },
+    "production": {
+        "loop": "uvloop",
+        "http": "httptools",
+        "workers": 0,  # one per available core
+        "backlog": 4096,
+        # Above the usual 60s idle timeout of load balancers, so they close
+        # idle connections first and never reuse one we just closed
+        "timeout_keep_alive": 75,
+        # Per worker; requests past this get a 503 instead of queueing
+        "limit_concurrency": 1000,
+        "timeout_graceful_shutdown": 30,
+        # /ready answers 503 this long before shutdown begins
+        "drain_seconds": 5.0,
+        "access_log": False,
+        "db_echo": False,
+        # WAL, the maintenance scheduler (maintenance.py) and idempotency
+        # keys every worker can see
+        "env": {"SQLITE_WAL": "1", "MAINTENANCE": "1", "IDEMPOTENCY_SQLITE": "1"},
+    },
+}
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def cpu_limit() -> int:
+    """Cores this process may use, honouring affinity and a cgroup v2 quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def autotune_workers(slot_engine: bool = False) -> int:
+    # The slot engine keeps authoritative state in one process
+    if slot_engine:
+        return 1
+    return max(1, min(cpu_limit(), MAX_AUTO_WORKERS))
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn Server that stops reporting ready before it shuts down.
+
+    On the first SIGTERM/SIGINT, /ready starts answering 503 while the
+    server keeps serving for drain_seconds, so the load balancer can take
+    the instance out. Then uvicorn's graceful shutdown stops accepting
+    connections and waits for in-flight requests. A second signal skips
+    the rest of the drain.
+    """
+
+    def __init__(self, config, drain_seconds: float = 0.0):
+        super().__init__(config)
+        self.drain_seconds = drain_seconds
+        self._drain_timer = None
+
+    def handle_exit(self, sig, frame):
+        readiness.ready.clear()
+        if self._drain_timer is None and self.drain_seconds > 0:
+            logger.info("Draining for %.1fs before shutdown", self.drain_seconds)
+            self._drain_timer = threading.Timer(
+                self.drain_seconds, super().handle_exit, (sig, frame)
+            )
+            self._drain_timer.daemon = True
+            self._drain_timer.start()
+            return
+        if self._drain_timer is not None and self._drain_timer.is_alive():
+            self._drain_timer.cancel()
+        super().handle_exit(sig, frame)
+
+
+def build_config(profile: str, **overrides) -> tuple:
+    """(uvicorn Config, drain seconds) for a profile and CLI overrides."""
+    options = dict(PROFILES[profile])
+    options.update({k: v for k, v in overrides.items() if v is not None})
+    if options["loop"] == "uvloop" and not available("uvloop"):
+        options["loop"] = "asyncio"
+    if options["http"] == "httptools" and not available("httptools"):
+        options["http"] = "h11"
+    # Read by settings.py when the app is imported, in every worker, so it
+    # must be in place before the first import of settings
+    os.environ.setdefault("DB_ECHO", "1" if options.pop("db_echo") else "0")
+    for name, value in options.pop("env").items():
+        os.environ.setdefault(name, value)
+    import settings
+
+    if not options["workers"]:
+        options["workers"] = autotune_workers(settings.SLOT_ENGINE)
+    if options["workers"] > 1:
+        if settings.SLOT_ENGINE:
+            raise RuntimeError(
+                "SLOT_ENGINE keeps match state in one process; use 1 worker"
+            )
+        if not settings.IDEMPOTENCY_SQLITE:
+            raise RuntimeError(
+                "Several workers need IDEMPOTENCY_SQLITE=1 to share replays"
+            )
+    drain_seconds = options.pop("drain_seconds")
+    host, port = options.pop("host", "127.0.0.1"), options.pop("port", 8000)
+    config = uvicorn.Config("main:app", host=host, port=port, **options)
+    return config, drain_seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="serve.py")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="dev")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, help="0 = one per core")
+    parser.add_argument("--backlog", type=int)
+    parser.add_argument("--timeout-keep-alive", type=int)
+    parser.add_argument("--limit-concurrency", type=int)
+    parser.add_argument("--drain-seconds", type=float)
+    args = parser.parse_args(argv)
+
+    config, drain_seconds = build_config(
+        args.profile,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        timeout_keep_alive=args.timeout_keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        drain_seconds=args.drain_seconds,
+    )
+    logger.info(
+        "Serving with the %s profile: loop=%s http=%s workers=%d",
+        args.profile,
+        config.loop,
+        config.http,
+        config.workers,
+    )
+    server = DrainingServer(config, drain_seconds)
+    if config.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,106 @@
+import os
+
+
+def _bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+# Idempotency-Key support for POST /matches and join/leave
+IDEMPOTENCY_TTL_SECONDS = _int("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60)
+IDEMPOTENCY_MAX_ENTRIES = _int("IDEMPOTENCY_MAX_ENTRIES", 10_000)
+# Also persist results in SQLite so replays survive restarts and other workers
+IDEMPOTENCY_SQLITE = _bool("IDEMPOTENCY_SQLITE")
+
+# Identity header -> User.id mappings kept in memory (users.py)
+USER_CACHE_SIZE = _int("USER_CACHE_SIZE", 10_000)
+
+# Store behind create/list/join/leave/delete (repository.py): "sqlmodel" for
+# the SQLite tables, "memory" for an unpersisted in-process store that only
+# serves those endpoints (tests and application-layer benchmarks)
+MATCH_STORE = os.environ.get("MATCH_STORE", "sqlmodel")
+
+# Serialized single matches kept for GET /matches/{id} and ?ids=
+MATCH_CACHE_SIZE = _int("MATCH_CACHE_SIZE", 10_000)
+
+# Reject joins that overlap a match the user already joined
+CONFLICT_CHECK = _bool("CONFLICT_CHECK")
+# Matches have no end time of their own; this is the assumed length
+MATCH_DURATION_MINUTES = _int("MATCH_DURATION_MINUTES", 90)
+
+# Decide join/leave/delete in memory and persist them behind the request
+# through an fsync-batched op log (slot_engine.py)
+SLOT_ENGINE = _bool("SLOT_ENGINE")
+SLOT_ENGINE_LOG = os.environ.get("SLOT_ENGINE_LOG", "slot_engine.log")
+
+# Log every SQL statement (handy in development, costly under load; the
+# production profile of serve.py turns it off)
+DB_ECHO = _bool("DB_ECHO", True)
+
+# Write-ahead logging: readers no longer wait for writers
+SQLITE_WAL = _bool("SQLITE_WAL")
+
+# Background PRAGMA optimize, WAL checkpoints, incremental vacuum and
+# quick_check (maintenance.py); intervals in seconds
+MAINTENANCE = _bool("MAINTENANCE")
+MAINTENANCE_OPTIMIZE_SECONDS = _int("MAINTENANCE_OPTIMIZE_SECONDS", 60 * 60)
+MAINTENANCE_CHECKPOINT_SECONDS = _int("MAINTENANCE_CHECKPOINT_SECONDS", 5 * 60)
+MAINTENANCE_TRUNCATE_SECONDS = _int("MAINTENANCE_TRUNCATE_SECONDS", 60 * 60)
+MAINTENANCE_VACUUM_SECONDS = _int("MAINTENANCE_VACUUM_SECONDS", 60 * 60)
+MAINTENANCE_INTEGRITY_SECONDS = _int("MAINTENANCE_INTEGRITY_SECONDS", 24 * 60 * 60)
+# Pages freed per incremental_vacuum step; traffic is checked between steps
+MAINTENANCE_VACUUM_PAGES = _int("MAINTENANCE_VACUUM_PAGES", 500)
+# Postpone maintenance while recent writes take longer than this
+MAINTENANCE_MAX_WRITE_MS = _int("MAINTENANCE_MAX_WRITE_MS", 50)
+# Workers of one server race for this file; only the holder runs maintenance
+MAINTENANCE_LOCK = os.environ.get("MAINTENANCE_LOCK", "maintenance.lock")
+
+# Region sharding (sharding.py): comma-separated regions, each stored in its
+# own SQLite file. The first region uses app.db; empty means unsharded.
+SHARD_REGIONS = [
+    r.strip() for r in os.environ.get("SHARD_REGIONS", "").split(",") if r.strip()
+]
+SHARD_PATH = os.environ.get("SHARD_PATH", "app-{region}.db")
+
+# Online backups (backup.py): pages copied per step, pause between steps,
+# and the write latency above which a backup waits before its next step
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backups")
+BACKUP_PAGES = _int("BACKUP_PAGES", 256)
+BACKUP_SLEEP_MS = _int("BACKUP_SLEEP_MS", 20)
+BACKUP_MAX_WRITE_MS = _int("BACKUP_MAX_WRITE_MS", 20)
+BACKUP_COMPRESSLEVEL = _int("BACKUP_COMPRESSLEVEL", 6)
+
+# X-Admin-Token expected by /admin routes; empty disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# tracemalloc memory debugging behind /admin/memory (memprofile.py). Frames
+# kept per allocation: more attribute it better and cost more. ROUTES also
+# records what each routers/matches.py route leaves allocated.
+MEMORY_PROFILING = _bool("MEMORY_PROFILING")
+MEMORY_PROFILING_FRAMES = _int("MEMORY_PROFILING_FRAMES", 1)
+MEMORY_PROFILING_ROUTES = _bool("MEMORY_PROFILING_ROUTES")
+
+# Traffic capture for replay.py (capture.py): fraction of requests recorded,
+# 0 turns the middleware off. The file rotates at CAPTURE_MAX_BYTES.
+CAPTURE_RATE = _float("CAPTURE_RATE", 0.0)
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH", "capture/traffic.jsonl")
+CAPTURE_MAX_BYTES = _int("CAPTURE_MAX_BYTES", 50 * 1024 * 1024)
+CAPTURE_BACKUPS = _int("CAPTURE_BACKUPS", 5)
+# Request bodies are cut at this many bytes
+CAPTURE_MAX_BODY = _int("CAPTURE_MAX_BODY", 4096)
+
+# Season reports (reports.py): worker processes, rows per read, and how many
+# finished reports are kept for repeated requests
+REPORT_WORKERS = _int("REPORT_WORKERS", 1)
+REPORT_CHUNK_ROWS = _int("REPORT_CHUNK_ROWS", 5000)
+REPORT_CACHE_SIZE = _int("REPORT_CACHE_SIZE", 64)
@@ -0,0 +1,91 @@
+from contextlib import ExitStack, contextmanager
+from fastapi import HTTPException, Request
+from sqlalchemy import func, select
+from sqlmodel import Session
+from models import Match
+
+# A match id is shard index * SHARD_ID_SPAN + a number counted per shard, so
+# the id alone says which database holds the match. 2**40 ids per shard keeps
+# ids exact in JavaScript (below 2**53) for up to 8192 shards, and every id
+# of an unsharded app.db already belongs to shard 0.
+SHARD_ID_SPAN = 1 << 40
+
+
+def shard_of(match_id: int) -> int:
+    return match_id // SHARD_ID_SPAN
+
+
+def next_match_id(index: int):
+    """Next free id of shard `index`, as SQL evaluated inside the INSERT.
+
+    Reading the maximum in the INSERT statement itself, under its write
+    lock, means two writers of one shard can never pick the same id.
+    """
+    base = index * SHARD_ID_SPAN
+    return (
+        select(func.coalesce(func.max(Match.id), base) + 1)
+        .where(Match.id >= base, Match.id < base + SHARD_ID_SPAN)
+        .scalar_subquery()
+    )
+
+
+class ShardMap:
+    """Regions and their engines, in shard index order.
+
+    The first region lives in the default database, so turning sharding on
+    keeps every existing match where it is. With no regions configured the
+    app runs unsharded and nothing here is consulted.
+    """
+
+    def __init__(self):
+        self.regions = []
+        self.engines = []
+
+    @property
+    def active(self) -> bool:
+        return bool(self.engines)
+
+    def configure(self, regions, engines):
+        if len(regions) != len(engines):
+            raise ValueError("One engine per region is needed")
+        self.regions = list(regions)
+        self.engines = list(engines)
+
+    def index_of_region(self, region) -> int:
+        if region is None:
+            return 0
+        try:
+            return self.regions.index(region)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown region '{region}'")
+
+    def engine_for_match(self, match_id: int):
+        index = shard_of(match_id)
+        if not 0 <= index < len(self.engines):
+            raise HTTPException(status_code=404, detail="Match not found")
+        return self.engines[index]
+
+    def engine_for_request(self, request: Request, default):
+        """Engine of the match in the path, or `default` for other routes."""
+        match_id = request.path_params.get("match_id")
+        if not self.active or match_id is None or not str(match_id).isdigit():
+            return default
+        return self.engine_for_match(int(match_id))
+
+    @contextmanager
+    def sessions(self):
+        """One session per shard, in shard order, closed together."""
+        with ExitStack() as stack:
+            yield [stack.enter_context(Session(e)) for e in self.engines]
+
+
+shards = ShardMap()
+
+
+def require_unsharded(request: Request):
+    """Route dependency for features that only work on a single database."""
+    if shards.active:
+        raise HTTPException(
+            status_code=501,
+            detail=f"{request.url.path} is not available with region sharding",
+        )
@@ -0,0 +1,71 @@
+import threading
+from fastapi import HTTPException
+from prometheus_client import Counter
+
+# How long a follower waits for the leader before giving up with a 503, so
+# a leader stuck on the write lock cannot pin every identical request
+WAIT_SECONDS = 10
+
+# leader = computed the result, follower = waited for a leader's result,
+# timeout = follower that gave up; coalescing ratio = follower / (leader +
+# follower)
+CALLS = Counter(
+    "singleflight_calls",
+    "Coalesced read computations, by endpoint and role",
+    ["endpoint", "role"],
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share one in-flight computation between identical concurrent calls.
+
+    The first caller for a key runs fn(); callers arriving while it runs
+    wait up to WAIT_SECONDS and get the same result object (or the same
+    exception). Nothing is kept once the call finishes: caching is the
+    caller's business.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, endpoint: str):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(WAIT_SECONDS):
+                CALLS.labels(endpoint, "timeout").inc()
+                raise HTTPException(
+                    status_code=503,
+                    detail="Timed out waiting for an identical request",
+                    headers={"Retry-After": "1"},
+                )
+            CALLS.labels(endpoint, "follower").inc()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        CALLS.labels(endpoint, "leader").inc()
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,556 @@
+import json
+import logging
+import os
+import threading
+from datetime import time
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import delete, select
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+from changes import record_change
+from models import (
+    Match,
+    MatchParticipant,
+    MatchWaitlist,
+    SlotEngineCheckpoint,
+)
+from queries import FIELDS, select_matches
+from schedule import match_span
+from series import check_edit, update_match
+import statements
+
+logger = logging.getLogger(__name__)
+
+# How long the log writer waits to gather a batch before one fsync
+FSYNC_INTERVAL = 0.005
+# Ops per DB transaction when applying the log
+APPLY_BATCH = 500
+# Truncate the log once everything in it is applied and it grew past this
+LOG_ROTATE_BYTES = 16 * 1024 * 1024
+# Pause after an apply failed for a reason that may pass (a locked or
+# unreachable database), doubling up to the cap
+APPLY_RETRY_DELAY = 0.5
+APPLY_RETRY_MAX_DELAY = 30.0
+# How long loading a match waits for the log to reach the database
+LOAD_FLUSH_TIMEOUT = 5.0
+
+
+class MatchSlots:
+    """Authoritative in-memory state of one match while the engine runs."""
+
+    __slots__ = ("row", "participants", "waitlist", "deleted", "lock")
+
+    def __init__(self, row: dict, participants: dict, waitlist: list):
+        self.row = row
+        self.participants = participants  # set of User.id
+        self.waitlist = waitlist  # [User.id], oldest first
+        self.deleted = False
+        self.lock = threading.Lock()
+
+
+class SlotEngine:
+    """Join/leave/delete decided in memory, persisted behind the request.
+
+    Every decision is appended to an op log. A background thread writes
+    pending ops with a single fsync per batch, wakes the requests waiting
+    on that batch, then applies the ops to Match/MatchParticipant in one
+    transaction that also stores the last applied sequence number. On
+    start, ops past that checkpoint are replayed from the log first, so a
+    crash loses nothing that was acknowledged. While the database cannot
+    be written the ops stay queued and are retried with a backoff, and
+    GET /ready answers 503. An op the database refuses for good (engine and
+    tables disagree) is moved to the dead-letter file so the rest go on.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.healthy = True
+        self.bind = None
+        self.log_path = None
+        self.dead_letter_path = None
+        self._matches = {}
+        self._load_lock = threading.Lock()
+        self._queue_lock = threading.Condition()
+        self._pending = []  # ops not yet written to the log
+        self._unapplied = []  # ops written (durable) but not yet in the DB
+        self._seq = 0
+        self._applied_seq = 0
+        self._durable_seq = 0
+        self._retry_delay = APPLY_RETRY_DELAY
+        self._thread = None
+        self._stopping = False
+        self._log = None
+
+    # lifecycle
+
+    def start(self, bind, log_path):
+        self.bind = bind
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.dead_letter_path = self.log_path.with_name(self.log_path.name + ".dead")
+        self._matches = {}
+        self._applied_seq = self._checkpoint()
+        self._seq = self._durable_seq = self._replay()
+        self._log = open(self.log_path, "ab")
+        self._stopping = False
+        self.healthy = True
+        self._retry_delay = APPLY_RETRY_DELAY
+        self._thread = threading.Thread(
+            target=self._run, name="slot-engine", daemon=True
+        )
+        self._thread.start()
+        self.active = True
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+        with self._queue_lock:
+            self._stopping = True
+            self._queue_lock.notify_all()
+        self._thread.join()
+        self._log.close()
+        self._matches = {}
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every op issued so far is applied to the database."""
+        with self._queue_lock:
+            target = self._seq
+            return self._queue_lock.wait_for(
+                lambda: self._applied_seq >= target, timeout
+            )
+
+    # decisions
+
+    def join(self, match_id, user_pk, conflict=None) -> dict:
+        slots = self._get(match_id)
+        with slots.lock:
+            self._check_exists(slots)
+            row = slots.row
+            if row["joined_players"] >= row["max_players"]:
+                raise HTTPException(status_code=400, detail="Match is full")
+            if user_pk in slots.participants:
+                raise HTTPException(
+                    status_code=400, detail="You already joined this match"
+                )
+            if conflict is not None and conflict(row):
+                raise HTTPException(
+                    status_code=400, detail="You already joined a match at this time"
+                )
+            slots.participants.add(user_pk)
+            if user_pk in slots.waitlist:
+                slots.waitlist.remove(user_pk)
+            row["joined_players"] += 1
+            seq = self._emit(
+                "join", match_id, user_id=user_pk, joined_players=row["joined_players"]
+            )
+            result = dict(row)
+        self._wait_durable(seq)
+        return result
+
+    def leave(self, match_id, user_pk, conflict=None) -> dict:
+        """conflict(queued User.id, row): whether promoting them would clash."""
+        slots = self._get(match_id)
+        with slots.lock:
+            self._check_exists(slots)
+            if user_pk not in slots.participants:
+                raise HTTPException(
+                    status_code=400, detail="You have not joined this match"
+                )
+            slots.participants.remove(user_pk)
+            row = slots.row
+            promoted = next(
+                (
+                    queued
+                    for queued in slots.waitlist
+                    if conflict is None or not conflict(queued, row)
+                ),
+                None,
+            )
+            if promoted is not None:
+                slots.waitlist.remove(promoted)
+                slots.participants.add(promoted)
+            else:
+                row["joined_players"] = max(0, row["joined_players"] - 1)
+            seq = self._emit(
+                "leave",
+                match_id,
+                user_id=user_pk,
+                promoted=promoted,
+                joined_players=row["joined_players"],
+            )
+            result = dict(row)
+        self._wait_durable(seq)
+        return result
+
+    def delete(self, match_id, user_id):
+        # user_id is the caller's X-User-Id, like organizer_user_id
+        slots = self._get(match_id)
+        with slots.lock:
+            self._check_exists(slots)
+            if slots.row["organizer_user_id"] != user_id:
+                raise HTTPException(
+                    status_code=403, detail="Only the organizer can delete this match"
+                )
+            if slots.row["joined_players"] != 0:
+                raise HTTPException(
+                    status_code=400, detail="Cannot delete a match with joined players"
+                )
+            slots.deleted = True
+            seq = self._emit("delete", match_id)
+            # A later lookup reloads from the database, after this op applied
+            self._matches.pop(match_id, None)
+        self._wait_durable(seq)
+
+    def edit(self, match_id, user_id, fields: dict) -> dict:
+        slots = self._get(match_id)
+        with slots.lock:
+            self._check_exists(slots)
+            row = slots.row
+            check_edit(row["organizer_user_id"], row["joined_players"], user_id, fields)
+            row.update(fields)
+            if "time" in fields:
+                fields = dict(fields, time=fields["time"].isoformat())
+            seq = self._emit("edit", match_id, fields=fields)
+            result = dict(row)
+        self._wait_durable(seq)
+        return result
+
+    def enqueue(self, match_id, user_pk) -> int:
+        """Put the user on the waitlist; returns the 1-based position."""
+        slots = self._get(match_id)
+        with slots.lock:
+            self._check_exists(slots)
+            if user_pk in slots.participants:
+                raise HTTPException(
+                    status_code=400, detail="You already joined this match"
+                )
+            row = slots.row
+            if row["joined_players"] < row["max_players"]:
+                raise HTTPException(
+                    status_code=400, detail="Match has free slots, join it directly"
+                )
+            if user_pk in slots.waitlist:
+                return slots.waitlist.index(user_pk) + 1
+            slots.waitlist.append(user_pk)
+            position = len(slots.waitlist)
+            seq = self._emit("waitlist_add", match_id, user_id=user_pk)
+        self._wait_durable(seq)
+        return position
+
+    def dequeue(self, match_id, user_pk) -> bool:
+        slots = self._get(match_id, missing_ok=True)
+        if slots is None:
+            return False
+        with slots.lock:
+            if user_pk not in slots.waitlist:
+                return False
+            slots.waitlist.remove(user_pk)
+            seq = self._emit("waitlist_remove", match_id, user_id=user_pk)
+        self._wait_durable(seq)
+        return True
+
+    def waitlist_position(self, match_id, user_pk) -> Optional[int]:
+        slots = self._get(match_id, missing_ok=True)
+        if slots is None:
+            return None
+        with slots.lock:
+            if user_pk in slots.waitlist:
+                return slots.waitlist.index(user_pk) + 1
+        return None
+
+    # in-memory state
+
+    def _check_exists(self, slots):
+        if slots.deleted:
+            raise HTTPException(status_code=404, detail="Match not found")
+
+    def _get(self, match_id, missing_ok=False) -> Optional[MatchSlots]:
+        slots = self._matches.get(match_id)
+        if slots is None:
+            with self._load_lock:
+                slots = self._matches.get(match_id)
+                if slots is None:
+                    slots = self._load(match_id)
+                    if slots is not None:
+                        self._matches[match_id] = slots
+        if slots is None or slots.deleted:
+            if missing_ok:
+                return None
+            raise HTTPException(status_code=404, detail="Match not found")
+        return slots
+
+    def _load(self, match_id) -> Optional[MatchSlots]:
+        # Everything up to the last op is applied before a match is read, so
+        # the database is authoritative for matches not yet in memory
+        if not self.flush(LOAD_FLUSH_TIMEOUT):
+            raise HTTPException(
+                status_code=503,
+                detail="Match changes are still being saved, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        with self.bind.connect() as conn:
+            row = conn.execute(select_matches().where(Match.id == match_id)).first()
+            if row is None:
+                return None
+            participants = set(
+                conn.execute(
+                    select(MatchParticipant.user_id).where(
+                        MatchParticipant.match_id == match_id
+                    )
+                ).scalars()
+            )
+            # Users who joined while queued are never promoted again
+            waitlist = [
+                user_id
+                for user_id in conn.execute(
+                    select(MatchWaitlist.user_id)
+                    .where(MatchWaitlist.match_id == match_id)
+                    .order_by(MatchWaitlist.id)
+                ).scalars()
+                if user_id not in participants
+            ]
+        return MatchSlots(dict(zip(FIELDS, row)), participants, waitlist)
+
+    # op log
+
+    def _emit(self, op, match_id, **data) -> int:
+        with self._queue_lock:
+            self._seq += 1
+            self._pending.append(
+                {"seq": self._seq, "op": op, "match_id": match_id, **data}
+            )
+            self._queue_lock.notify_all()
+            return self._seq
+
+    def _wait_durable(self, seq):
+        with self._queue_lock:
+            self._queue_lock.wait_for(
+                lambda: self._durable_seq >= seq or self._stopping
+            )
+
+    def _run(self):
+        while True:
+            with self._queue_lock:
+                self._queue_lock.wait_for(
+                    lambda: self._pending or self._unapplied or self._stopping,
+                )
+                # Ops the database refuses stay in the log for the next start
+                done = not self._unapplied or not self.healthy
+                if self._stopping and not self._pending and done:
+                    return
+            # Let concurrent requests pile into the same fsync
+            self._write_batch_after(FSYNC_INTERVAL)
+            self._apply_unapplied()
+
+    def _write_batch_after(self, delay):
+        with self._queue_lock:
+            if not self._stopping:
+                self._queue_lock.wait(delay)
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        data = b"".join(json.dumps(op).encode() + b"\n" for op in batch)
+        self._log.write(data)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        with self._queue_lock:
+            self._unapplied.extend(batch)
+            self._durable_seq = batch[-1]["seq"]
+            self._queue_lock.notify_all()
+
+    def _apply_unapplied(self):
+        with self._queue_lock:
+            ops = self._unapplied[:APPLY_BATCH]
+        if not ops:
+            return
+        try:
+            apply_ops(self.bind, ops)
+            done = len(ops)
+        except Exception:
+            logger.exception("Applying ops %d-%d failed", *_seqs(ops))
+            done = self._apply_one_by_one(ops)
+        if done:
+            with self._queue_lock:
+                del self._unapplied[:done]
+                self._applied_seq = ops[done - 1]["seq"]
+                self._queue_lock.notify_all()
+                caught_up = not self._unapplied and not self._pending
+            if caught_up and self.log_path.stat().st_size > LOG_ROTATE_BYTES:
+                self._log.truncate(0)
+        if done < len(ops):
+            # Acknowledged ops are never dropped for a failure that may
+            # pass: keep them queued and try again after a pause
+            self.healthy = False
+            logger.error(
+                "Op %d not applied, retrying in %.1fs",
+                ops[done]["seq"],
+                self._retry_delay,
+            )
+            with self._queue_lock:
+                self._queue_lock.wait_for(lambda: self._stopping, self._retry_delay)
+            self._retry_delay = min(self._retry_delay * 2, APPLY_RETRY_MAX_DELAY)
+        elif not self.healthy:
+            logger.info("Slot engine caught up with the database again")
+            self.healthy = True
+            self._retry_delay = APPLY_RETRY_DELAY
+
+    def _apply_one_by_one(self, ops) -> int:
+        """Apply ops singly after their batch failed, to find the one at fault.
+
+        An op failing with anything but an OperationalError is refused for
+        good: it is written to the dead-letter file and the checkpoint moves
+        past it. Returns how many ops were dealt with before a failure that
+        may pass.
+        """
+        for i, op in enumerate(ops):
+            try:
+                try:
+                    apply_ops(self.bind, [op])
+                except OperationalError:
+                    raise
+                except Exception as exc:
+                    self._dead_letter(op, exc)
+                    apply_ops(self.bind, [], op["seq"])
+            except OperationalError:
+                logger.exception("Applying op %d failed", op["seq"])
+                return i
+        return len(ops)
+
+    def _dead_letter(self, op, exc):
+        logger.critical(
+            "Slot engine op %d refused by the database, moved to %s: %r",
+            op["seq"],
+            self.dead_letter_path,
+            exc,
+            exc_info=exc,
+        )
+        line = json.dumps({"op": op, "error": repr(exc)}).encode() + b"\n"
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _checkpoint(self) -> int:
+        with Session(self.bind) as session:
+            checkpoint = session.get(SlotEngineCheckpoint, 1)
+            return checkpoint.seq if checkpoint else 0
+
+    def _replay(self) -> int:
+        """Apply logged ops newer than the checkpoint; returns the last seq."""
+        last = self._applied_seq
+        if not self.log_path.exists():
+            return last
+        ops = []
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # A torn final line was never acknowledged
+                    break
+                if op["seq"] > self._applied_seq:
+                    ops.append(op)
+        for i in range(0, len(ops), APPLY_BATCH):
+            batch = ops[i : i + APPLY_BATCH]
+            try:
+                apply_ops(self.bind, batch)
+            except OperationalError:
+                raise
+            except Exception:
+                logger.exception("Replaying ops %d-%d failed", *_seqs(batch))
+                done = self._apply_one_by_one(batch)
+                if done < len(batch):
+                    raise RuntimeError(
+                        f"Could not replay op {batch[done]['seq']} of {self.log_path}"
+                    )
+        if ops:
+            logger.info("Replayed %d slot engine ops from %s", len(ops), self.log_path)
+            last = ops[-1]["seq"]
+        self._applied_seq = last
+        # Everything is in the database now; start a fresh log
+        open(self.log_path, "wb").close()
+        return last
+
+
+def _seqs(ops) -> tuple:
+    return ops[0]["seq"], ops[-1]["seq"]
+
+
+def apply_ops(bind, ops, seq: Optional[int] = None):
+    """Apply a batch of ops and advance the checkpoint in one transaction.
+
+    The checkpoint moves to seq, by default the last op's.
+    """
+    with Session(bind) as session:
+        for op in ops:
+            _apply(session, op)
+        checkpoint = session.get(SlotEngineCheckpoint, 1) or SlotEngineCheckpoint()
+        checkpoint.seq = ops[-1]["seq"] if seq is None else seq
+        session.add(checkpoint)
+        session.commit()
+
+
+def _participant(match, user_id):
+    starts_at, ends_at = match_span(match.date, match.time)
+    return MatchParticipant(
+        match_id=match.id, user_id=user_id, starts_at=starts_at, ends_at=ends_at
+    )
+
+
+def _apply(session, op):
+    match = session.get(Match, op["match_id"])
+    if match is None:
+        return
+    kind = op["op"]
+    if kind == "join":
+        session.add(_participant(match, op["user_id"]))
+        session.execute(
+            statements.DELETE_WAITLIST_OF_USER,
+            {"match_id": match.id, "user_id": op["user_id"]},
+        )
+        match.joined_players = op["joined_players"]
+        record_change(session, "joined", match)
+    elif kind == "leave":
+        session.execute(
+            delete(MatchParticipant).where(
+                MatchParticipant.match_id == match.id,
+                MatchParticipant.user_id == op["user_id"],
+            )
+        )
+        promoted = op["promoted"]
+        if promoted is not None:
+            session.execute(
+                delete(MatchWaitlist).where(
+                    MatchWaitlist.match_id == match.id,
+                    MatchWaitlist.user_id == promoted,
+                )
+            )
+            session.add(_participant(match, promoted))
+        match.joined_players = op["joined_players"]
+        record_change(session, "left", match)
+    elif kind == "waitlist_add":
+        session.add(MatchWaitlist(match_id=match.id, user_id=op["user_id"]))
+    elif kind == "waitlist_remove":
+        session.execute(
+            delete(MatchWaitlist).where(
+                MatchWaitlist.match_id == match.id,
+                MatchWaitlist.user_id == op["user_id"],
+            )
+        )
+    elif kind == "edit":
+        fields = dict(op["fields"])
+        if "time" in fields:
+            fields["time"] = time.fromisoformat(fields["time"])
+        update_match(session, match, fields)
+    elif kind == "delete":
+        record_change(session, "deleted", match)
+        session.execute(delete(MatchWaitlist).where(MatchWaitlist.match_id == match.id))
+        session.delete(match)
+    # Flush per op so a later op in the batch sees this one's rows
+    session.flush()
+
+
+engine = SlotEngine()
@@ -0,0 +1,170 @@
+from prometheus_client import Counter
+from sqlalchemy import bindparam, delete, event, exists, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+from models import (
+    AvailabilitySummary,
+    DataVersion,
+    MatchParticipant,
+    MatchTombstone,
+    MatchWaitlist,
+    User,
+)
+
+# Statements for the hot paths, built once at import with bindparam()
+# placeholders. A constructed statement memoizes its cache key, so each
+# call skips building the select and traversing it, and always hits the
+# engine's compiled cache. Execute them on session.connection() with a
+# parameter dict: no ORM entity loading is involved.
+
+COMPILED_CACHE = Counter(
+    "sqlalchemy_compiled_cache",
+    "Statements executed, by SQLAlchemy compiled cache outcome",
+    ["result"],
+)
+
+_RESULT_LABELS = {
+    CacheStats.CACHE_HIT: "hit",
+    CacheStats.CACHE_MISS: "miss",
+    CacheStats.CACHING_DISABLED: "disabled",
+    CacheStats.NO_CACHE_KEY: "no_key",
+    CacheStats.NO_DIALECT_SUPPORT: "no_dialect_support",
+}
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_result(conn, cursor, statement, parameters, context, executemany):
+    if context is None or context.compiled is None:
+        # Raw SQL strings never go through the compiled cache
+        return
+    COMPILED_CACHE.labels(_RESULT_LABELS.get(context.cache_hit, "unknown")).inc()
+
+
+# Read on every GET /matches and bumped by every write
+CURRENT_VERSION = select(DataVersion.version).where(DataVersion.id == 1)
+BUMP_VERSION = (
+    insert(DataVersion)
+    .values(id=1, version=1)
+    .on_conflict_do_update(
+        index_elements=[DataVersion.id],
+        set_={"version": DataVersion.version + 1},
+    )
+    .returning(DataVersion.version)
+)
+# Ids are not AUTOINCREMENT, so a deleted id can come back and die again
+RECORD_TOMBSTONE = (
+    insert(MatchTombstone)
+    .values(match_id=bindparam("match_id"), version=bindparam("version"))
+    .on_conflict_do_update(
+        index_elements=[MatchTombstone.match_id],
+        set_={"version": bindparam("version")},
+    )
+)
+
+_bucket = (
+    AvailabilitySummary.date == bindparam("date"),
+    AvailabilitySummary.location == bindparam("location"),
+)
+# Add signed deltas to one (date, location) bucket, creating it if needed
+ADJUST_AVAILABILITY = (
+    insert(AvailabilitySummary)
+    .values(
+        date=bindparam("date"),
+        location=bindparam("location"),
+        matches=bindparam("matches"),
+        max_players=bindparam("max_players"),
+        joined_players=bindparam("joined_players"),
+    )
+    .on_conflict_do_update(
+        index_elements=[AvailabilitySummary.date, AvailabilitySummary.location],
+        set_={
+            "matches": AvailabilitySummary.matches + bindparam("matches"),
+            "max_players": AvailabilitySummary.max_players + bindparam("max_players"),
+            "joined_players": AvailabilitySummary.joined_players
+            + bindparam("joined_players"),
+        },
+    )
+)
+DROP_EMPTY_AVAILABILITY = delete(AvailabilitySummary).where(
+    *_bucket, AvailabilitySummary.matches <= 0
+)
+
+
+# users.py: identity header -> User.id, and the upsert for new or renamed users
+USER_BY_EXTERNAL_ID = select(User.id, User.first_name, User.last_name).where(
+    User.external_id == bindparam("external")
+)
+UPSERT_USER = (
+    insert(User)
+    .values(
+        external_id=bindparam("external"),
+        first_name=bindparam("first"),
+        last_name=bindparam("last"),
+    )
+    .on_conflict_do_update(
+        index_elements=[User.external_id],
+        set_={"first_name": bindparam("first"), "last_name": bindparam("last")},
+    )
+    .returning(User.id)
+)
+
+
+_same_participant = (
+    MatchParticipant.match_id == bindparam("match_id"),
+    MatchParticipant.user_id == bindparam("user_id"),
+)
+# join_match only needs to know whether the row exists
+PARTICIPANT_ID = select(MatchParticipant.id).where(*_same_participant)
+# leave_match deletes directly and checks the rowcount instead of loading
+DELETE_PARTICIPANT = delete(MatchParticipant).where(*_same_participant)
+
+# Moving a match moves the spans its participants are conflict-checked by
+UPDATE_PARTICIPANT_SPANS = (
+    update(MatchParticipant)
+    .where(MatchParticipant.match_id == bindparam("moved_match_id"))
+    .values(starts_at=bindparam("start"), ends_at=bindparam("end"))
+)
+
+_waitlist_of_match = MatchWaitlist.match_id == bindparam("match_id")
+# Oldest entry first; leave_match promotes the first one without a clash
+# into the freed slot. Entries of users who joined meanwhile (left behind
+# by older versions) are skipped.
+WAITLIST_QUEUE = (
+    select(MatchWaitlist.id, MatchWaitlist.user_id)
+    .where(
+        _waitlist_of_match,
+        ~exists().where(
+            MatchParticipant.match_id == MatchWaitlist.match_id,
+            MatchParticipant.user_id == MatchWaitlist.user_id,
+        ),
+    )
+    .order_by(MatchWaitlist.id)
+)
+WAITLIST_ENTRY_ID = select(MatchWaitlist.id).where(
+    _waitlist_of_match, MatchWaitlist.user_id == bindparam("user_id")
+)
+WAITLIST_POSITION = select(func.count()).where(
+    _waitlist_of_match, MatchWaitlist.id <= bindparam("entry_id")
+)
+DELETE_WAITLIST_ENTRY = delete(MatchWaitlist).where(
+    MatchWaitlist.id == bindparam("entry_id")
+)
+DELETE_WAITLIST_OF_MATCH = delete(MatchWaitlist).where(_waitlist_of_match)
+# Joining directly takes the user off the match's waitlist
+DELETE_WAITLIST_OF_USER = delete(MatchWaitlist).where(
+    _waitlist_of_match, MatchWaitlist.user_id == bindparam("user_id")
+)
+
+# Any participation of the user overlapping [start, end). Every span is
+# MATCH_DURATION_MINUTES long, so starts_at > earliest bounds the index range.
+PARTICIPANT_CONFLICT = (
+    select(MatchParticipant.id)
+    .where(
+        MatchParticipant.user_id == bindparam("user_id"),
+        MatchParticipant.starts_at > bindparam("earliest"),
+        MatchParticipant.starts_at < bindparam("end"),
+        MatchParticipant.ends_at > bindparam("start"),
+    )
+    .limit(1)
+)
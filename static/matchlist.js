@@ -0,0 +1,161 @@
+// Virtualized, keyed list of match cards, used by index.html and bench.html.
+//
+// Only the cards inside the viewport (plus OVERSCAN rows either side) exist
+// in the DOM. Each card element is keyed by match id and remembers what it
+// shows, so a render only touches the text nodes whose value changed and the
+// transform of cards that moved. Cards scrolled out of view are recycled.
+(function () {
+  const ROW_HEIGHT = 150; // px per row; every card has the same height
+  const CARD_HEIGHT = 138;
+  const OVERSCAN = 6;
+
+  function buildCard() {
+    const el = document.createElement('div');
+    el.className = 'card';
+    el.style.cssText =
+      `position:absolute;left:0;right:0;top:0;margin:0;box-sizing:border-box;height:${CARD_HEIGHT}px;overflow:hidden;`;
+    const title = document.createElement('strong');
+    const players = document.createElement('span');
+    const organizer = document.createElement('span');
+    players.className = organizer.className = 'muted';
+    const row = document.createElement('div');
+    row.className = 'row';
+    row.style.marginTop = '12px';
+    const buttons = {};
+    for (const [action, label] of [['join', 'Join'], ['leave', 'Leave'], ['delete', 'Delete']]) {
+      const b = document.createElement('button');
+      b.type = 'button';
+      b.dataset.action = action;
+      b.textContent = label;
+      row.appendChild(b);
+      buttons[action] = b;
+    }
+    el.append(title, document.createElement('br'), players, document.createElement('br'), organizer, row);
+    return { el, title, players, organizer, buttons, shown: {} };
+  }
+
+  // Write a value only when it differs from what the card already shows
+  function set(node, key, value, apply) {
+    if (node.shown[key] !== value) {
+      node.shown[key] = value;
+      apply(value);
+    }
+  }
+
+  class MatchList {
+    // viewport: element with a fixed height; its content is replaced.
+    // actions: { userId, join(id), leave(id), remove(id) }
+    // Items are matches, or series occurrences nobody joined yet: those are
+    // keyed by a string id and only offer Join.
+    constructor(viewport, actions) {
+      this.viewport = viewport;
+      this.actions = actions;
+      this.items = [];
+      this.positions = new Map(); // id -> index in items
+      this.nodes = new Map(); // id -> card currently showing that match
+      this.pool = [];
+      this.frame = 0;
+      this.renders = 0;
+
+      viewport.style.overflowY = 'auto';
+      viewport.style.position = 'relative';
+      viewport.replaceChildren();
+      this.spacer = document.createElement('div');
+      this.spacer.style.position = 'relative';
+      this.empty = document.createElement('p');
+      this.empty.className = 'muted';
+      this.empty.textContent = 'No matches yet. Create one above.';
+      viewport.append(this.empty, this.spacer);
+
+      viewport.addEventListener('scroll', () => this.schedule(), { passive: true });
+      window.addEventListener('resize', () => this.schedule());
+      // One listener for every button of every card
+      this.spacer.addEventListener('click', (e) => {
+        const button = e.target.closest('button[data-action]');
+        const card = button && button.closest('[data-id]');
+        if (!card) return;
+        const id = /^\d+$/.test(card.dataset.id) ? Number(card.dataset.id) : card.dataset.id;
+        if (button.dataset.action === 'join') this.actions.join(id);
+        else if (button.dataset.action === 'leave') this.actions.leave(id);
+        else this.actions.remove(id);
+      });
+    }
+
+    // Replace the whole list (already sorted); unchanged cards are kept
+    setItems(items) {
+      this.items = items;
+      this.positions = new Map(items.map((m, i) => [m.id, i]));
+      this.spacer.style.height = `${items.length * ROW_HEIGHT}px`;
+      this.empty.hidden = items.length > 0;
+      this.schedule();
+    }
+
+    // Swap in a new version of one match without re-sorting
+    update(match) {
+      const i = this.positions.get(match.id);
+      if (i === undefined) return;
+      this.items[i] = match;
+      if (this.nodes.has(match.id)) this.schedule();
+    }
+
+    schedule() {
+      if (!this.frame) {
+        this.frame = requestAnimationFrame(() => {
+          this.frame = 0;
+          this.render();
+        });
+      }
+    }
+
+    render() {
+      this.renders++;
+      const top = this.viewport.scrollTop;
+      const height = this.viewport.clientHeight;
+      const first = Math.max(0, Math.floor(top / ROW_HEIGHT) - OVERSCAN);
+      const last = Math.min(this.items.length, Math.ceil((top + height) / ROW_HEIGHT) + OVERSCAN);
+
+      const visible = new Set();
+      for (let i = first; i < last; i++) visible.add(this.items[i].id);
+      // Recycle cards whose match left the window before reusing them
+      for (const [id, node] of this.nodes) {
+        if (!visible.has(id)) {
+          this.nodes.delete(id);
+          node.el.hidden = true;
+          this.pool.push(node);
+        }
+      }
+      for (let i = first; i < last; i++) {
+        const m = this.items[i];
+        let node = this.nodes.get(m.id);
+        if (!node) {
+          node = this.pool.pop();
+          if (!node) {
+            node = buildCard();
+            this.spacer.appendChild(node.el);
+          }
+          node.el.hidden = false;
+          this.nodes.set(m.id, node);
+        }
+        this.patch(node, m, i);
+      }
+    }
+
+    patch(node, m, i) {
+      set(node, 'id', m.id, (v) => { node.el.dataset.id = v; });
+      set(node, 'y', i * ROW_HEIGHT, (v) => { node.el.style.transform = `translateY(${v}px)`; });
+      const planned = typeof m.id === 'string';
+      set(node, 'title', `${planned ? 'Series' : '#' + m.id} — ${m.date} @ ${m.time} — ${m.location}`,
+        (v) => { node.title.textContent = v; });
+      set(node, 'planned', planned, (v) => { node.buttons.leave.hidden = v; });
+      set(node, 'players', `${m.joined_players} / ${m.max_players} players`,
+        (v) => { node.players.textContent = v; });
+      set(node, 'organizer', `Organizer: ${m.organizer_first_name} ${m.organizer_last_name}`,
+        (v) => { node.organizer.textContent = v; });
+      const canDelete = !planned && m.organizer_user_id === this.actions.userId && m.joined_players === 0;
+      set(node, 'canDelete', canDelete, (v) => { node.buttons.delete.hidden = !v; });
+    }
+  }
+
+  MatchList.ROW_HEIGHT = ROW_HEIGHT;
+  window.MatchList = MatchList;
+})();
@@ -0,0 +1,58 @@
+import hashlib
+import mimetypes
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+from fastapi import HTTPException, Request
+from compression import EncodedBody
+
+# Files like app.3f9c2b1a.js never change content under the same name
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class StaticAssets:
+    """Serves a directory from memory with precompressed variants.
+
+    Files are read once; every asset gets a strong ETag derived from its
+    content, and names carrying a content hash are cached for a year.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._assets = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        assets = {}
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            data = path.read_bytes()
+            name = path.relative_to(self.directory).as_posix()
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if media_type.startswith("text/") or media_type.endswith(
+                ("json", "javascript", "xml")
+            ):
+                media_type += "; charset=utf-8"
+            etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+            cache_control = IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE
+            assets[name] = EncodedBody(data, media_type, etag, cache_control)
+            assets[name].precompress()
+        self._assets = assets
+        return self
+
+    def get(self, name: str) -> Optional[EncodedBody]:
+        if self._assets is None:
+            with self._lock:
+                if self._assets is None:
+                    self.load()
+        return self._assets.get(name)
+
+    def response(self, request: Request, name: str):
+        asset = self.get(name)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        return asset.response(request)
@@ -0,0 +1,113 @@
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+import availability
+import cli
+from migrations import migrate
+from conftest import headers
+
+
+def create(client, day="2025-12-01", location="Retiro", max_players=2):
+    payload = {
+        "date": day,
+        "time": "18:00:00",
+        "location": location,
+        "max_players": max_players,
+    }
+    return client.post("/matches", json=payload, headers=headers("org1")).json()["id"]
+
+
+def summary(client, start="2025-12-01", end="2025-12-07"):
+    r = client.get("/matches/summary", params={"from": start, "to": end})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_summary_follows_writes(client, session):
+    a = create(client)
+    create(client, max_players=5)
+    c = create(client, location="Chamartin")
+    create(client, day="2025-12-09")  # outside the window
+
+    client.put(f"/matches/{a}/join", headers=headers("u1"))
+    client.put(f"/matches/{a}/join", headers=headers("u2"))
+    client.put(f"/matches/{a}/waitlist", headers=headers("w1"))
+    # Promotion keeps the match full
+    client.put(f"/matches/{a}/leave", headers=headers("u1"))
+    client.put(f"/matches/{c}/join", headers=headers("u1"))
+    client.put(f"/matches/{c}/leave", headers=headers("u1"))
+
+    assert summary(client) == [
+        {
+            "date": "2025-12-01",
+            "location": "Chamartin",
+            "matches": 1,
+            "open_slots": 2,
+            "joined_players": 0,
+            "max_players": 2,
+        },
+        {
+            "date": "2025-12-01",
+            "location": "Retiro",
+            "matches": 2,
+            "open_slots": 5,
+            "joined_players": 2,
+            "max_players": 7,
+        },
+    ]
+
+    client.delete(f"/matches/{c}", headers=headers("org1"))
+    assert [b["location"] for b in summary(client)] == ["Retiro"]
+    assert availability.verify(session.connection()) == []
+
+
+def test_failed_writes_leave_summary_alone(client, session):
+    a = create(client, max_players=1)
+    client.put(f"/matches/{a}/join", headers=headers("u1"))
+    assert client.put(f"/matches/{a}/join", headers=headers("u2")).status_code == 400
+    assert client.put(f"/matches/{a}/leave", headers=headers("u3")).status_code == 400
+    assert client.delete(f"/matches/{a}", headers=headers("org1")).status_code == 400
+    assert summary(client)[0]["joined_players"] == 1
+    assert availability.verify(session.connection()) == []
+
+
+def test_default_window_and_bad_range(client):
+    today = date.today()
+    create(client, day=today.isoformat())
+    create(client, day=(today + timedelta(days=7)).isoformat())
+    assert [b["date"] for b in client.get("/matches/summary").json()] == [
+        today.isoformat()
+    ]
+    r = client.get(
+        "/matches/summary", params={"from": "2025-12-02", "to": "2025-12-01"}
+    )
+    assert r.status_code == 400
+
+
+def test_verify_and_rebuild(client, session):
+    a = create(client)
+    client.put(f"/matches/{a}/join", headers=headers("u1"))
+    conn = session.connection()
+    conn.execute(text("UPDATE availabilitysummary SET joined_players = 7"))
+    key = (date(2025, 12, 1), "Retiro")
+    assert availability.verify(conn) == [(key, (1, 2, 7), (1, 2, 1))]
+    assert availability.rebuild(conn) == 1
+    assert availability.verify(conn) == []
+
+
+def test_cli_summary(tmp_path, monkeypatch, capsys):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cli.db'}")
+    monkeypatch.setattr(cli, "engine", engine)
+    monkeypatch.setattr(cli, "create_db_and_tables", lambda: migrate(engine))
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO match (date, time, location, max_players, joined_players,"
+                " organizer_id)"
+                " VALUES ('2025-12-01', '18:00:00.000000', 'Retiro', 10, 3, 1)"
+            )
+        )
+    assert cli.main(["summary"]) == 1
+    assert "1 buckets differ" in capsys.readouterr().out
+    assert cli.main(["summary", "--rebuild"]) == 0
+    assert cli.main(["summary"]) == 0
@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import date
+from datetime import time as clock
+import pytest
+from prometheus_client import REGISTRY
+from sqlmodel import Session, SQLModel, create_engine
+import backup
+import cli
+import routers.admin as admin
+import settings
+from db import tune_sqlite
+from models import Match, User
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def make_engine(path, wal=False, n=3000):
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
+    )
+    tune_sqlite(engine, wal=wal)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(User(id=1, external_id="org", first_name="A", last_name="B"))
+        for i in range(n):
+            s.add(new_match(i))
+        s.commit()
+    return engine
+
+
+def new_match(i):
+    return Match(
+        date=date(2025, 12, 1 + i % 28),
+        time=clock(18),
+        location=f"Park {i}" * 5,
+        max_players=10,
+        organizer_id=1,
+    )
+
+
+def restore(target, tmp_path):
+    """Check the sidecar checksum, unpack and return the match count."""
+    data = open(target, "rb").read()
+    checksum, name = open(f"{target}.sha256").read().split()
+    assert checksum == hashlib.sha256(data).hexdigest()
+    assert name == target.split("/")[-1]
+    restored = tmp_path / "restored.db"
+    restored.write_bytes(gzip.decompress(data))
+    conn = sqlite3.connect(restored)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+        return conn.execute("SELECT count(*) FROM match").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def fast(monkeypatch):
+    monkeypatch.setattr(settings, "BACKUP_PAGES", 8)
+    monkeypatch.setattr(settings, "BACKUP_SLEEP_MS", 1)
+
+
+def test_stepped_backup_is_complete_and_checksummed(tmp_path, fast):
+    engine = make_engine(tmp_path / "live.db")
+    target = str(tmp_path / "out" / "live.db.gz")
+    runs = sample("sqlite_backup_runs_total", outcome="ok")
+
+    result = backup.Backups().run(engine, target)
+
+    assert result["method"] == "stepped"
+    assert result["steps"] > 1
+    assert restore(target, tmp_path) == 3000
+    assert sample("sqlite_backup_runs_total", outcome="ok") == runs + 1
+    assert sample("sqlite_backup_progress") == 1
+    assert not list((tmp_path / "out").glob("*partial"))
+
+
+def test_wal_database_is_copied_with_vacuum_into(tmp_path, fast):
+    engine = make_engine(tmp_path / "live.db", wal=True)
+    target = str(tmp_path / "live.db.gz")
+    assert backup.Backups().run(engine, target)["method"] == "vacuum_into"
+    assert restore(target, tmp_path) == 3000
+
+
+def test_writers_keep_going_during_a_backup(tmp_path, fast):
+    engine = make_engine(tmp_path / "live.db")
+    stop = threading.Event()
+    written = []
+
+    def writer():
+        with Session(engine) as s:
+            while not stop.is_set():
+                s.add(new_match(len(written)))
+                s.commit()
+                written.append(1)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    try:
+        result = backup.Backups().run(engine, str(tmp_path / "live.db.gz"))
+    finally:
+        stop.set()
+        t.join()
+    assert written
+    # Restarted by the writer, or finished in one pass after too many
+    assert result["method"] in ("stepped", "single_pass")
+    assert restore(str(tmp_path / "live.db.gz"), tmp_path) >= 3000
+
+
+def test_backup_waits_while_writes_are_slow(tmp_path, fast, monkeypatch):
+    engine = make_engine(tmp_path / "live.db", n=500)
+    backups = backup.Backups()
+    busy = iter([True, True, True])
+    monkeypatch.setattr(backups.latency, "busy", lambda max_ms: next(busy, False))
+    paused = sample("sqlite_backup_paused_seconds_total")
+    backups.run(engine, str(tmp_path / "live.db.gz"))
+    assert sample("sqlite_backup_paused_seconds_total") > paused
+
+
+def test_one_backup_at_a_time(tmp_path):
+    backups = backup.Backups()
+    backups._lock.acquire()
+    with pytest.raises(backup.BackupRunning):
+        backups.run(None, str(tmp_path / "x.db.gz"))
+
+
+def test_cli_backup(tmp_path, fast, monkeypatch, capsys):
+    engine = make_engine(tmp_path / "live.db", n=10)
+    monkeypatch.setattr(cli, "engine", engine)
+    target = str(tmp_path / "cli.db.gz")
+    assert cli.main(["backup", "--target", target]) == 0
+    assert "sha256" in capsys.readouterr().out
+    assert restore(target, tmp_path) == 10
+
+
+def test_admin_endpoint(client, tmp_path, fast, monkeypatch):
+    engine = make_engine(tmp_path / "live.db", n=10)
+    monkeypatch.setattr(admin, "engine", engine)
+    monkeypatch.setattr(settings, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(backup, "backups", backup.Backups())
+
+    assert client.post("/admin/backup").status_code == 404
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    r = client.post("/admin/backup", headers={"X-Admin-Token": "wrong"})
+    assert r.status_code == 403
+
+    token = {"X-Admin-Token": "secret"}
+    r = client.post("/admin/backup", headers=token)
+    assert r.status_code == 202
+    for _ in range(100):
+        status = client.get("/admin/backup", headers=token).json()
+        if status["state"] != "running":
+            break
+        time.sleep(0.05)
+    assert status["state"] == "ok"
+    assert restore(status["target"], tmp_path) == 10
@@ -0,0 +1,151 @@
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+import replay
+from capture import TrafficCapture, recorder
+from main import app
+from conftest import headers
+
+MATCH = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 4,
+}
+
+
+@pytest.fixture
+def capture_file(tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    recorder.start(str(path), 10 * 1024 * 1024, 2)
+    yield path
+    recorder.stop()
+
+
+def read(path):
+    recorder.stop()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_sampled_requests_are_written(client, capture_file):
+    captured = TestClient(TrafficCapture(app, rate=1.0))
+    m = captured.post("/matches", json=MATCH, headers=headers("org")).json()
+    captured.put(
+        f"/matches/{m['id']}/join",
+        headers={**headers("u2"), "Authorization": "Bearer x"},
+    )
+    captured.get("/matches", params={"x": "1"})
+
+    create, join, listing = read(capture_file)
+    assert create["method"] == "POST"
+    assert json.loads(create["body"]) == MATCH
+    assert create["status"] == 201
+    assert join["route"] == "/matches/{match_id}/join"
+    assert join["path"] == f"/matches/{m['id']}/join"
+    # Only what replay needs to act as the same user
+    assert join["headers"] == {
+        "x-user-id": "u2",
+        "x-first-name": "John",
+        "x-last-name": "Doe",
+    }
+    assert listing["query"] == "x=1"
+    assert create["ts"] <= join["ts"] <= listing["ts"]
+    assert all(r["duration_ms"] >= 0 for r in (create, join, listing))
+
+
+def test_unsampled_requests_are_not_written(client, capture_file):
+    captured = TestClient(TrafficCapture(app, rate=0.0))
+    captured.get("/matches")
+    assert read(capture_file) == []
+
+
+def test_capture_file_rotates(client, tmp_path):
+    path = tmp_path / "traffic.jsonl"
+    recorder.start(str(path), 2000, 3)
+    captured = TestClient(TrafficCapture(app, rate=1.0))
+    for _ in range(80):
+        captured.get("/matches")
+    recorder.stop()
+    files = sorted(tmp_path.glob("traffic.jsonl*"))
+    assert len(files) == 4
+    assert all(f.stat().st_size <= 2000 for f in files)
+    assert len(replay.load(files)) < 80  # the oldest were rotated away
+
+
+def record(ts, path="/matches", duration_ms=10.0, method="GET", status=200):
+    return {
+        "ts": ts,
+        "duration_ms": duration_ms,
+        "method": method,
+        "path": path,
+        "query": "",
+        "headers": {},
+        "body": "",
+        "status": status,
+    }
+
+
+def test_endpoints_group_by_route():
+    assert replay.endpoint(record(0, "/matches/12/join")) == "GET /matches/{id}/join"
+    assert (
+        replay.endpoint(record(0, "/series/3/occurrences/2025-12-01/join"))
+        == "GET /series/{id}/occurrences/{date}/join"
+    )
+    assert (
+        replay.endpoint({**record(0, "/matches/12"), "route": "/matches/{match_id}"})
+        == "GET /matches/{match_id}"
+    )
+
+
+def test_peak_concurrency():
+    records = [record(0.0, duration_ms=100), record(0.05), record(0.2)]
+    assert replay.peak_concurrency(records) == 2
+
+
+def test_replay_keeps_arrival_times_scaled_by_speed():
+    records = [record(100.0), record(100.5), record(101.0)]
+    sent = []
+
+    def send(r):
+        sent.append(time.perf_counter())
+        return 200
+
+    replay.replay(records, send, speed=10)
+    assert 0.08 <= sent[-1] - sent[0] < 0.5
+
+    sent.clear()
+    replay.replay(records, send, speed=None)
+    assert sent[-1] - sent[0] < 0.08
+
+
+def test_summary_percentiles_and_errors():
+    results = [("GET /matches", 200, float(ms), 200) for ms in range(1, 101)]
+    results += [
+        ("PUT /matches/{id}/join", 500, 5.0, 200),
+        ("PUT /matches/{id}/join", None, 1.0, 200),
+    ]
+    summary = replay.summarize(results)
+    assert summary["GET /matches"]["p50"] == 50
+    assert summary["GET /matches"]["p99"] == 99
+    assert summary["GET /matches"]["max"] == 100
+    assert summary["PUT /matches/{id}/join"]["errors"] == 2
+    assert summary["PUT /matches/{id}/join"]["changed"] == 2
+
+
+def test_captured_traffic_replays(client, capture_file):
+    captured = TestClient(TrafficCapture(app, rate=1.0))
+    m = captured.post("/matches", json=MATCH, headers=headers("org")).json()
+    captured.put(f"/matches/{m['id']}/join", headers=headers("u2"))
+    captured.put(f"/matches/{m['id']}/leave", headers=headers("u2"))
+    records = read(capture_file)
+
+    results = replay.replay(records, replay.make_sender(client), speed=None)
+    summary = replay.summarize(results)
+    assert set(summary) == {
+        "POST /matches",
+        "PUT /matches/{match_id}/join",
+        "PUT /matches/{match_id}/leave",
+    }
+    # Same database state, so the same answers
+    assert all(s["changed"] == 0 and s["errors"] == 0 for s in summary.values())
@@ -0,0 +1,104 @@
+from sqlalchemy import inspect
+from models import MatchRead
+from conftest import headers
+
+PAYLOAD = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 4,
+}
+
+
+def create(client, **kw):
+    return client.post(
+        "/matches", json={**PAYLOAD, **kw}, headers=headers("org1")
+    ).json()
+
+
+def sync(client, since):
+    r = client.get("/matches/changes", params={"since": since})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_initial_sync_returns_everything(client):
+    a = create(client)
+    b = create(client, location="Chamartin")
+    delta = sync(client, 0)
+    assert delta["full"] is True
+    assert delta["version"] == 2
+    assert delta["deleted"] == []
+    assert [m["id"] for m in delta["matches"]] == [a["id"], b["id"]]
+    # Same fields as GET /matches, plus the row's version
+    listed = client.get("/matches").json()
+    assert [
+        {k: m[k] for k in MatchRead.model_fields} for m in delta["matches"]
+    ] == listed
+    assert [m["version"] for m in delta["matches"]] == [1, 2]
+
+
+def test_delta_contains_only_changes_since(client):
+    a = create(client)
+    b = create(client)
+    version = sync(client, 0)["version"]
+
+    client.put(f"/matches/{a['id']}/join", headers=headers("u1"))
+    delta = sync(client, version)
+    assert delta["full"] is False
+    assert [(m["id"], m["joined_players"]) for m in delta["matches"]] == [(a["id"], 1)]
+    assert delta["deleted"] == []
+
+    client.delete(f"/matches/{b['id']}", headers=headers("org1"))
+    later = sync(client, delta["version"])
+    assert later["matches"] == []
+    assert later["deleted"] == [b["id"]]
+
+    # Nothing new
+    assert sync(client, later["version"]) == {
+        "version": later["version"],
+        "full": False,
+        "matches": [],
+        "deleted": [],
+    }
+
+
+def test_created_then_deleted_reports_only_the_deletion(client):
+    create(client)
+    version = sync(client, 0)["version"]
+    m = create(client)
+    client.delete(f"/matches/{m['id']}", headers=headers("org1"))
+    delta = sync(client, version)
+    assert delta["matches"] == []
+    assert delta["deleted"] == [m["id"]]
+
+
+def test_reused_id_after_delete_is_reported_as_live(client):
+    m = create(client)
+    version = sync(client, 0)["version"]
+    client.delete(f"/matches/{m['id']}", headers=headers("org1"))
+    again = create(client)
+    assert again["id"] == m["id"]  # SQLite reuses the highest rowid
+    delta = sync(client, version)
+    assert [x["id"] for x in delta["matches"]] == [m["id"]]
+    assert delta["deleted"] == []
+
+
+def test_unknown_version_forces_full_sync(client):
+    create(client)
+    delta = sync(client, 999)
+    assert delta["full"] is True
+    assert len(delta["matches"]) == 1
+
+
+def test_negative_since_is_rejected(client):
+    assert client.get("/matches/changes", params={"since": -1}).status_code == 422
+
+
+def test_version_columns_are_indexed(engine):
+    inspector = inspect(engine)
+    assert any(i["column_names"] == ["version"] for i in inspector.get_indexes("match"))
+    assert any(
+        i["column_names"] == ["version"]
+        for i in inspector.get_indexes("matchtombstone")
+    )
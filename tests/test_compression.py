@@ -0,0 +1,107 @@
+import gzip
+from conftest import headers
+from compression import choose_encoding, EncodedBody, MIN_COMPRESS_SIZE
+
+
+def create(client, i=0):
+    payload = {
+        "date": "2025-12-01",
+        "time": f"{10 + i % 10:02d}:00:00",
+        "location": f"Pitch number {i} with a reasonably long name",
+        "max_players": 10,
+    }
+    return client.post("/matches", json=payload, headers=headers(f"org{i}")).json()
+
+
+def test_choose_encoding():
+    assert choose_encoding(None) == "identity"
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") == "identity"
+    assert choose_encoding("gzip;foo=1;q=0") == "identity"
+    assert choose_encoding("gzip; Q = 0") == "identity"
+    assert choose_encoding("*") in ("gzip", "br")
+    assert choose_encoding("identity") == "identity"
+
+
+def test_encoded_body_compresses_once():
+    body = EncodedBody(b"x" * (MIN_COMPRESS_SIZE * 2), "text/plain", '"abc"')
+    first = body.variant("gzip")
+    assert body.variant("gzip") is first
+    assert gzip.decompress(first) == body.body
+
+
+def test_list_is_gzipped_and_cached_per_version(client):
+    for i in range(10):
+        create(client, i)
+
+    r = client.get("/matches", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert len(r.json()) == 10
+    etag = r.headers["etag"]
+
+    r2 = client.get("/matches", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r2.headers
+    assert r2.json() == r.json()
+
+    # Same data version -> 304
+    r3 = client.get("/matches", headers={"If-None-Match": etag})
+    assert r3.status_code == 304
+
+    # A write bumps the version and invalidates the cached body
+    create(client, 99)
+    r4 = client.get("/matches", headers={"If-None-Match": etag})
+    assert r4.status_code == 200
+    assert len(r4.json()) == 11
+    assert r4.headers["etag"] != etag
+
+
+def test_list_small_body_not_compressed(client):
+    r = client.get("/matches", headers={"Accept-Encoding": "gzip"})
+    assert r.json() == []
+    assert "content-encoding" not in r.headers
+
+
+def test_join_and_leave_invalidate_list(client):
+    m = create(client)
+    client.get("/matches")
+    client.put(f"/matches/{m['id']}/join", headers=headers("u2"))
+    assert client.get("/matches").json()[0]["joined_players"] == 1
+    client.put(f"/matches/{m['id']}/leave", headers=headers("u2"))
+    assert client.get("/matches").json()[0]["joined_players"] == 0
+
+
+def test_index_served_from_memory_with_validators(client):
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/html")
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["cache-control"] == "no-cache"
+    assert "Football Match Finder" in r.text
+
+    r2 = client.get("/", headers={"If-None-Match": r.headers["etag"]})
+    assert r2.status_code == 304
+
+    assert client.get("/static/index.html").text == r.text
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/../main.py").status_code == 404
+
+
+def test_list_script_and_bench_page_are_served(client):
+    assert '<script src="/static/matchlist.js">' in client.get("/").text
+    r = client.get("/static/matchlist.js")
+    assert r.status_code == 200
+    assert "javascript" in r.headers["content-type"]
+    assert "matchlist.js" in client.get("/static/bench.html").text
+
+
+def test_hashed_assets_are_immutable(tmp_path):
+    from static_assets import StaticAssets, IMMUTABLE
+
+    (tmp_path / "app.3f9c2b1a.js").write_text("console.log(1)")
+    (tmp_path / "app.js").write_text("console.log(1)")
+    assets = StaticAssets(str(tmp_path)).load()
+    assert assets.get("app.3f9c2b1a.js").cache_control == IMMUTABLE
+    assert assets.get("app.js").cache_control == "no-cache"
+    assert assets.get("app.js").etag == assets.get("app.3f9c2b1a.js").etag
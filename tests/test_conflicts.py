@@ -0,0 +1,83 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import text
+import settings
+from conftest import headers
+from schedule import has_conflict
+import users
+
+
+def create(client, day, at):
+    payload = {"date": day, "time": at, "location": "Park", "max_players": 10}
+    return client.post("/matches", json=payload, headers=headers("org1")).json()["id"]
+
+
+@pytest.fixture
+def conflict_check(monkeypatch):
+    monkeypatch.setattr(settings, "CONFLICT_CHECK", True)
+    monkeypatch.setattr(settings, "MATCH_DURATION_MINUTES", 90)
+
+
+def test_overlapping_join_rejected(client, conflict_check):
+    first = create(client, "2025-12-01", "18:00:00")
+    overlapping = create(client, "2025-12-01", "19:00:00")
+    back_to_back = create(client, "2025-12-01", "19:30:00")
+    other_day = create(client, "2025-12-02", "18:00:00")
+
+    assert (
+        client.put(f"/matches/{first}/join", headers=headers("u1")).status_code == 200
+    )
+    r = client.put(f"/matches/{overlapping}/join", headers=headers("u1"))
+    assert r.status_code == 400
+    assert r.json()["detail"] == "You already joined a match at this time"
+    assert (
+        client.put(f"/matches/{back_to_back}/join", headers=headers("u1")).status_code
+        == 200
+    )
+    assert (
+        client.put(f"/matches/{other_day}/join", headers=headers("u1")).status_code
+        == 200
+    )
+    # Other users are unaffected
+    assert (
+        client.put(f"/matches/{overlapping}/join", headers=headers("u2")).status_code
+        == 200
+    )
+
+
+def test_leaving_clears_conflict(client, conflict_check):
+    first = create(client, "2025-12-01", "18:00:00")
+    second = create(client, "2025-12-01", "18:30:00")
+    client.put(f"/matches/{first}/join", headers=headers("u1"))
+    client.put(f"/matches/{first}/leave", headers=headers("u1"))
+    assert (
+        client.put(f"/matches/{second}/join", headers=headers("u1")).status_code == 200
+    )
+
+
+def test_conflict_check_is_off_by_default(client):
+    first = create(client, "2025-12-01", "18:00:00")
+    second = create(client, "2025-12-01", "18:00:00")
+    assert (
+        client.put(f"/matches/{first}/join", headers=headers("u1")).status_code == 200
+    )
+    assert (
+        client.put(f"/matches/{second}/join", headers=headers("u1")).status_code == 200
+    )
+
+
+def test_conflict_query_uses_span_index(client, session):
+    first = create(client, "2025-12-01", "18:00:00")
+    client.put(f"/matches/{first}/join", headers=headers("u1"))
+    user_pk = users.lookup(session, "u1")
+    assert has_conflict(
+        session, user_pk, datetime(2025, 12, 1, 19), datetime(2025, 12, 1, 20, 30)
+    )
+    plan = session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT id FROM matchparticipant "
+            f"WHERE user_id = {user_pk} AND starts_at > '2025-12-01' "
+            "AND starts_at < '2025-12-02' AND ends_at > '2025-12-01'"
+        )
+    ).all()
+    assert "ix_participant_user_span" in " ".join(str(r) for r in plan)
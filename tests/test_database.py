@@ -1,6 +1,6 @@
 import pytest
 from sqlmodel import Session, select
-from models import Match, MatchParticipant
+from models import Match, MatchParticipant, User
 from datetime import date, time
 from sqlalchemy.exc import IntegrityError
 
@@ -15,9 +15,9 @@ class TestDatabaseOperations:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
 
         session.add(match)
@@ -40,9 +40,9 @@ class TestDatabaseOperations:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -50,13 +50,15 @@ class TestDatabaseOperations:
 
         # Add participant
         participant = MatchParticipant(
-            match_id=match.id, user_id="user1", first_name="Jane", last_name="Player"
+            match_id=match.id,
+            user=User(external_id="user1", first_name="Jane", last_name="Player"),
         )
         session.add(participant)
         session.commit()
         session.refresh(participant)
 
         assert participant.id is not None
+        assert participant.user_id == participant.user.id
         assert participant.match_id == match.id
 
     def test_unique_constraint_violation(self, session):
@@ -67,28 +69,22 @@ class TestDatabaseOperations:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
         session.refresh(match)
 
         # Add first participant
-        participant1 = MatchParticipant(
-            match_id=match.id, user_id="user1", first_name="Jane", last_name="Player"
-        )
+        user = User(external_id="user1", first_name="Jane", last_name="Player")
+        participant1 = MatchParticipant(match_id=match.id, user=user)
         session.add(participant1)
         session.commit()
 
         # Try to add same user to same match again
-        participant2 = MatchParticipant(
-            match_id=match.id,
-            user_id="user1",  # Same user
-            first_name="Jane",
-            last_name="Player",
-        )
+        participant2 = MatchParticipant(match_id=match.id, user_id=user.id)
         session.add(participant2)
 
         with pytest.raises(IntegrityError):
@@ -102,27 +98,27 @@ class TestDatabaseOperations:
                 time=time(20, 0),
                 location="Park B",
                 max_players=10,
-                organizer_user_id="org1",
-                organizer_first_name="John",
-                organizer_last_name="Organizer",
+                organizer=User(
+                    external_id="org1", first_name="John", last_name="Organizer"
+                ),
             ),
             Match(
                 date=date(2025, 12, 1),
                 time=time(18, 0),
                 location="Park A",
                 max_players=8,
-                organizer_user_id="org2",
-                organizer_first_name="Jane",
-                organizer_last_name="Organizer",
+                organizer=User(
+                    external_id="org2", first_name="Jane", last_name="Organizer"
+                ),
             ),
             Match(
                 date=date(2025, 12, 1),
                 time=time(20, 0),
                 location="Park C",
                 max_players=12,
-                organizer_user_id="org3",
-                organizer_first_name="Bob",
-                organizer_last_name="Organizer",
+                organizer=User(
+                    external_id="org3", first_name="Bob", last_name="Organizer"
+                ),
             ),
         ]
 
@@ -151,9 +147,9 @@ class TestDatabaseOperations:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -162,10 +158,12 @@ class TestDatabaseOperations:
         # Add participants
         participants = [
             MatchParticipant(
-                match_id=match.id, user_id="user1", first_name="Player", last_name="One"
+                match_id=match.id,
+                user=User(external_id="user1", first_name="Player", last_name="One"),
             ),
             MatchParticipant(
-                match_id=match.id, user_id="user2", first_name="Player", last_name="Two"
+                match_id=match.id,
+                user=User(external_id="user2", first_name="Player", last_name="Two"),
             ),
         ]
 
@@ -200,9 +198,9 @@ class TestDatabaseOperations:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -218,9 +216,9 @@ class TestDatabaseOperations:
         for user_id, first_name, last_name in participants_data:
             participant = MatchParticipant(
                 match_id=match.id,
-                user_id=user_id,
-                first_name=first_name,
-                last_name=last_name,
+                user=User(
+                    external_id=user_id, first_name=first_name, last_name=last_name
+                ),
             )
             session.add(participant)
         session.commit()
@@ -231,22 +229,24 @@ class TestDatabaseOperations:
         ).all()
 
         assert len(match_participants) == 3
-        user_ids = [p.user_id for p in match_participants]
+        user_ids = [p.user.external_id for p in match_participants]
         assert "user1" in user_ids
         assert "user2" in user_ids
         assert "user3" in user_ids
 
         # Query specific participant
         specific_participant = session.exec(
-            select(MatchParticipant).where(
+            select(MatchParticipant)
+            .join(User)
+            .where(
                 MatchParticipant.match_id == match.id,
-                MatchParticipant.user_id == "user2",
+                User.external_id == "user2",
             )
         ).first()
 
         assert specific_participant is not None
-        assert specific_participant.first_name == "Bob"
-        assert specific_participant.last_name == "Jones"
+        assert specific_participant.user.first_name == "Bob"
+        assert specific_participant.user.last_name == "Jones"
 
 
 class TestDataIntegrity:
@@ -260,9 +260,9 @@ class TestDataIntegrity:
             time=time(18, 0),
             location="Test Park",
             max_players=0,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -277,9 +277,9 @@ class TestDataIntegrity:
             time=time(18, 0),
             location="Stadium",
             max_players=10000,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -295,9 +295,7 @@ class TestDataIntegrity:
             time=time(18, 0),
             location=special_location,
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="José",
-            organizer_last_name="García",
+            organizer=User(external_id="org1", first_name="José", last_name="García"),
         )
         session.add(match)
         session.commit()
@@ -314,9 +312,9 @@ class TestDataIntegrity:
             time=time(18, 0),
             location="Test Park",
             max_players=10,
-            organizer_user_id="org1",
-            organizer_first_name="John",
-            organizer_last_name="Organizer",
+            organizer=User(
+                external_id="org1", first_name="John", last_name="Organizer"
+            ),
         )
         session.add(match)
         session.commit()
@@ -325,13 +323,13 @@ class TestDataIntegrity:
         # Add participant with special characters
         participant = MatchParticipant(
             match_id=match.id,
-            user_id="user1",
-            first_name="José María",
-            last_name="González-Pérez",
+            user=User(
+                external_id="user1", first_name="José María", last_name="González-Pérez"
+            ),
         )
         session.add(participant)
         session.commit()
         session.refresh(participant)
 
-        assert participant.first_name == "José María"
-        assert participant.last_name == "González-Pérez"
+        assert participant.user.first_name == "José María"
+        assert participant.user.last_name == "González-Pérez"
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import export
+from conftest import headers
+
+
+def seed(client, n=3):
+    ids = []
+    for i in range(n):
+        payload = {
+            "date": f"2025-12-0{n - i}",
+            "time": "18:00:00",
+            "location": f"Park {i}",
+            "max_players": 5,
+        }
+        ids.append(
+            client.post("/matches", json=payload, headers=headers("org1")).json()["id"]
+        )
+    return ids
+
+
+def test_export_ndjson_in_list_order(client):
+    seed(client)
+    r = client.get("/matches/export")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    listed = client.get("/matches").json()
+    assert [row["id"] for row in rows] == [m["id"] for m in listed]
+    assert rows[0] == listed[0]
+    assert "participants" not in rows[0]
+
+
+def test_export_with_participants(client):
+    ids = seed(client, 2)
+    client.put(f"/matches/{ids[0]}/join", headers=headers("u2", "Bob", "P"))
+    client.put(f"/matches/{ids[0]}/join", headers=headers("u3", "Eve", "Q"))
+    r = client.get("/matches/export", params={"include_participants": True})
+    rows = {row["id"]: row for row in map(json.loads, r.text.splitlines())}
+    assert [p["user_id"] for p in rows[ids[0]]["participants"]] == ["u2", "u3"]
+    assert rows[ids[1]]["participants"] == []
+
+
+def test_export_csv(client):
+    ids = seed(client, 2)
+    client.put(f"/matches/{ids[1]}/join", headers=headers("u2", "Bob", "P"))
+    r = client.get(
+        "/matches/export", params={"format": "csv", "include_participants": True}
+    )
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert len(rows) == 2
+    assert rows[0]["participants"] == "Bob P (u2)"
+    assert rows[1]["participants"] == ""
+
+
+def test_export_streams_in_batches(client, engine, monkeypatch):
+    monkeypatch.setattr(export, "BATCH_SIZE", 2)
+    seed(client, 5)
+    chunks = list(export.ndjson_chunks(engine))
+    assert len(chunks) == 3
+    assert sum(c.count(b"\n") for c in chunks) == 5
+
+
+def test_export_rejects_unknown_format(client):
+    assert client.get("/matches/export", params={"format": "xml"}).status_code == 422
@@ -0,0 +1,175 @@
+import threading
+import time
+from conftest import headers
+from idempotency import Idempotency, MemoryStore, SQLiteStore, StoredResponse
+
+PAYLOAD = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 2,
+}
+
+
+def with_key(key, uid="org1"):
+    return {**headers(uid), "Idempotency-Key": key}
+
+
+def test_retried_create_returns_first_result(client):
+    r1 = client.post("/matches", json=PAYLOAD, headers=with_key("k1"))
+    r2 = client.post("/matches", json=PAYLOAD, headers=with_key("k1"))
+    assert r1.status_code == r2.status_code == 201
+    assert r2.json() == r1.json()
+    assert r2.headers["idempotent-replayed"] == "true"
+    assert len(client.get("/matches").json()) == 1
+
+
+def test_keys_are_scoped_per_user(client):
+    client.post("/matches", json=PAYLOAD, headers=with_key("k1", "org1"))
+    client.post("/matches", json=PAYLOAD, headers=with_key("k1", "org2"))
+    assert len(client.get("/matches").json()) == 2
+
+
+def test_key_reused_for_different_request(client):
+    client.post("/matches", json=PAYLOAD, headers=with_key("k1"))
+    other = {**PAYLOAD, "location": "Casa de Campo"}
+    r = client.post("/matches", json=other, headers=with_key("k1"))
+    assert r.status_code == 422
+
+
+def test_retried_join_does_not_double_count(client):
+    mid = client.post("/matches", json=PAYLOAD, headers=headers("org1")).json()["id"]
+    for _ in range(3):
+        r = client.put(f"/matches/{mid}/join", headers=with_key("j1", "u2"))
+        assert r.status_code == 200
+        assert r.json()["joined_players"] == 1
+
+
+def test_errors_are_replayed(client):
+    r1 = client.put("/matches/999/join", headers=with_key("j1", "u2"))
+    r2 = client.put("/matches/999/join", headers=with_key("j1", "u2"))
+    assert r1.status_code == r2.status_code == 404
+    assert r2.json() == {"detail": "Match not found"}
+
+
+def test_without_key_behaves_as_before(client):
+    client.post("/matches", json=PAYLOAD, headers=headers("org1"))
+    client.post("/matches", json=PAYLOAD, headers=headers("org1"))
+    assert len(client.get("/matches").json()) == 2
+
+
+def test_memory_store_bounded_and_expires():
+    store = MemoryStore(max_entries=2, ttl=60)
+    for i in range(3):
+        store.put(("u", str(i)), StoredResponse("f", 200, b"{}", time.time()))
+    assert store.get(("u", "0")) is None
+    assert store.get(("u", "2")) is not None
+    store.put(("u", "old"), StoredResponse("f", 200, b"{}", time.time() - 120))
+    assert store.get(("u", "old")) is None
+
+
+def test_sqlite_store_roundtrip(engine):
+    store = SQLiteStore(engine, ttl=60)
+    stored = StoredResponse("POST /matches", 201, b'{"id":1}', time.time())
+    store.put(("u1", "k1"), stored)
+    assert store.get(("u1", "k1")) == stored
+    assert store.get(("u2", "k1")) is None
+
+
+class FakeRequest:
+    method = "PUT"
+
+    def __init__(self, key):
+        self.headers = {"Idempotency-Key": key}
+        self.url = type("URL", (), {"path": "/matches/1/join"})()
+
+
+def test_concurrent_duplicates_are_coalesced():
+    idem = Idempotency(MemoryStore(100, 60))
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {"ok": True}
+
+    class Model:
+        @staticmethod
+        def model_validate(value):
+            return value
+
+    results = []
+
+    def worker():
+        results.append(idem.run(FakeRequest("k"), "u1", slow, Model))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert {r.body for r in results} == {b'{"ok": true}'}
+
+
+def test_duplicates_on_different_workers_run_once(tmp_path):
+    from sqlmodel import SQLModel, create_engine
+    from idempotency import TieredStore
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'keys.db'}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+    # Two processes: each has its own memory tier and in-flight table
+    workers = [
+        Idempotency(TieredStore(MemoryStore(100, 60), SQLiteStore(engine, ttl=60)))
+        for _ in range(2)
+    ]
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"ok": len(calls)}
+
+    class Model:
+        @staticmethod
+        def model_validate(value):
+            return value
+
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(
+            workers[0].run(FakeRequest("k"), "u1", slow, Model)
+        )
+    )
+    first.start()
+    started.wait()
+    second = threading.Thread(
+        target=lambda: results.append(
+            workers[1].run(FakeRequest("k"), "u1", slow, Model)
+        )
+    )
+    second.start()
+    time.sleep(0.2)
+    release.set()
+    first.join()
+    second.join()
+    assert len(calls) == 1
+    assert [r.body for r in results] == [b'{"ok": 1}'] * 2
+    assert results[1].headers["Idempotent-Replayed"] == "true"
+
+
+def test_failed_claim_is_released(engine):
+    store = SQLiteStore(engine, ttl=60)
+    assert store.claim(("u1", "k1"), "PUT /matches/1/join")
+    assert not store.claim(("u1", "k1"), "PUT /matches/1/join")
+    store.release(("u1", "k1"))
+    assert store.get(("u1", "k1")) is None
+    assert store.claim(("u1", "k1"), "PUT /matches/1/join")
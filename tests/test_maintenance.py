@@ -0,0 +1,167 @@
+import time
+from datetime import date
+from datetime import time as clock
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine
+import cli
+import maintenance
+import settings
+from db import tune_sqlite
+from migrations import migrate
+from models import Match
+
+
+def counter(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'maint.db'}")
+    tune_sqlite(engine, wal=True)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def scheduler(engine):
+    s = maintenance.MaintenanceScheduler()
+    s.engine = engine
+    return s
+
+
+def fill_and_empty(engine, n=2000):
+    rows = [
+        {
+            "date": "2025-12-01",
+            "time": "18:00:00.000000",
+            "location": "x" * 200,
+            "max_players": 10,
+            "joined_players": 0,
+            "organizer_id": 1,
+        }
+        for _ in range(n)
+    ]
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO match (date, time, location, max_players, joined_players,"
+                " organizer_id)"
+                " VALUES (:date, :time, :location, :max_players, :joined_players,"
+                " :organizer_id)"
+            ),
+            rows,
+        )
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM match"))
+
+
+def freelist(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def test_vacuum_reclaims_freed_pages(engine, scheduler):
+    fill_and_empty(engine)
+    free = freelist(engine)
+    assert free > 0
+    before = counter("sqlite_maintenance_pages_reclaimed_total")
+    assert scheduler.run_task("vacuum") == "ok"
+    assert freelist(engine) == 0
+    assert counter("sqlite_maintenance_pages_reclaimed_total") - before == free
+
+
+def test_vacuum_stops_when_writes_slow_down(engine, scheduler, monkeypatch):
+    fill_and_empty(engine)
+    free = freelist(engine)
+    monkeypatch.setattr(settings, "MAINTENANCE_VACUUM_PAGES", 5)
+    checks = iter([False, False, True])
+    monkeypatch.setattr(scheduler.latency, "busy", lambda: next(checks, True))
+    assert scheduler.run_task("vacuum") == "deferred"
+    assert freelist(engine) == free - 5
+
+
+def test_checkpoints_only_in_wal(engine, scheduler, tmp_path):
+    assert scheduler.run_task("checkpoint") == "ok"
+    assert scheduler.run_task("truncate") == "ok"
+    plain = create_engine(f"sqlite:///{tmp_path / 'plain.db'}")
+    SQLModel.metadata.create_all(plain)
+    scheduler.engine = plain
+    assert scheduler.run_task("checkpoint") == "skipped"
+    # Created without the pragma, so there is no page tracking to use
+    assert scheduler.run_task("vacuum") == "skipped"
+
+
+def test_optimize_and_integrity(scheduler):
+    assert scheduler.run_task("optimize") == "ok"
+    assert scheduler.run_task("integrity") == "ok"
+    assert REGISTRY.get_sample_value("sqlite_integrity_ok") == 1
+
+
+def test_slow_writes_defer_tasks(scheduler, monkeypatch):
+    monkeypatch.setattr(settings, "MAINTENANCE_MAX_WRITE_MS", 50)
+    scheduler.latency.observe(1000)
+    before = counter(
+        "sqlite_maintenance_runs_total", task="optimize", outcome="deferred"
+    )
+    assert scheduler.run_task("optimize") == "deferred"
+    assert (
+        counter("sqlite_maintenance_runs_total", task="optimize", outcome="deferred")
+        == before + 1
+    )
+    # Once writes have been quiet for the window, maintenance resumes
+    monkeypatch.setattr(maintenance, "LATENCY_WINDOW", 0)
+    assert scheduler.run_task("optimize") == "ok"
+
+
+def test_write_latency_is_tracked(engine, scheduler):
+    scheduler.latency.track(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            Match.__table__.insert(),
+            {
+                "date": date(2025, 12, 1),
+                "time": clock(18),
+                "location": "x",
+                "max_players": 2,
+                "joined_players": 0,
+                "organizer_id": 1,
+            },
+        )
+    assert scheduler.latency.last_write > 0
+
+
+def test_scheduler_runs_tasks_when_due(engine, monkeypatch):
+    for _, interval in maintenance.TASKS.values():
+        monkeypatch.setattr(settings, interval, 0.05)
+    before = counter("sqlite_maintenance_runs_total", task="checkpoint", outcome="ok")
+    s = maintenance.MaintenanceScheduler()
+    s.start(engine)
+    time.sleep(0.4)
+    s.stop()
+    assert (
+        counter("sqlite_maintenance_runs_total", task="checkpoint", outcome="ok")
+        > before
+    )
+
+
+def test_cli_maintenance(engine, monkeypatch, capsys):
+    monkeypatch.setattr(cli, "engine", engine)
+    monkeypatch.setattr(cli, "create_db_and_tables", lambda: migrate(engine))
+    assert cli.main(["maintenance", "--task", "integrity", "--task", "vacuum"]) == 0
+    assert "integrity: ok" in capsys.readouterr().out
+
+
+def test_one_process_holds_the_runner_lock(tmp_path):
+    path = tmp_path / "maintenance.lock"
+    first, second = maintenance.RunnerLock(), maintenance.RunnerLock()
+    assert first.acquire(path)
+    assert first.acquire(path)
+    if maintenance.fcntl is not None:
+        assert not second.acquire(path)
+        assert not second.held
+    first.release()
+    assert second.acquire(path)
+    second.release()
@@ -0,0 +1,142 @@
+from sqlalchemy import event, text
+from compression import EncodedBody, EntityBodyCache
+from conftest import headers
+import settings
+
+MATCH = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 2,
+}
+
+
+def create(client, **fields):
+    r = client.post("/matches", json={**MATCH, **fields}, headers=headers("org"))
+    return r.json()["id"]
+
+
+def count_queries(engine):
+    seen = []
+    event.listen(engine, "before_cursor_execute", lambda *args: seen.append(args[2]))
+    return seen
+
+
+def test_detail_matches_the_list_entry(client):
+    mid = create(client)
+    r = client.get(f"/matches/{mid}")
+    assert r.status_code == 200
+    assert r.json() == client.get("/matches").json()[0]
+    assert client.get("/matches/999").status_code == 404
+
+
+def test_cached_detail_only_checks_the_row_version(client, engine):
+    mid = create(client)
+    client.get(f"/matches/{mid}")
+    seen = count_queries(engine)
+    r = client.get(f"/matches/{mid}")
+    assert r.status_code == 200
+    assert len(seen) == 1 and "JOIN" not in seen[0]
+
+
+def test_write_by_another_worker_is_seen(client, session):
+    mid = create(client)
+    etag = client.get(f"/matches/{mid}").headers["etag"]
+    # Committed elsewhere: nothing in this process is told about it
+    session.execute(
+        text(
+            "UPDATE match SET joined_players = 1, version = version + 1 "
+            "WHERE id = :id"
+        ),
+        {"id": mid},
+    )
+    session.commit()
+    r = client.get(f"/matches/{mid}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 1
+    session.execute(text("DELETE FROM match WHERE id = :id"), {"id": mid})
+    session.commit()
+    assert client.get(f"/matches/{mid}").status_code == 404
+
+
+def test_etag_follows_the_row_version(client):
+    mid = create(client)
+    etag = client.get(f"/matches/{mid}").headers["etag"]
+    r = client.get(f"/matches/{mid}", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+
+    joined = client.put(f"/matches/{mid}/join", headers=headers("u1")).json()
+    r = client.get(f"/matches/{mid}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json() == joined
+    assert r.headers["etag"] != etag
+
+    # Other matches keep their tag
+    other = create(client, time="20:00:00")
+    tag = client.get(f"/matches/{other}").headers["etag"]
+    client.put(f"/matches/{mid}/leave", headers=headers("u1"))
+    assert client.get(f"/matches/{other}").headers["etag"] == tag
+
+
+def test_delete_and_series_edits_invalidate(client):
+    mid = create(client)
+    client.get(f"/matches/{mid}")
+    client.delete(f"/matches/{mid}", headers=headers("org"))
+    assert client.get(f"/matches/{mid}").status_code == 404
+
+    series = {**MATCH, "start_date": "2025-12-01"}
+    del series["date"]
+    client.post("/series", json=series, headers=headers("org"))
+    occurrence = client.put(
+        "/series/1/occurrences/2025-12-08/join", headers=headers("u1")
+    ).json()
+    client.get(f"/matches/{occurrence['id']}")
+    client.patch(
+        "/series/1/occurrences/2025-12-08",
+        json={"location": "Vallecas"},
+        headers=headers("org"),
+    )
+    assert client.get(f"/matches/{occurrence['id']}").json()["location"] == "Vallecas"
+
+
+def test_batch(client):
+    a = create(client)
+    b = create(client, time="20:00:00")
+    r = client.get(f"/matches?ids={b}&ids=999&ids={a}&ids={b}")
+    assert [m["id"] for m in r.json()] == [b, a]
+    etag = r.headers["etag"]
+    again = client.get(f"/matches?ids={b}&ids={a}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    client.put(f"/matches/{a}/join", headers=headers("u1"))
+    r = client.get(f"/matches?ids={b}&ids={a}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()[1]["joined_players"] == 1
+
+
+def test_detail_on_the_memory_store(client, monkeypatch):
+    monkeypatch.setattr(settings, "MATCH_STORE", "memory")
+    mid = create(client)
+    etag = client.get(f"/matches/{mid}").headers["etag"]
+    client.put(f"/matches/{mid}/join", headers=headers("u1"))
+    r = client.get(f"/matches/{mid}", headers={"If-None-Match": etag})
+    assert r.json()["joined_players"] == 1
+
+
+def test_entity_cache_is_bounded_and_drops_stale_fills():
+    cache = EntityBodyCache("test", max_entries=2)
+    body = EncodedBody(b"{}", "application/json", '"x"')
+    for key in (1, 2, 3):
+        cache.put(key, 1, body, cache.token())
+    assert cache.get(1, 1) is None
+    assert len(cache) == 2
+    assert cache.get(3, 1) is body
+    # The row moved on since the body was built
+    assert cache.get(3, 2) is None
+    assert len(cache) == 1
+
+    # A reader loaded row 2 before a write to it committed
+    token = cache.token()
+    cache.invalidate(2)
+    cache.put(2, 1, body, token)
+    assert cache.get(2, 1) is None
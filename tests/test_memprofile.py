@@ -0,0 +1,94 @@
+import tracemalloc
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+import memprofile
+import settings
+from conftest import headers
+
+TOKEN = {"X-Admin-Token": "secret"}
+MATCH = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 4,
+}
+
+# Allocated between two snapshots by the diff test
+_hoard = []
+
+
+@pytest.fixture
+def admin(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    return client
+
+
+@pytest.fixture
+def profiling():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc is already on for the whole run")
+    memprofile.profiler.start(1)
+    yield memprofile.profiler
+    memprofile.profiler.stop()
+    _hoard.clear()
+
+
+def test_off_by_default(client, admin):
+    assert not tracemalloc.is_tracing()
+    assert client.get("/admin/memory").status_code == 403
+    status = admin.get("/admin/memory", headers=TOKEN).json()
+    assert status["tracing"] is False
+    r = admin.post("/admin/memory/snapshots", headers=TOKEN)
+    assert r.status_code == 501
+
+
+def test_snapshot_diff_points_at_the_growing_module(admin, profiling):
+    first = admin.post("/admin/memory/snapshots", headers=TOKEN).json()
+    assert first["top"]
+    _hoard.extend(bytearray(1000) for _ in range(2000))
+    second = admin.post("/admin/memory/snapshots", headers=TOKEN).json()
+    assert second["previous"] == first["id"]
+
+    r = admin.get(f"/admin/memory/diff?to={second['id']}", headers=TOKEN)
+    assert r.json()["from"] == first["id"]
+    growth = {s["site"]: s for s in r.json()["sites"]}
+    assert growth["test_memprofile"]["size_diff"] > 1_900_000
+    assert growth["test_memprofile"]["count_diff"] >= 2000
+
+    by_line = admin.get(
+        f"/admin/memory/diff?to={second['id']}&from={first['id']}&group=line",
+        headers=TOKEN,
+    ).json()["sites"]
+    assert by_line[0]["site"].startswith("test_memprofile:")
+
+    status = admin.get("/admin/memory", headers=TOKEN).json()
+    assert status["tracing"] and status["traced_bytes"] > 2_000_000
+    assert admin.get("/admin/memory/diff?to=999", headers=TOKEN).status_code == 404
+
+
+def test_only_recent_snapshots_are_kept(admin, profiling):
+    ids = [profiling.take()[0] for _ in range(memprofile.MAX_SNAPSHOTS + 2)]
+    kept = [
+        s["id"] for s in admin.get("/admin/memory", headers=TOKEN).json()["snapshots"]
+    ]
+    assert kept == ids[-memprofile.MAX_SNAPSHOTS :]
+
+
+def test_allocations_per_matches_route(admin, profiling):
+    traced = TestClient(memprofile.RouteAllocations(app))
+    mid = traced.post("/matches", json=MATCH, headers=headers("org")).json()["id"]
+    for uid in ("u1", "u2"):
+        traced.put(f"/matches/{mid}/join", headers=headers(uid))
+    traced.get("/health")
+
+    routes = {r["route"]: r for r in profiling.routes()}
+    assert set(routes) == {"POST /matches", "PUT /matches/{match_id}/join"}
+    assert routes["PUT /matches/{match_id}/join"]["requests"] == 2
+    assert admin.get("/admin/memory/routes", headers=TOKEN).json() == profiling.routes()
+
+
+def test_module_names():
+    assert memprofile.module_of(memprofile.__file__) == "memprofile"
+    assert memprofile.module_of(tracemalloc.__file__) == "tracemalloc"
+    assert memprofile.module_of("<frozen abc>") == "<frozen abc>"
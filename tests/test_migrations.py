@@ -0,0 +1,57 @@
+from sqlalchemy import create_engine, inspect, text
+from migrations import migrate
+
+# Schema as shipped before participations carried their time span
+OLD_SCHEMA = [
+    """CREATE TABLE match (
+        date DATE NOT NULL, time TIME NOT NULL, location VARCHAR NOT NULL,
+        max_players INTEGER NOT NULL, joined_players INTEGER NOT NULL,
+        id INTEGER NOT NULL, organizer_user_id VARCHAR NOT NULL,
+        organizer_first_name VARCHAR NOT NULL,
+        organizer_last_name VARCHAR NOT NULL, PRIMARY KEY (id))""",
+    """CREATE TABLE matchparticipant (
+        id INTEGER NOT NULL, match_id INTEGER NOT NULL,
+        user_id VARCHAR NOT NULL, first_name VARCHAR NOT NULL,
+        last_name VARCHAR NOT NULL, PRIMARY KEY (id),
+        CONSTRAINT uix_match_user UNIQUE (match_id, user_id),
+        FOREIGN KEY(match_id) REFERENCES match (id))""",
+    """INSERT INTO match VALUES ('2025-10-03', '15:00:00.000000', 'Retiro',
+        10, 1, 1, 'org', 'A', 'B')""",
+    "INSERT INTO matchparticipant VALUES (1, 1, 'u1', 'C', 'D')",
+]
+
+
+def test_migrate_adds_columns_indexes_and_backfills(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for stmt in OLD_SCHEMA:
+            conn.execute(text(stmt))
+
+    migrate(engine)
+    migrate(engine)  # idempotent
+
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("matchparticipant")}
+    assert {"starts_at", "ends_at"} <= columns
+    indexes = {i["name"] for i in inspector.get_indexes("matchparticipant")}
+    assert "ix_participant_user_span" in indexes
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT starts_at, ends_at FROM matchparticipant")
+        ).one()
+    assert row[0].startswith("2025-10-03 15:00:00")
+    assert row[1].startswith("2025-10-03 16:30:00")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM match")).scalar() == 0
+    match_indexes = {i["name"] for i in inspector.get_indexes("match")}
+    assert {"ix_match_version", "ix_match_date_time"} <= match_indexes
+    with engine.connect() as conn:
+        # Summary table created and filled from the existing matches
+        row = conn.execute(
+            text("SELECT matches, max_players, joined_players FROM availabilitysummary")
+        ).one()
+    assert tuple(row) == (1, 10, 1)
+    # Rebuilt tables must not leave other tables pointing at a dropped one
+    for table in inspector.get_table_names():
+        for fk in inspector.get_foreign_keys(table):
+            assert fk["referred_table"] in {"match", "user", "matchseries"}, table
@@ -1,7 +1,7 @@
 import pytest
 from datetime import date, time
 from sqlmodel import Session
-from models import Match, MatchCreate, MatchRead, MatchParticipant
+from models import Match, MatchCreate, MatchRead, MatchParticipant, User
 from sqlalchemy.exc import IntegrityError
 
 
@@ -29,9 +29,7 @@ def test_match_model_creation():
         time=time(18, 0),
         location="Central Park",
         max_players=10,
-        organizer_user_id="user123",
-        organizer_first_name="John",
-        organizer_last_name="Doe",
+        organizer=User(external_id="user123", first_name="John", last_name="Doe"),
     )
 
     assert match.organizer_user_id == "user123"
@@ -61,13 +59,14 @@ def test_match_read_serialization():
 def test_match_participant_model():
     """Test match participant model"""
     participant = MatchParticipant(
-        match_id=1, user_id="user456", first_name="Jane", last_name="Smith"
+        match_id=1,
+        user=User(external_id="user456", first_name="Jane", last_name="Smith"),
     )
 
     assert participant.match_id == 1
-    assert participant.user_id == "user456"
-    assert participant.first_name == "Jane"
-    assert participant.last_name == "Smith"
+    assert participant.user.external_id == "user456"
+    assert participant.user.first_name == "Jane"
+    assert participant.user.last_name == "Smith"
 
 
 def test_match_participant_unique_constraint(session):
@@ -78,28 +77,20 @@ def test_match_participant_unique_constraint(session):
         time=time(18, 0),
         location="Test Location",
         max_players=10,
-        organizer_user_id="org1",
-        organizer_first_name="Organizer",
-        organizer_last_name="One",
+        organizer=User(external_id="org1", first_name="Organizer", last_name="One"),
     )
     session.add(match)
     session.commit()
     session.refresh(match)
 
     # Add first participant
-    participant1 = MatchParticipant(
-        match_id=match.id, user_id="user1", first_name="John", last_name="Doe"
-    )
+    user = User(external_id="user1", first_name="John", last_name="Doe")
+    participant1 = MatchParticipant(match_id=match.id, user=user)
     session.add(participant1)
     session.commit()
 
     # Try to add the same user again - should fail
-    participant2 = MatchParticipant(
-        match_id=match.id,
-        user_id="user1",  # Same user
-        first_name="John",
-        last_name="Doe",
-    )
+    participant2 = MatchParticipant(match_id=match.id, user_id=user.id)
     session.add(participant2)
 
     with pytest.raises(IntegrityError):
@@ -122,9 +113,7 @@ def test_match_default_values():
         time=time(18, 0),
         location="Test Location",
         max_players=10,
-        organizer_user_id="user123",
-        organizer_first_name="John",
-        organizer_last_name="Doe",
+        organizer=User(external_id="user123", first_name="John", last_name="Doe"),
     )
 
     assert match.joined_players == 0
@@ -0,0 +1,53 @@
+from datetime import date, time
+from pydantic import TypeAdapter
+from sqlmodel import select
+from models import Match, MatchRead, User
+from queries import dump_row, dump_rows, get_match_row, list_match_rows
+
+
+def add(session, **kw):
+    values = dict(
+        date=date(2025, 12, 1),
+        time=time(18, 0),
+        location="Parque José María - ñ",
+        max_players=10,
+        organizer=session.get(User, 1)
+        or User(id=1, external_id="org1", first_name="Jose", last_name="Pérez"),
+    )
+    values.update(kw)
+    m = Match(**values)
+    session.add(m)
+    session.commit()
+    return m.id
+
+
+def test_rows_serialize_like_match_read(session):
+    add(session)
+    add(session, date=date(2025, 11, 30), time=time(9, 30, 15, 250))
+    expected = TypeAdapter(list[MatchRead]).dump_json(
+        [
+            MatchRead.model_validate(m)
+            for m in session.exec(select(Match).order_by(Match.date, Match.time))
+        ]
+    )
+    session.expunge_all()
+    assert dump_rows(list_match_rows(session)) == expected
+
+
+def test_core_reads_skip_the_identity_map(session):
+    mid = add(session)
+    session.expunge_all()
+    rows = list_match_rows(session)
+    assert rows[0].id == mid
+    assert len(session.identity_map) == 0
+
+
+def test_get_match_row(session):
+    mid = add(session)
+    row = get_match_row(session, mid)
+    assert row.location == "Parque José María - ñ"
+    assert (
+        dump_row(row)
+        == MatchRead.model_validate(session.get(Match, mid)).model_dump_json().encode()
+    )
+    assert get_match_row(session, mid + 1) is None
@@ -0,0 +1,169 @@
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from conftest import headers
+
+# Tables whose size grows with usage; a plain scan of them is a regression
+CHECKED_TABLES = ("match", "matchparticipant", "matchwaitlist", "user")
+
+# (endpoint, table) -> why scanning the whole table is the point
+ALLOWED_SCANS = {
+    ("GET /matches/changes", "match"): "since=0 is a full sync",
+    ("GET /matches/recommend", "match"): "snapshot rebuild reads all open matches",
+}
+
+_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+_AUTOMATIC = re.compile(r"^(?:SEARCH|SCAN) (\w+) .*USING AUTOMATIC")
+
+
+class StatementRecorder:
+    """Collects the SQL an engine runs, grouped by the current label."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.label = None
+        self.statements = defaultdict(list)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.label is None or not re.match(
+            r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", statement, re.I
+        ):
+            return
+        if executemany:
+            parameters = parameters[0]
+        self.statements[self.label].append((statement, parameters))
+
+    @contextmanager
+    def recording(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def plans(self):
+        """(label, statement, plan detail lines) for everything recorded."""
+        with self.engine.connect() as conn:
+            for label, statements in self.statements.items():
+                for statement, parameters in statements:
+                    rows = conn.exec_driver_sql(
+                        "EXPLAIN QUERY PLAN " + statement, parameters
+                    ).all()
+                    yield label, statement, [r[-1] for r in rows]
+
+
+def unindexed_scans(recorder, allowed=ALLOWED_SCANS):
+    problems = []
+    for label, statement, details in recorder.plans():
+        for detail in details:
+            m = _SCAN.match(detail) or _AUTOMATIC.match(detail)
+            if not m or m.group(1) not in CHECKED_TABLES:
+                continue
+            if (label, m.group(1)) not in allowed:
+                problems.append(f"{label}: {detail}\n    {statement}")
+    return problems
+
+
+@pytest.fixture
+def seeded(client):
+    for i in range(30):
+        client.post(
+            "/matches",
+            json={
+                "date": f"2025-12-{i % 28 + 1:02d}",
+                "time": f"{8 + i % 12:02d}:00:00",
+                "location": ("Retiro", "Chamartin", "Vallecas")[i % 3],
+                "max_players": 3,
+            },
+            headers=headers(f"org{i % 4}"),
+        )
+    for mid in range(1, 21):
+        for u in range(mid % 4):
+            client.put(f"/matches/{mid}/join", headers=headers(f"u{u}"))
+    client.put("/matches/3/join", headers=headers("u9"))
+    client.put("/matches/3/waitlist", headers=headers("w1"))
+    series = {
+        "start_date": "2025-12-01",
+        "time": "19:00:00",
+        "location": "Retiro",
+        "max_players": 4,
+    }
+    client.post("/series", json=series, headers=headers("org1"))
+    client.put("/series/1/occurrences/2025-12-08/join", headers=headers("u1"))
+    return client
+
+
+def exercise(client, recorder):
+    calls = [
+        ("GET", "/matches", None, "u1"),
+        ("GET", "/matches/5", None, "u1"),
+        ("GET", "/matches?ids=6&ids=7", None, "u1"),
+        ("GET", "/matches/changes?since=0", None, "u1"),
+        ("GET", "/matches/changes?since=5", None, "u1"),
+        ("GET", "/matches/summary?from=2025-12-01&to=2025-12-31", None, "u1"),
+        (
+            "GET",
+            "/matches/recommend?from=2025-11-30T00:00:00&location=Retiro",
+            None,
+            "u1",
+        ),
+        ("GET", "/matches/export?include_participants=true", None, "u1"),
+        (
+            "POST",
+            "/matches",
+            {
+                "date": "2025-12-05",
+                "time": "18:00:00",
+                "location": "Retiro",
+                "max_players": 2,
+            },
+            "org1",
+        ),
+        ("PUT", "/matches/2/join", None, "u7"),
+        ("PUT", "/matches/2/leave", None, "u7"),
+        ("PUT", "/matches/3/leave", None, "u1"),
+        ("PUT", "/matches/4/waitlist", None, "w2"),
+        ("GET", "/matches/4/waitlist", None, "w2"),
+        ("DELETE", "/matches/4/waitlist", None, "w2"),
+        ("DELETE", "/matches/21", None, "org1"),
+        ("GET", "/series/occurrences?from=2025-12-01&to=2025-12-31", None, "u1"),
+        ("PUT", "/series/1/occurrences/2025-12-15/join", None, "u2"),
+        ("PATCH", "/series/1/occurrences/2025-12-08", {"time": "20:00:00"}, "org1"),
+    ]
+    for method, url, body, user in calls:
+        recorder.label = f"{method} {url.split('?')[0]}"
+        client.request(method, url, json=body, headers=headers(user))
+    recorder.label = None
+
+
+def test_endpoints_use_indexes(seeded, engine):
+    recorder = StatementRecorder(engine)
+    with recorder.recording():
+        exercise(seeded, recorder)
+    assert recorder.statements["GET /matches"], "nothing was recorded"
+    problems = unindexed_scans(recorder)
+    assert not problems, "Unindexed scans:\n" + "\n".join(problems)
+
+
+def test_detects_a_scan(session, engine):
+    recorder = StatementRecorder(engine)
+    with recorder.recording():
+        recorder.label = "adhoc"
+        session.connection().exec_driver_sql(
+            "SELECT id FROM match WHERE location = 'Retiro'"
+        )
+    assert len(unindexed_scans(recorder)) == 1
+    assert unindexed_scans(recorder, {("adhoc", "match"): "test"}) == []
+
+
+def test_match_list_order_needs_no_sort(session):
+    from queries import LIST_MATCHES
+
+    sql = str(LIST_MATCHES.compile(session.get_bind()))
+    details = [
+        r[-1] for r in session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql)
+    ]
+    assert sql.rstrip().endswith('"match".id')
+    assert not [d for d in details if "TEMP B-TREE" in d], details
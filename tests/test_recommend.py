@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+import pytest
+import recommend
+from changes import Change
+from conftest import headers
+
+
+def create(client, days, hour, location, max_players=10, org="org1"):
+    payload = {
+        "date": (date.today() + timedelta(days=days)).isoformat(),
+        "time": f"{hour:02d}:00:00",
+        "location": location,
+        "max_players": max_players,
+    }
+    return client.post("/matches", json=payload, headers=headers(org)).json()["id"]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def scoring(request, monkeypatch):
+    if request.param == "numpy" and recommend.np is None:
+        pytest.skip("numpy not installed")
+    if request.param == "python":
+        monkeypatch.setattr(recommend, "np", None)
+    return request.param
+
+
+def test_recommend_ranks_by_history_and_preferences(client, scoring):
+    past = create(client, 2, 18, "Retiro")
+    client.put(f"/matches/{past}/join", headers=headers("u1"))
+    retiro = create(client, 5, 18, "Retiro")
+    other = create(client, 5, 10, "Casa de Campo")
+    full = create(client, 1, 18, "Retiro", max_players=1)
+    client.put(f"/matches/{full}/join", headers=headers("u9"))
+
+    r = client.get("/matches/recommend", headers=headers("u1"))
+    assert r.status_code == 200
+    ids = [m["id"] for m in r.json()]
+    # Already joined and full matches are never suggested
+    assert past not in ids and full not in ids
+    assert ids == [retiro, other]
+    assert r.json()[0]["location"] == "Retiro"
+    assert r.json()[0]["score"] > r.json()[1]["score"]
+
+    r = client.get(
+        "/matches/recommend",
+        params={"location": "Casa de Campo"},
+        headers=headers("u1"),
+    )
+    assert r.json()[0]["id"] == other
+
+
+def test_recommend_respects_window_and_limit(client, scoring):
+    for days in range(1, 6):
+        create(client, days, 18, f"Pitch {days}")
+    start = (date.today() + timedelta(days=2)).isoformat() + "T00:00:00"
+    end = (date.today() + timedelta(days=4)).isoformat() + "T00:00:00"
+    r = client.get(
+        "/matches/recommend",
+        params={"from": start, "to": end, "limit": 1},
+        headers=headers("u1"),
+    )
+    assert [m["location"] for m in r.json()] == ["Pitch 2"]
+
+
+def test_recommend_requires_identity(client):
+    assert client.get("/matches/recommend").status_code == 401
+
+
+def test_snapshot_follows_writes_incrementally(client):
+    mid = create(client, 3, 18, "Retiro", max_players=1)
+    client.get("/matches/recommend", headers=headers("u1"))
+    version = recommend.snapshot.version
+    assert len(recommend.snapshot) == 1
+
+    client.put(f"/matches/{mid}/join", headers=headers("u2"))
+    assert recommend.snapshot.version == version + 1
+    assert len(recommend.snapshot) == 0
+
+    client.put(f"/matches/{mid}/leave", headers=headers("u2"))
+    assert len(recommend.snapshot) == 1
+
+
+def test_snapshot_goes_stale_on_version_gap():
+    snap = recommend.OpenMatchSnapshot()
+    snap.version = 5
+    match = {
+        "date": date.today(),
+        "time": None,
+        "joined_players": 0,
+        "max_players": 2,
+        "location": "x",
+    }
+    snap.apply(Change("created", 1, 7, match))
+    assert snap.version is None
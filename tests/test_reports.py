@@ -0,0 +1,150 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+import changes
+import reports
+import settings
+from conftest import headers
+from db import get_session
+from main import app
+
+SEASON = {"type": "attendance", "from": "2025-09-01", "to": "2026-05-31"}
+TOKEN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Report workers are other processes: they need a file to open
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'reports.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def files(db):
+    def override_get_session():
+        with Session(db) as s:
+            yield s
+
+    app.dependency_overrides[get_session] = override_get_session
+    changes.reset()
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+    changes.reset()
+
+
+def seed(client):
+    matches = [
+        ("2025-10-04", "Retiro", 4, ["u1", "u2", "u3"]),
+        ("2025-10-11", "Retiro", 2, ["u1", "u2"]),
+        ("2025-11-01", "Casa de Campo", 3, ["u1"]),
+        ("2025-11-08", "Casa de Campo", 2, []),
+        # Outside the season
+        ("2025-06-01", "Retiro", 2, ["u3"]),
+    ]
+    for day, location, size, players in matches:
+        payload = {"date": day, "time": "18:00:00", "location": location}
+        r = client.post(
+            "/matches", json={**payload, "max_players": size}, headers=headers("org")
+        )
+        for uid in players:
+            client.put(f"/matches/{r.json()['id']}/join", headers=headers(uid))
+
+
+def wait_done(client, report_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        report = client.get(f"/reports/{report_id}", headers=TOKEN).json()
+        if report["status"] in ("done", "error"):
+            return report
+        time.sleep(0.05)
+    raise AssertionError("report did not finish")
+
+
+def test_reports_aggregate_the_season(files, db):
+    seed(files)
+    path = db.url.database
+    played = reports.compute(path, "attendance", "2025-09-01", "2026-05-31", 2)
+    assert played["matches"] == 4
+    assert [
+        (p["user_id"], p["matches"], p["locations"]) for p in played["players"]
+    ] == [
+        ("u1", 3, 2),
+        ("u2", 2, 1),
+        ("u3", 1, 1),
+    ]
+    assert played["players"][0]["share"] == 0.75
+    used = reports.compute(path, "utilisation", "2025-09-01", "2026-05-31", 1)
+    assert used["locations"] == [
+        {
+            "location": "Casa de Campo",
+            "matches": 2,
+            "slots": 5,
+            "filled": 1,
+            "utilisation": 0.2,
+            "full_matches": 0,
+            "empty_matches": 1,
+        },
+        {
+            "location": "Retiro",
+            "matches": 2,
+            "slots": 6,
+            "filled": 5,
+            "utilisation": 0.8333,
+            "full_matches": 1,
+            "empty_matches": 0,
+        },
+    ]
+
+
+def test_report_is_computed_off_the_request_and_cached(files):
+    seed(files)
+    r = files.post("/reports", json=SEASON, headers=TOKEN)
+    assert r.status_code == 202
+    queued = r.json()
+    assert queued["status"] in ("queued", "running")
+    assert (queued["from"], queued["to"]) == ("2025-09-01", "2026-05-31")
+
+    done = wait_done(files, queued["id"])
+    assert done["status"] == "done"
+    assert done["result"]["players"][0]["user_id"] == "u1"
+
+    # Same parameters at the same data version: answered from the cache
+    again = files.post("/reports", json=SEASON, headers=TOKEN)
+    assert again.status_code == 200
+    assert again.json()["result"] == done["result"]
+
+    # A write moves the data version, so the next request computes again
+    mid = files.get("/matches").json()[0]["id"]
+    files.put(f"/matches/{mid}/join", headers=headers("u9"))
+    fresh = files.post("/reports", json=SEASON, headers=TOKEN)
+    assert fresh.status_code == 202
+    assert fresh.json()["version"] > done["version"]
+    assert wait_done(files, fresh.json()["id"])["status"] == "done"
+
+
+def test_report_validation(client):
+    bad = {**SEASON, "from": "2026-06-01"}
+    assert client.post("/reports", json=bad, headers=TOKEN).status_code == 400
+    # The in-memory test database cannot be opened by a worker process
+    assert client.post("/reports", json=SEASON, headers=TOKEN).status_code == 501
+    assert client.get("/reports/nope", headers=TOKEN).status_code == 404
+
+
+def test_reports_need_the_admin_token(client, monkeypatch):
+    # A signed-in player cannot read everyone's attendance
+    r = client.post("/reports", json=SEASON, headers=headers("u1"))
+    assert r.status_code == 403
+    assert client.get("/reports/nope", headers=headers("u1")).status_code == 403
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.post("/reports", json=SEASON, headers=TOKEN).status_code == 404
@@ -0,0 +1,183 @@
+import threading
+from datetime import date, time
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+from conftest import headers
+from models import Match, MatchCreate
+from repository import InMemoryRepository, SQLModelRepository
+import settings
+
+# Conformance suite: every test runs against each match store
+
+ORGANIZER = ("org", "Olga", "Ruiz")
+
+
+def user(n):
+    return (f"u{n}", "Pat", f"Player {n}")
+
+
+def match(day=1, hour=18, max_players=2, location="Retiro"):
+    return MatchCreate(
+        date=date(2025, 12, day),
+        time=time(hour),
+        location=location,
+        max_players=max_players,
+    )
+
+
+@pytest.fixture(params=["sqlmodel", "memory"])
+def repo(request):
+    if request.param == "memory":
+        return InMemoryRepository()
+    return SQLModelRepository(request.getfixturevalue("session"))
+
+
+def status_of(fn, *args):
+    with pytest.raises(HTTPException) as e:
+        fn(*args)
+    return e.value.status_code
+
+
+def test_create_get_list_and_page(repo):
+    late = repo.create(ORGANIZER, match(day=3))
+    early = repo.create(ORGANIZER, match(day=1, hour=20))
+    tie = repo.create(ORGANIZER, match(day=3))
+    assert late._asdict() == {
+        "date": date(2025, 12, 3),
+        "time": time(18),
+        "location": "Retiro",
+        "max_players": 2,
+        "joined_players": 0,
+        "id": late.id,
+        "organizer_user_id": "org",
+        "organizer_first_name": "Olga",
+        "organizer_last_name": "Ruiz",
+    }
+    assert repo.get(late.id) == late
+    assert repo.get(late.id + 100) is None
+    assert [m.id for m in repo.list()] == [early.id, late.id, tie.id]
+    assert [m.id for m in repo.list(offset=1, limit=1)] == [late.id]
+    assert [m.id for m in repo.list(offset=1)] == [late.id, tie.id]
+    assert repo.list(offset=3, limit=5) == []
+
+
+def test_join_and_leave(repo):
+    m = repo.create(ORGANIZER, match(max_players=2))
+    assert repo.join(m.id, user(1)).joined_players == 1
+    assert status_of(repo.join, m.id, user(1)) == 400
+    assert repo.join(m.id, user(2)).joined_players == 2
+    assert status_of(repo.join, m.id, user(3)) == 400
+    assert status_of(repo.join, m.id + 100, user(3)) == 404
+
+    assert repo.leave(m.id, user(1)).joined_players == 1
+    assert status_of(repo.leave, m.id, user(1)) == 400
+    assert status_of(repo.leave, m.id + 100, user(1)) == 404
+    assert repo.get(m.id).joined_players == 1
+
+
+def test_delete(repo):
+    m = repo.create(ORGANIZER, match())
+    repo.join(m.id, user(1))
+    assert status_of(repo.delete, m.id, "u1") == 403
+    assert status_of(repo.delete, m.id, "org") == 400
+    repo.leave(m.id, user(1))
+    repo.delete(m.id, "org")
+    assert repo.get(m.id) is None
+    assert repo.list() == []
+    assert status_of(repo.delete, m.id, "org") == 404
+
+
+def test_every_write_moves_the_version(repo):
+    seen = [repo.version()]
+    m = repo.create(ORGANIZER, match())
+    seen.append(repo.version())
+    repo.join(m.id, user(1))
+    seen.append(repo.version())
+    repo.leave(m.id, user(1))
+    seen.append(repo.version())
+    repo.delete(m.id, "org")
+    seen.append(repo.version())
+    assert seen == sorted(set(seen))
+    # Reads and refused writes leave it alone
+    repo.list()
+    status_of(repo.leave, m.id, user(1))
+    assert repo.version() == seen[-1]
+
+
+def test_row_versions_change_with_their_row(repo):
+    a = repo.create(ORGANIZER, match())
+    b = repo.create(ORGANIZER, match(hour=20))
+    before = repo.get_many([a.id, b.id, b.id + 100])
+    assert set(before) == {a.id, b.id}
+    assert before[a.id][0] == a
+    repo.join(a.id, user(1))
+    after = repo.get_many([a.id, b.id])
+    assert after[a.id][1] > before[a.id][1]
+    assert after[a.id][0].joined_players == 1
+    assert after[b.id] == before[b.id]
+    assert repo.versions([a.id, b.id + 100]) == {a.id: after[a.id][1]}
+
+
+def test_renamed_organizer_shows_on_their_matches(repo):
+    m = repo.create(ORGANIZER, match())
+    repo.join(m.id, ("org", "Olga", "Ruiz-Diaz"))
+    assert repo.get(m.id).organizer_last_name == "Ruiz-Diaz"
+
+
+def test_overlapping_join_is_refused(repo, monkeypatch):
+    monkeypatch.setattr(settings, "CONFLICT_CHECK", True)
+    first = repo.create(ORGANIZER, match(hour=18))
+    overlapping = repo.create(ORGANIZER, match(hour=19, location="Casa de Campo"))
+    later = repo.create(ORGANIZER, match(hour=20))
+    repo.join(first.id, user(1))
+    assert status_of(repo.join, overlapping.id, user(1)) == 400
+    repo.join(later.id, user(1))
+    repo.leave(first.id, user(1))
+    assert repo.join(overlapping.id, user(2)).joined_players == 1
+
+
+def test_memory_store_joins_are_atomic():
+    repo = InMemoryRepository()
+    m = repo.create(ORGANIZER, match(max_players=5))
+    joined = []
+    barrier = threading.Barrier(20)
+
+    def worker(n):
+        barrier.wait()
+        try:
+            repo.join(m.id, user(n))
+            joined.append(n)
+        except HTTPException:
+            pass
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(joined) == 5
+    assert repo.get(m.id).joined_players == 5
+
+
+def test_api_on_the_memory_store(client, session, monkeypatch):
+    monkeypatch.setattr(settings, "MATCH_STORE", "memory")
+    payload = {
+        "date": "2025-12-01",
+        "time": "18:00:00",
+        "location": "Retiro",
+        "max_players": 2,
+    }
+    r = client.post("/matches", json=payload, headers=headers("org"))
+    assert r.status_code == 201
+    mid = r.json()["id"]
+    r = client.put(f"/matches/{mid}/join", headers=headers("u1"))
+    assert r.json()["joined_players"] == 1
+    assert client.get("/matches").json() == [r.json()]
+    assert client.put(f"/matches/{mid}/leave", headers=headers("u1")).status_code == 200
+    assert client.delete(f"/matches/{mid}", headers=headers("org")).status_code == 204
+    assert client.get("/matches").json() == []
+    # Nothing reached SQLite, and features reading it directly are refused
+    assert session.exec(select(Match)).all() == []
+    assert client.get("/matches/summary").status_code == 501
+    assert client.get("/series/occurrences").status_code == 501
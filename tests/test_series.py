@@ -0,0 +1,144 @@
+from sqlmodel import select
+import availability
+from models import Match, MatchParticipant
+from conftest import headers
+
+SERIES = {
+    "start_date": "2025-12-01",  # a Monday
+    "until": "2026-02-23",
+    "time": "19:00:00",
+    "location": "Retiro",
+    "max_players": 2,
+}
+
+
+def create_series(client, **kw):
+    r = client.post("/series", json={**SERIES, **kw}, headers=headers("org1"))
+    assert r.status_code == 201
+    return r.json()["id"]
+
+
+def occurrences(client, start="2025-12-01", end="2025-12-31", **params):
+    r = client.get("/series/occurrences", params={"from": start, "to": end, **params})
+    assert r.status_code == 200
+    return r.json()
+
+
+def test_occurrences_are_generated_without_rows(client, session):
+    sid = create_series(client)
+    found = occurrences(client)
+    assert [o["occurrence"] for o in found] == [
+        "2025-12-01",
+        "2025-12-08",
+        "2025-12-15",
+        "2025-12-22",
+        "2025-12-29",
+    ]
+    assert all(o["id"] is None and o["series_id"] == sid for o in found)
+    assert found[0]["organizer_user_id"] == "org1"
+    assert session.exec(select(Match)).all() == []
+    assert client.get("/matches").json() == []
+
+
+def test_interval_until_and_range_start(client):
+    create_series(client, interval_weeks=2, until="2025-12-31")
+    assert [o["date"] for o in occurrences(client, "2025-12-10", "2026-03-01")] == [
+        "2025-12-15",
+        "2025-12-29",
+    ]
+
+
+def test_occurrences_of_several_series_are_sorted(client):
+    a = create_series(client)
+    b = create_series(client, start_date="2025-12-03", time="08:00:00")
+    found = occurrences(client, "2025-12-01", "2025-12-10")
+    assert [(o["series_id"], o["date"]) for o in found] == [
+        (a, "2025-12-01"),
+        (b, "2025-12-03"),
+        (a, "2025-12-08"),
+        (b, "2025-12-10"),
+    ]
+    assert [o["series_id"] for o in occurrences(client, series_id=b)] == [b] * 5
+
+
+def test_join_materializes_one_occurrence(client, session):
+    sid = create_series(client)
+    r = client.put(f"/series/{sid}/occurrences/2025-12-08/join", headers=headers("u1"))
+    assert r.status_code == 200
+    mid = r.json()["id"]
+    assert r.json()["joined_players"] == 1
+    r = client.put(f"/series/{sid}/occurrences/2025-12-08/join", headers=headers("u2"))
+    assert r.json()["id"] == mid
+    r = client.put(f"/series/{sid}/occurrences/2025-12-08/join", headers=headers("u1"))
+    assert r.status_code == 400
+
+    matches = session.exec(select(Match)).all()
+    assert [(m.id, m.series_id, str(m.occurrence)) for m in matches] == [
+        (mid, sid, "2025-12-08")
+    ]
+    found = {o["occurrence"]: o for o in occurrences(client)}
+    assert found["2025-12-08"]["id"] == mid
+    assert found["2025-12-08"]["joined_players"] == 2
+    assert found["2025-12-15"]["id"] is None
+    # From here on it is a regular match
+    assert client.put(f"/matches/{mid}/leave", headers=headers("u2")).status_code == 200
+
+
+def test_unknown_series_or_date(client):
+    sid = create_series(client)
+    assert (
+        client.put(
+            "/series/99/occurrences/2025-12-08/join", headers=headers()
+        ).status_code
+        == 404
+    )
+    for day in ("2025-12-09", "2025-11-24", "2026-03-02"):
+        r = client.put(f"/series/{sid}/occurrences/{day}/join", headers=headers())
+        assert r.status_code == 404
+    assert client.get("/series/99").status_code == 404
+    assert client.get(f"/series/{sid}").json()["location"] == "Retiro"
+
+
+def test_edit_occurrence(client, session):
+    sid = create_series(client)
+    url = f"/series/{sid}/occurrences/2025-12-15"
+    r = client.patch(url, json={"location": "Chamartin"}, headers=headers("u1"))
+    assert r.status_code == 403
+    r = client.patch(url, json={"location": None}, headers=headers("org1"))
+    assert r.status_code == 400
+    assert session.exec(select(Match)).all() == []
+
+    client.put(f"{url}/join", headers=headers("u1"))
+    client.put(f"{url}/join", headers=headers("u2"))
+    r = client.patch(url, json={"max_players": 1}, headers=headers("org1"))
+    assert r.status_code == 400
+
+    r = client.patch(
+        url, json={"time": "21:00:00", "location": "Chamartin"}, headers=headers("org1")
+    )
+    assert r.status_code == 200
+    assert (r.json()["time"], r.json()["location"]) == ("21:00:00", "Chamartin")
+    spans = {str(p.starts_at) for p in session.exec(select(MatchParticipant))}
+    assert spans == {"2025-12-15 21:00:00"}
+    summary = client.get(
+        "/matches/summary", params={"from": "2025-12-15", "to": "2025-12-15"}
+    ).json()
+    assert [(b["location"], b["joined_players"]) for b in summary] == [("Chamartin", 2)]
+    assert availability.verify(session.connection()) == []
+    # Other occurrences keep the template
+    assert occurrences(client, "2025-12-22", "2025-12-22")[0]["location"] == "Retiro"
+
+
+def test_validation(client):
+    r = client.post(
+        "/series", json={**SERIES, "until": "2025-11-01"}, headers=headers("org1")
+    )
+    assert r.status_code == 400
+    r = client.post(
+        "/series", json={**SERIES, "interval_weeks": 0}, headers=headers("org1")
+    )
+    assert r.status_code == 422
+    r = client.get(
+        "/series/occurrences", params={"from": "2025-01-01", "to": "2026-06-01"}
+    )
+    assert r.status_code == 400
@@ -0,0 +1,98 @@
+import signal
+import time
+import pytest
+import readiness
+import settings
+
+uvicorn = pytest.importorskip("uvicorn")
+import serve  # noqa: E402
+
+
+def isolate_env(monkeypatch):
+    # build_config only fills in unset variables; keep it off the real env
+    for name in ("DB_ECHO", "SQLITE_WAL", "MAINTENANCE", "IDEMPOTENCY_SQLITE"):
+        monkeypatch.setenv(name, "1")
+    # settings was imported before the environment above was set
+    monkeypatch.setattr(settings, "IDEMPOTENCY_SQLITE", True)
+    monkeypatch.setattr(settings, "SLOT_ENGINE", False)
+
+
+def test_ready_flips_with_the_flag(client):
+    assert client.get("/ready").json() == {"status": "ready"}
+    readiness.ready.clear()
+    try:
+        r = client.get("/ready")
+        assert r.status_code == 503
+        # Liveness is unaffected by a drain
+        assert client.get("/health").status_code == 200
+    finally:
+        readiness.ready.set()
+
+
+def test_autotune_workers(monkeypatch):
+    monkeypatch.setattr(serve, "cpu_limit", lambda: 4)
+    assert serve.autotune_workers() == 4
+    monkeypatch.setattr(serve, "cpu_limit", lambda: 64)
+    assert serve.autotune_workers() == serve.MAX_AUTO_WORKERS
+    assert serve.autotune_workers(slot_engine=True) == 1
+
+
+def test_production_profile_falls_back_without_extras(monkeypatch):
+    monkeypatch.setattr(serve, "available", lambda module: False)
+    monkeypatch.setattr(serve, "cpu_limit", lambda: 3)
+    isolate_env(monkeypatch)
+    config, drain = serve.build_config("production", port=9000)
+    assert (config.loop, config.http) == ("asyncio", "h11")
+    assert config.workers == 3
+    assert config.timeout_keep_alive == 75
+    assert config.limit_concurrency == 1000
+    assert config.port == 9000
+    assert drain == 5.0
+
+
+def test_overrides_win(monkeypatch):
+    monkeypatch.setattr(serve, "available", lambda module: True)
+    isolate_env(monkeypatch)
+    config, drain = serve.build_config("production", workers=2, drain_seconds=0)
+    assert (config.loop, config.http) == ("uvloop", "httptools")
+    assert config.workers == 2
+    assert drain == 0
+
+
+def test_several_workers_need_shared_state(monkeypatch):
+    isolate_env(monkeypatch)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_SQLITE", False)
+    with pytest.raises(RuntimeError, match="IDEMPOTENCY_SQLITE"):
+        serve.build_config("dev", workers=2)
+    assert serve.build_config("dev", workers=1)[0].workers == 1
+
+    monkeypatch.setattr(settings, "IDEMPOTENCY_SQLITE", True)
+    monkeypatch.setattr(settings, "SLOT_ENGINE", True)
+    with pytest.raises(RuntimeError, match="SLOT_ENGINE"):
+        serve.build_config("production", workers=4)
+    assert serve.build_config("production")[0].workers == 1
+
+
+def test_drain_reports_not_ready_before_exiting():
+    config = uvicorn.Config("main:app")
+    server = serve.DrainingServer(config, drain_seconds=0.2)
+    readiness.ready.set()
+    try:
+        server.handle_exit(signal.SIGTERM, None)
+        assert not readiness.ready.is_set()
+        assert not server.should_exit  # still serving while the LB notices
+        time.sleep(0.4)
+        assert server.should_exit
+    finally:
+        readiness.ready.set()
+
+
+def test_second_signal_skips_the_drain():
+    server = serve.DrainingServer(uvicorn.Config("main:app"), drain_seconds=30)
+    try:
+        server.handle_exit(signal.SIGTERM, None)
+        assert not server.should_exit
+        server.handle_exit(signal.SIGTERM, None)
+        assert server.should_exit
+    finally:
+        readiness.ready.set()
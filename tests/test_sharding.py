@@ -0,0 +1,164 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+import changes
+import db
+from main import app
+from models import Match
+from sharding import SHARD_ID_SPAN, shard_of, shards
+from conftest import headers
+
+REGIONS = ["madrid", "barcelona", "valencia"]
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    engines = []
+    for region in REGIONS:
+        engine = create_engine(
+            f"sqlite:///{tmp_path / f'{region}.db'}",
+            connect_args={"check_same_thread": False},
+        )
+        SQLModel.metadata.create_all(engine)
+        engines.append(engine)
+    monkeypatch.setattr(db, "engine", engines[0])
+    shards.configure(REGIONS, engines)
+    changes.reset()
+    with TestClient(app) as c:
+        yield c, engines
+    shards.configure([], [])
+    changes.reset()
+
+
+def create(client, region=None, day="2025-12-01", clock="10:00:00", uid="org1"):
+    payload = {"date": day, "time": clock, "location": "Centro", "max_players": 2}
+    if region is not None:
+        payload["region"] = region
+    r = client.post("/matches", json=payload, headers=headers(uid))
+    assert r.status_code == 201, r.text
+    return r.json()
+
+
+def count(engine):
+    with Session(engine) as s:
+        return len(s.exec(select(Match)).all())
+
+
+def test_match_id_names_its_shard(sharded):
+    client, engines = sharded
+    first = create(client)
+    second = create(client, "valencia")
+    third = create(client, "valencia")
+    assert shard_of(first["id"]) == 0
+    assert second["id"] == 2 * SHARD_ID_SPAN + 1
+    assert third["id"] == second["id"] + 1
+    assert [count(e) for e in engines] == [1, 0, 2]
+
+
+def test_unknown_region_is_rejected(sharded):
+    client, _ = sharded
+    r = client.post(
+        "/matches",
+        json={
+            "date": "2025-12-01",
+            "time": "10:00:00",
+            "location": "Centro",
+            "max_players": 2,
+            "region": "sevilla",
+        },
+        headers=headers("org1"),
+    )
+    assert r.status_code == 400
+
+
+def test_writes_are_routed_by_id(sharded):
+    client, engines = sharded
+    m = create(client, "barcelona")
+    r = client.put(f"/matches/{m['id']}/join", headers=headers("u2"))
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 1
+    r = client.put(f"/matches/{m['id']}/leave", headers=headers("u2"))
+    assert r.json()["joined_players"] == 0
+    assert (
+        client.delete(f"/matches/{m['id']}", headers=headers("org1")).status_code == 204
+    )
+    assert count(engines[1]) == 0
+
+    # Ids outside every shard are simply unknown
+    missing = len(REGIONS) * SHARD_ID_SPAN + 1
+    r = client.put(f"/matches/{missing}/join", headers=headers("u2"))
+    assert r.status_code == 404
+
+
+def test_list_merges_shards_in_date_order(sharded):
+    client, _ = sharded
+    create(client, "valencia", "2025-12-03", "09:00:00")
+    create(client, "madrid", "2025-12-01", "18:00:00")
+    create(client, "barcelona", "2025-12-02", "10:00:00")
+    create(client, "valencia", "2025-12-01", "08:00:00")
+    create(client, "madrid", "2025-12-03", "07:00:00")
+
+    r = client.get("/matches")
+    assert r.status_code == 200
+    got = [(m["date"], m["time"]) for m in r.json()]
+    assert got == sorted(got)
+    assert len(got) == 5
+
+    # The cache follows every shard's version
+    etag = r.headers["etag"]
+    create(client, "barcelona", "2025-12-01", "12:00:00")
+    r = client.get("/matches", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert len(r.json()) == 6
+
+
+def test_summary_adds_up_shards(sharded):
+    client, _ = sharded
+    create(client, "madrid")
+    create(client, "barcelona")
+    create(client, "barcelona", "2025-12-02")
+    r = client.get(
+        "/matches/summary", params={"from": "2025-12-01", "to": "2025-12-07"}
+    )
+    assert [(b["date"], b["matches"], b["open_slots"]) for b in r.json()] == [
+        ("2025-12-01", 2, 4),
+        ("2025-12-02", 1, 2),
+    ]
+
+
+def test_export_covers_every_shard(sharded):
+    client, _ = sharded
+    create(client, "valencia", "2025-12-02")
+    create(client, "madrid", "2025-12-01")
+    r = client.get("/matches/export", params={"format": "csv"})
+    lines = r.text.strip().splitlines()
+    assert lines[0].startswith("date,")
+    assert len(lines) == 3
+    assert "2025-12-01" in lines[1]
+
+
+def test_single_database_features_are_refused(sharded):
+    client, _ = sharded
+    assert client.get("/matches/changes").status_code == 501
+    assert client.get("/matches/recommend", headers=headers()).status_code == 501
+    assert client.get("/series/occurrences").status_code == 501
+
+
+def test_concurrent_creates_in_one_shard_get_distinct_ids(sharded):
+    client, engines = sharded
+    ids = []
+
+    def worker(i):
+        for j in range(5):
+            ids.append(
+                create(client, "barcelona", clock=f"1{j}:00:00", uid=f"o{i}")["id"]
+            )
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 20
+    assert all(shard_of(i) == 1 for i in ids)
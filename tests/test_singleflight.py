@@ -0,0 +1,190 @@
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+import changes
+from db import get_session
+from main import app
+import repository
+import singleflight
+from singleflight import SingleFlight
+from conftest import headers
+
+
+def burst(n, fn):
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def sample(endpoint, role):
+    value = REGISTRY.get_sample_value(
+        "singleflight_calls_total", {"endpoint": endpoint, "role": role}
+    )
+    return value or 0
+
+
+def test_concurrent_callers_share_one_result():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results = burst(10, lambda: flights.do("k", slow, "test"))
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    # Nothing is remembered once the call is over
+    flights.do("k", slow, "test")
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_waiter():
+    flights = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    results = burst(5, lambda: flights.do("k", failing, "test"))
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights._calls == {}
+
+
+def test_followers_stop_waiting_for_a_stuck_leader(monkeypatch):
+    monkeypatch.setattr(singleflight, "WAIT_SECONDS", 0.1)
+    flights = SingleFlight()
+    release = threading.Event()
+    leader = threading.Thread(
+        target=lambda: flights.do("k", lambda: release.wait(5), "test")
+    )
+    leader.start()
+    while not flights._calls:
+        time.sleep(0.01)
+    before = sample("test", "timeout")
+    with pytest.raises(HTTPException) as e:
+        flights.do("k", lambda: None, "test")
+    assert e.value.status_code == 503
+    assert sample("test", "timeout") == before + 1
+    release.set()
+    leader.join()
+
+
+@pytest.fixture
+def threaded_client(tmp_path):
+    # One session per request, as in production: the shared session of the
+    # default client fixture cannot serve concurrent requests
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'burst.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+
+    def override_get_session():
+        with Session(engine) as s:
+            yield s
+
+    app.dependency_overrides[get_session] = override_get_session
+    changes.reset()
+    with TestClient(app) as c:
+        yield c, engine
+    app.dependency_overrides.clear()
+    changes.reset()
+
+
+def test_burst_of_list_requests_runs_one_query(threaded_client, monkeypatch):
+    client, engine = threaded_client
+    for i in range(5):
+        client.post(
+            "/matches",
+            json={
+                "date": "2025-12-01",
+                "time": f"1{i}:00:00",
+                "location": "Retiro",
+                "max_players": 4,
+            },
+            headers=headers("org1"),
+        )
+
+    real = repository.list_match_rows
+
+    def slow_list(session):
+        # Long enough for the whole burst to arrive while the leader runs
+        time.sleep(0.3)
+        return real(session)
+
+    monkeypatch.setattr(repository, "list_match_rows", slow_list)
+    list_queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if 'ORDER BY "match".date' in statement:
+            list_queries.append(statement)
+
+    leaders, followers = sample("/matches", "leader"), sample("/matches", "follower")
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        responses = burst(20, lambda: client.get("/matches"))
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(list_queries) == 1
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.content for r in responses}) == 1
+    assert len(responses[0].json()) == 5
+    # Late arrivals are served by the version cache instead of waiting
+    assert sample("/matches", "leader") - leaders == 1
+    assert sample("/matches", "follower") - followers >= 1
+
+
+def test_keys_include_query_and_version(client):
+    client.post(
+        "/matches",
+        json={
+            "date": "2025-12-01",
+            "time": "10:00:00",
+            "location": "A",
+            "max_players": 2,
+        },
+        headers=headers("org1"),
+    )
+    first = client.get("/matches/changes", params={"since": 0}).json()
+    assert first["version"] == 1
+    r = client.get(
+        "/matches/summary", params={"from": "2025-12-01", "to": "2025-12-01"}
+    )
+    assert r.json()[0]["matches"] == 1
+    # A new version is a new key, not the previous flight's result
+    client.post(
+        "/matches",
+        json={
+            "date": "2025-12-01",
+            "time": "11:00:00",
+            "location": "A",
+            "max_players": 2,
+        },
+        headers=headers("org1"),
+    )
+    r = client.get(
+        "/matches/summary", params={"from": "2025-12-01", "to": "2025-12-01"}
+    )
+    assert r.json()[0]["matches"] == 2
+    assert client.get("/matches/changes", params={"since": 1}).json()["version"] == 2
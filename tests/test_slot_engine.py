@@ -0,0 +1,318 @@
+import json
+import threading
+from datetime import date, time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlmodel import Session, SQLModel, create_engine, select
+import availability
+import changes
+import settings
+import slot_engine
+import users
+from db import get_session
+from main import app
+from models import Match, MatchParticipant, SlotEngineCheckpoint, User
+from conftest import headers
+
+PAYLOAD = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 2,
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A file database: the engine's writer thread needs its own connections
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'slots.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def slots(db, tmp_path):
+    def override_get_session():
+        with Session(db) as s:
+            yield s
+
+    app.dependency_overrides[get_session] = override_get_session
+    changes.reset()
+    slot_engine.engine.start(db, tmp_path / "ops.log")
+    with TestClient(app) as c:
+        yield c
+    slot_engine.engine.stop()
+    app.dependency_overrides.clear()
+    changes.reset()
+
+
+def create(client, **kw):
+    return client.post(
+        "/matches", json={**PAYLOAD, **kw}, headers=headers("org1")
+    ).json()["id"]
+
+
+def test_engine_preserves_join_leave_delete_rules(slots):
+    mid = create(slots)
+    assert slots.put("/matches/999/join", headers=headers("u1")).status_code == 404
+
+    r = slots.put(f"/matches/{mid}/join", headers=headers("u1"))
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 1
+    r = slots.put(f"/matches/{mid}/join", headers=headers("u1"))
+    assert r.json()["detail"] == "You already joined this match"
+    slots.put(f"/matches/{mid}/join", headers=headers("u2"))
+    r = slots.put(f"/matches/{mid}/join", headers=headers("u3"))
+    assert r.json()["detail"] == "Match is full"
+
+    r = slots.put(f"/matches/{mid}/leave", headers=headers("u3"))
+    assert r.json()["detail"] == "You have not joined this match"
+
+    assert slots.delete(f"/matches/{mid}", headers=headers("u1")).status_code == 403
+    assert slots.delete(f"/matches/{mid}", headers=headers("org1")).status_code == 400
+    slots.put(f"/matches/{mid}/leave", headers=headers("u1"))
+    slots.put(f"/matches/{mid}/leave", headers=headers("u2"))
+    assert slots.delete(f"/matches/{mid}", headers=headers("org1")).status_code == 204
+    assert slots.put(f"/matches/{mid}/join", headers=headers("u1")).status_code == 404
+
+
+def test_changes_are_written_behind(slots, db):
+    mid = create(slots)
+    slots.put(f"/matches/{mid}/join", headers=headers("u1", "Ann", "A"))
+    slots.put(f"/matches/{mid}/join", headers=headers("u2"))
+    slots.put(f"/matches/{mid}/leave", headers=headers("u2"))
+    assert slot_engine.engine.flush()
+
+    with Session(db) as s:
+        assert s.get(Match, mid).joined_players == 1
+        rows = s.exec(select(MatchParticipant)).all()
+        assert [(p.user.external_id, p.user.first_name) for p in rows] == [
+            ("u1", "Ann")
+        ]
+        assert s.get(SlotEngineCheckpoint, 1).seq == 3
+        assert availability.verify(s.connection()) == []
+    assert slots.get("/matches").json()[0]["joined_players"] == 1
+
+
+def test_waitlist_promotion_in_engine(slots, db):
+    mid = create(slots, max_players=1)
+    slots.put(f"/matches/{mid}/join", headers=headers("u1"))
+    r = slots.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    assert r.json()["position"] == 1
+    slots.put(f"/matches/{mid}/leave", headers=headers("u1"))
+    assert (
+        slots.get(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code == 404
+    )
+    assert slot_engine.engine.flush()
+    with Session(db) as s:
+        users = [p.user.external_id for p in s.exec(select(MatchParticipant))]
+    assert users == ["w1"]
+
+
+def test_engine_promotion_passes_over_a_clashing_user(slots, db, monkeypatch):
+    monkeypatch.setattr(settings, "CONFLICT_CHECK", True)
+    mid = create(slots, max_players=1)
+    slots.put(f"/matches/{mid}/join", headers=headers("u1"))
+    slots.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    slots.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    other = create(slots, time="18:30:00")
+    slots.put(f"/matches/{other}/join", headers=headers("w1"))
+    assert slot_engine.engine.flush()
+
+    slots.put(f"/matches/{mid}/leave", headers=headers("u1"))
+    r = slots.get(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    assert r.json()["position"] == 1
+    assert slot_engine.engine.flush()
+    with Session(db) as s:
+        booked = s.exec(
+            select(MatchParticipant).where(MatchParticipant.match_id == mid)
+        ).all()
+        assert [p.user.external_id for p in booked] == ["w2"]
+
+
+def test_concurrent_joins_never_overfill(slots, db):
+    mid = create(slots, max_players=10)
+    statuses = []
+
+    def join(i):
+        statuses.append(
+            slots.put(f"/matches/{mid}/join", headers=headers(f"u{i}")).status_code
+        )
+
+    threads = [threading.Thread(target=join, args=(i,)) for i in range(30)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses.count(200) == 10
+    assert slot_engine.engine.flush()
+    with Session(db) as s:
+        assert s.get(Match, mid).joined_players == 10
+        assert len(s.exec(select(MatchParticipant)).all()) == 10
+
+
+def test_replay_applies_unapplied_log_on_start(db, tmp_path):
+    with Session(db) as s:
+        m = Match(
+            date=date(2025, 12, 1),
+            time=time(18, 0),
+            location="Retiro",
+            max_players=2,
+            organizer=User(external_id="org1", first_name="A", last_name="B"),
+        )
+        s.add(m)
+        s.commit()
+        mid = m.id
+        u1, u2 = (users.ensure(s, uid, "F", "L") for uid in ("u1", "u2"))
+        s.commit()
+    log = tmp_path / "ops.log"
+    ops = [
+        {"seq": 1, "op": "join", "match_id": mid, "user_id": u1, "joined_players": 1},
+        {"seq": 2, "op": "join", "match_id": mid, "user_id": u2, "joined_players": 2},
+    ]
+    # The last line was torn by the crash and never acknowledged
+    log.write_text("".join(json.dumps(op) + "\n" for op in ops) + '{"seq": 3, "op"')
+
+    engine = slot_engine.SlotEngine()
+    engine.start(db, log)
+    try:
+        with Session(db) as s:
+            assert s.get(Match, mid).joined_players == 2
+            assert s.get(SlotEngineCheckpoint, 1).seq == 2
+            u1 = users.lookup(s, "u1")
+            participants = s.exec(select(MatchParticipant.user_id)).all()
+        assert u1 in participants and len(participants) == 2
+        assert log.read_text() == ""
+        # New ops continue the sequence
+        engine.leave(mid, u1)
+        assert engine.flush()
+        with Session(db) as s:
+            assert s.get(SlotEngineCheckpoint, 1).seq == 3
+    finally:
+        engine.stop()
+
+
+def test_occurrence_edit_goes_through_engine(slots, db):
+    series = {
+        "start_date": "2025-12-01",
+        "time": "19:00:00",
+        "location": "Retiro",
+        "max_players": 3,
+    }
+    sid = slots.post("/series", json=series, headers=headers("org1")).json()["id"]
+    url = f"/series/{sid}/occurrences/2025-12-08"
+    mid = slots.put(f"{url}/join", headers=headers("u1")).json()["id"]
+    slots.put(f"{url}/join", headers=headers("u2"))
+    r = slots.patch(url, json={"max_players": 1}, headers=headers("org1"))
+    assert r.status_code == 400
+    r = slots.patch(
+        url, json={"max_players": 2, "time": "20:00:00"}, headers=headers("org1")
+    )
+    assert r.json()["max_players"] == 2
+    # The engine enforces the new size right away
+    r = slots.put(f"/matches/{mid}/join", headers=headers("u3"))
+    assert r.json()["detail"] == "Match is full"
+    assert slot_engine.engine.flush()
+    with Session(db) as s:
+        m = s.get(Match, mid)
+        assert (m.max_players, str(m.time)) == (2, "20:00:00")
+        starts = {str(p.starts_at) for p in s.exec(select(MatchParticipant))}
+        assert starts == {"2025-12-08 20:00:00"}
+        assert availability.verify(s.connection()) == []
+
+
+def test_ops_the_database_refuses_are_kept(slots, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(slot_engine, "APPLY_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(slot_engine, "LOAD_FLUSH_TIMEOUT", 0.1)
+    first = create(slots)
+    second = create(slots, time="20:00:00")
+    slots.put(f"/matches/{first}/join", headers=headers("u0"))
+    assert slot_engine.engine.flush()
+    apply_ops = slot_engine.apply_ops
+
+    def refuse(bind, ops, seq=None):
+        raise OperationalError("UPDATE match", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(slot_engine, "apply_ops", refuse)
+    r = slots.put(f"/matches/{first}/join", headers=headers("u1"))
+    assert r.status_code == 200
+    assert not slot_engine.engine.flush(timeout=0.2)
+    assert not slot_engine.engine.healthy
+    assert slots.get("/ready").status_code == 503
+    # A match not in memory cannot be read from the stale database
+    r = slots.put(f"/matches/{second}/join", headers=headers("u1"))
+    assert r.status_code == 503
+    with Session(db) as s:
+        assert s.get(SlotEngineCheckpoint, 1).seq == 1
+    assert '"user_id"' in (tmp_path / "ops.log").read_text().splitlines()[-1]
+
+    monkeypatch.setattr(slot_engine, "apply_ops", apply_ops)
+    assert slot_engine.engine.flush()
+    assert slot_engine.engine.healthy
+    assert slots.get("/ready").status_code == 200
+    with Session(db) as s:
+        assert s.get(Match, first).joined_players == 2
+        assert s.get(SlotEngineCheckpoint, 1).seq == 2
+
+
+def test_op_refused_for_good_is_dead_lettered(slots, db, tmp_path, monkeypatch):
+    mid = create(slots, max_players=3)
+    apply = slot_engine._apply
+
+    def refuse_u1(session, op):
+        if op.get("user_id") == users.lookup(session, "u1"):
+            raise IntegrityError("INSERT INTO matchparticipant", {}, Exception())
+        apply(session, op)
+
+    monkeypatch.setattr(slot_engine, "_apply", refuse_u1)
+    for uid in ("u1", "u2"):
+        assert (
+            slots.put(f"/matches/{mid}/join", headers=headers(uid)).status_code == 200
+        )
+    assert slot_engine.engine.flush()
+    assert slot_engine.engine.healthy
+    with Session(db) as s:
+        joined = [p.user.external_id for p in s.exec(select(MatchParticipant))]
+        assert joined == ["u2"]
+        assert s.get(SlotEngineCheckpoint, 1).seq == 2
+    dead = [json.loads(line) for line in open(tmp_path / "ops.log.dead")]
+    assert [d["op"]["seq"] for d in dead] == [1]
+    assert "IntegrityError" in dead[0]["error"]
+
+
+def test_replay_skips_a_malformed_op(db, tmp_path):
+    with Session(db) as s:
+        m = Match(
+            date=date(2025, 12, 1),
+            time=time(18, 0),
+            location="Retiro",
+            max_players=2,
+            organizer=User(external_id="org1", first_name="A", last_name="B"),
+        )
+        s.add(m)
+        s.commit()
+        mid = m.id
+        uid = users.ensure(s, "u1", "F", "L")
+        s.commit()
+    log = tmp_path / "ops.log"
+    ops = [
+        # Written by a buggy build: no joined_players
+        {"seq": 1, "op": "join", "match_id": mid, "user_id": uid},
+        {"seq": 2, "op": "waitlist_add", "match_id": mid, "user_id": uid},
+    ]
+    log.write_text("".join(json.dumps(op) + "\n" for op in ops))
+
+    engine = slot_engine.SlotEngine()
+    engine.start(db, log)
+    try:
+        with Session(db) as s:
+            assert s.get(SlotEngineCheckpoint, 1).seq == 2
+            assert s.exec(select(MatchParticipant)).all() == []
+        dead = (tmp_path / "ops.log.dead").read_text().splitlines()
+        assert [json.loads(line)["op"]["seq"] for line in dead] == [1]
+    finally:
+        engine.stop()
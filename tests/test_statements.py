@@ -0,0 +1,38 @@
+from prometheus_client import REGISTRY
+from conftest import headers
+
+
+def cache_count(result):
+    return (
+        REGISTRY.get_sample_value("sqlalchemy_compiled_cache_total", {"result": result})
+        or 0
+    )
+
+
+def test_hot_statements_hit_compiled_cache(client):
+    payload = {
+        "date": "2025-12-01",
+        "time": "18:00:00",
+        "location": "Park",
+        "max_players": 50,
+    }
+    mid = client.post("/matches", json=payload, headers=headers("org1")).json()["id"]
+    # Warm up every statement once
+    client.put(f"/matches/{mid}/join", headers=headers("warm"))
+    client.put(f"/matches/{mid}/leave", headers=headers("warm"))
+    client.get("/matches")
+
+    misses = cache_count("miss")
+    hits = cache_count("hit")
+    for i in range(10):
+        client.put(f"/matches/{mid}/join", headers=headers(f"u{i}"))
+        client.put(f"/matches/{mid}/leave", headers=headers(f"u{i}"))
+    client.get("/matches")
+
+    assert cache_count("miss") == misses
+    assert cache_count("hit") > hits
+
+
+def test_cache_stats_are_exported(client):
+    client.get("/matches")
+    assert "sqlalchemy_compiled_cache_total" in client.get("/metrics").text
@@ -0,0 +1,162 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import select
+from conftest import headers
+from migrations import migrate
+from models import MatchParticipant, User
+import users
+
+MATCH = {
+    "date": "2025-12-01",
+    "time": "18:00:00",
+    "location": "Retiro",
+    "max_players": 1,
+}
+
+# Tables as they were while users were identified by their header strings
+OLD_SCHEMA = [
+    """CREATE TABLE match (
+        date DATE NOT NULL, time TIME NOT NULL, location VARCHAR NOT NULL,
+        max_players INTEGER NOT NULL, joined_players INTEGER NOT NULL,
+        id INTEGER NOT NULL, organizer_user_id VARCHAR NOT NULL,
+        organizer_first_name VARCHAR NOT NULL,
+        organizer_last_name VARCHAR NOT NULL, version INTEGER,
+        PRIMARY KEY (id))""",
+    "CREATE INDEX ix_match_version ON match (version)",
+    """CREATE TABLE matchparticipant (
+        id INTEGER NOT NULL, match_id INTEGER NOT NULL,
+        user_id VARCHAR NOT NULL, first_name VARCHAR NOT NULL,
+        last_name VARCHAR NOT NULL, starts_at DATETIME, ends_at DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT uix_match_user UNIQUE (match_id, user_id),
+        FOREIGN KEY(match_id) REFERENCES match (id))""",
+    "CREATE INDEX ix_participant_user_span ON matchparticipant (user_id, starts_at)",
+    """CREATE TABLE matchwaitlist (
+        id INTEGER NOT NULL, match_id INTEGER NOT NULL,
+        user_id VARCHAR NOT NULL, first_name VARCHAR NOT NULL,
+        last_name VARCHAR NOT NULL, PRIMARY KEY (id),
+        CONSTRAINT uix_waitlist_match_user UNIQUE (match_id, user_id),
+        FOREIGN KEY(match_id) REFERENCES match (id))""",
+]
+
+
+def old_database(path, matches=1, players=3):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for stmt in OLD_SCHEMA:
+            conn.execute(text(stmt))
+        conn.execute(
+            text(
+                "INSERT INTO match VALUES ('2025-12-01', '18:00:00.000000', 'Retiro',"
+                " :n, :n, :id, 'org', 'Olga', 'Ruiz', 4)"
+            ),
+            [{"id": m + 1, "n": players} for m in range(matches)],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO matchparticipant (match_id, user_id, first_name,"
+                " last_name, starts_at, ends_at) VALUES (:mid, :uid, 'Pat', :last,"
+                " '2025-12-01 18:00:00.000000', '2025-12-01 19:30:00.000000')"
+            ),
+            [
+                {
+                    "mid": m + 1,
+                    "uid": f"{i:08d}-7c1e-4b2a-9f0d-5e6a7b8c9d0e",
+                    "last": f"Player {i}",
+                }
+                for m in range(matches)
+                for i in range(players)
+            ],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO matchwaitlist (match_id, user_id, first_name, last_name)"
+                " VALUES (1, 'org', 'Olga', 'Ruiz'), (1, 'w1', 'Wen', 'Li')"
+            )
+        )
+    return engine
+
+
+def bytes_used(engine, names):
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT name, sum(pgsize) FROM dbstat GROUP BY name"))
+        return sum(size for name, size in rows if name in names)
+
+
+def test_users_are_upserted_from_identity_headers(client, session):
+    mid = client.post("/matches", json=MATCH, headers=headers("org1")).json()["id"]
+    client.put(f"/matches/{mid}/join", headers=headers("u1", "Ann", "Lee"))
+    client.put(f"/matches/{mid}/waitlist", headers=headers("u2"))
+    client.put(f"/matches/{mid}/join", headers=headers("u1", "Ann", "Lee"))
+
+    rows = session.exec(select(User.external_id, User.first_name)).all()
+    assert sorted(rows) == [("org1", "John"), ("u1", "Ann"), ("u2", "John")]
+    participant = session.exec(select(MatchParticipant)).one()
+    assert participant.user_id == users.lookup(session, "u1")
+
+
+def test_renamed_user_shows_everywhere(client):
+    mid = client.post("/matches", json=MATCH, headers=headers("org1")).json()["id"]
+    client.put(f"/matches/{mid}/join", headers=headers("org1", "Johnny", "Doe"))
+    m = client.get("/matches").json()[0]
+    assert (m["organizer_user_id"], m["organizer_first_name"]) == ("org1", "Johnny")
+
+
+def test_reads_do_not_create_users(client, session):
+    mid = client.post("/matches", json=MATCH, headers=headers("org1")).json()["id"]
+    r = client.get(f"/matches/{mid}/waitlist", headers=headers("stranger"))
+    assert r.status_code == 404
+    r = client.get("/matches/recommend", headers=headers("stranger"))
+    assert r.status_code == 200
+    assert users.lookup(session, "stranger") is None
+
+
+def test_migration_moves_users_to_their_table(tmp_path):
+    engine = old_database(tmp_path / "old.db")
+    migrate(engine)
+    migrate(engine)  # idempotent
+
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("matchparticipant")}
+    assert "first_name" not in columns
+    assert "ix_participant_user_span" in {
+        i["name"] for i in inspector.get_indexes("matchparticipant")
+    }
+    with engine.connect() as conn:
+        organizer = conn.execute(
+            text(
+                'SELECT u.external_id, u.first_name, m.version FROM match m JOIN "user" u'
+                " ON u.id = m.organizer_id"
+            )
+        ).one()
+        waitlist = conn.execute(
+            text(
+                'SELECT u.external_id FROM matchwaitlist w JOIN "user" u'
+                " ON u.id = w.user_id ORDER BY w.id"
+            )
+        ).all()
+        players = conn.execute(
+            text(
+                'SELECT count(*) FROM matchparticipant p JOIN "user" u'
+                " ON u.id = p.user_id WHERE p.starts_at IS NOT NULL"
+            )
+        ).scalar()
+        user_count = conn.execute(text('SELECT count(*) FROM "user"')).scalar()
+    assert tuple(organizer) == ("org", "Olga", 4)
+    assert [w[0] for w in waitlist] == ["org", "w1"]
+    assert players == 3
+    assert user_count == 5
+
+
+def test_integer_keys_shrink_participations(tmp_path):
+    # 100 regulars, 50 matches each: the header strings were stored 5000 times
+    engine = old_database(tmp_path / "old.db", matches=50, players=100)
+    indexes = {"sqlite_autoindex_matchparticipant_1", "ix_participant_user_span"}
+    participants = {"matchparticipant", *indexes}
+    before = bytes_used(engine, participants)
+    before_indexes = bytes_used(engine, indexes)
+    migrate(engine)
+    after = bytes_used(engine, participants)
+    assert after < before / 2
+    assert bytes_used(engine, indexes) < before_indexes / 2
+    # The strings now live once per user
+    assert after + bytes_used(engine, {"user", "sqlite_autoindex_user_1"}) < before
@@ -0,0 +1,172 @@
+from conftest import headers
+
+
+def full_match(client, max_players=1):
+    payload = {
+        "date": "2025-12-01",
+        "time": "18:00:00",
+        "location": "Retiro",
+        "max_players": max_players,
+    }
+    mid = client.post("/matches", json=payload, headers=headers("org1")).json()["id"]
+    for i in range(max_players):
+        assert (
+            client.put(f"/matches/{mid}/join", headers=headers(f"p{i}")).status_code
+            == 200
+        )
+    return mid
+
+
+def test_waitlist_positions(client):
+    mid = full_match(client)
+    r1 = client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    r2 = client.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    assert r1.json() == {"match_id": mid, "position": 1}
+    assert r2.json()["position"] == 2
+    # Queuing again keeps the original place
+    assert (
+        client.put(f"/matches/{mid}/waitlist", headers=headers("w1")).json()["position"]
+        == 1
+    )
+    r = client.get(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    assert r.json()["position"] == 2
+
+
+def test_leave_promotes_head_of_queue(client):
+    mid = full_match(client)
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w1", "Wendy", "One"))
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+
+    r = client.put(f"/matches/{mid}/leave", headers=headers("p0"))
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 1
+
+    # w1 now holds the slot, w2 moved up
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code == 404
+    )
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w2")).json()["position"]
+        == 1
+    )
+    assert client.put(f"/matches/{mid}/leave", headers=headers("w1")).status_code == 200
+
+
+def test_leave_without_waitlist_frees_slot(client):
+    mid = full_match(client)
+    r = client.put(f"/matches/{mid}/leave", headers=headers("p0"))
+    assert r.json()["joined_players"] == 0
+
+
+def test_waitlist_rejections(client):
+    assert client.put("/matches/999/waitlist", headers=headers("w1")).status_code == 404
+    mid = full_match(client, max_players=2)
+    client.put(f"/matches/{mid}/leave", headers=headers("p1"))
+    r = client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Match has free slots, join it directly"
+    r = client.put(f"/matches/{mid}/waitlist", headers=headers("p0"))
+    assert r.json()["detail"] == "You already joined this match"
+
+
+def test_leave_waitlist(client):
+    mid = full_match(client)
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    assert (
+        client.delete(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code
+        == 204
+    )
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w2")).json()["position"]
+        == 1
+    )
+    assert (
+        client.delete(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code
+        == 404
+    )
+
+
+def test_joining_directly_leaves_the_waitlist(client):
+    series = {
+        "start_date": "2025-12-01",
+        "time": "18:00:00",
+        "location": "Retiro",
+        "max_players": 1,
+    }
+    sid = client.post("/series", json=series, headers=headers("org1")).json()["id"]
+    url = f"/series/{sid}/occurrences/2025-12-08"
+    mid = client.put(f"{url}/join", headers=headers("p1")).json()["id"]
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    client.patch(url, json={"max_players": 3}, headers=headers("org1"))
+
+    assert client.put(f"/matches/{mid}/join", headers=headers("w1")).status_code == 200
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code == 404
+    )
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w2")).json()["position"]
+        == 1
+    )
+    # p1's slot goes to w2, not to w1 a second time
+    r = client.put(f"/matches/{mid}/leave", headers=headers("p1"))
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 2
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w2")).status_code == 404
+    )
+
+
+def test_promotion_skips_stale_entries_of_participants(client, session):
+    from models import MatchWaitlist
+    import users
+
+    mid = full_match(client, max_players=2)
+    # An entry left behind by an older version that never removed it
+    session.add(MatchWaitlist(match_id=mid, user_id=users.lookup(session, "p1")))
+    session.commit()
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    r = client.put(f"/matches/{mid}/leave", headers=headers("p0"))
+    assert r.status_code == 200
+    assert r.json()["joined_players"] == 2
+    assert (
+        client.get(f"/matches/{mid}/waitlist", headers=headers("w1")).status_code == 404
+    )
+
+
+def test_promotion_passes_over_a_clashing_user(client, monkeypatch):
+    import settings
+
+    monkeypatch.setattr(settings, "CONFLICT_CHECK", True)
+    mid = full_match(client)
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    client.put(f"/matches/{mid}/waitlist", headers=headers("w2"))
+    # w1 has since joined a match overlapping this one
+    other = {
+        "date": "2025-12-01",
+        "time": "18:30:00",
+        "location": "Vallecas",
+        "max_players": 2,
+    }
+    oid = client.post("/matches", json=other, headers=headers("org2")).json()["id"]
+    client.put(f"/matches/{oid}/join", headers=headers("w1"))
+
+    assert client.put(f"/matches/{mid}/leave", headers=headers("p0")).status_code == 200
+    assert client.put(f"/matches/{mid}/leave", headers=headers("w2")).status_code == 200
+    # Still queued; no free slot either, as w2's went back unclaimed
+    r = client.get(f"/matches/{mid}/waitlist", headers=headers("w1"))
+    assert r.json()["position"] == 1
+    assert client.get(f"/matches/{mid}").json()["joined_players"] == 0
+
+
+def test_waitlist_lookups_use_index(session):
+    from sqlalchemy import text
+
+    plan = session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT id FROM matchwaitlist "
+            "WHERE match_id = 1 ORDER BY id LIMIT 1"
+        )
+    ).all()
+    assert "ix_waitlist_match_position" in " ".join(str(r) for r in plan)
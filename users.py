@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+from changes import subscribe
+import settings
+import statements
+
+# Requests name the caller by the X-User-Id header; tables refer to people by
+# the integer User.id. The mapping never changes once a row exists, so it is
+# kept in a bounded LRU per database (the key includes the session's bind,
+# since every shard numbers its users separately). The names are kept next
+# to the id so a renamed user is noticed and written back.
+
+_cache = OrderedDict()  # (bind, external_id) -> (id, first_name, last_name)
+_lock = threading.Lock()
+
+
+def _cached(key):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+        return entry
+
+
+def _remember(key, entry):
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > settings.USER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def ensure(
+    session, external_id: str, first_name: str, last_name: str, rename=True
+) -> int:
+    """User.id for the identity, creating or renaming the row if needed.
+
+    rename=False only uses the names for a new row, for callers holding a
+    copy that may be older than the row. A write is committed right away,
+    so call this before the request changes anything else: the row then
+    outlives a request that fails, and the slot engine's own transactions
+    can refer to it.
+    """
+    key = (session.get_bind(), external_id)
+    names = (first_name, last_name)
+    entry = _cached(key)
+    if entry is not None and (entry[1:] == names or not rename):
+        return entry[0]
+    conn = session.connection()
+    row = conn.execute(statements.USER_BY_EXTERNAL_ID, {"external": external_id})
+    row = row.first()
+    if row is None or (rename and tuple(row[1:]) != names):
+        params = {"external": external_id, "first": first_name, "last": last_name}
+        user_pk = conn.execute(statements.UPSERT_USER, params).scalar_one()
+        session.commit()
+        row = (user_pk, *names)
+    _remember(key, tuple(row))
+    return row[0]
+
+
+def lookup(session, external_id: str) -> Optional[int]:
+    """User.id for the identity without writing; None for a stranger."""
+    key = (session.get_bind(), external_id)
+    entry = _cached(key)
+    if entry is None:
+        row = session.connection().execute(
+            statements.USER_BY_EXTERNAL_ID, {"external": external_id}
+        )
+        row = row.first()
+        if row is None:
+            return None
+        entry = tuple(row)
+        _remember(key, entry)
+    return entry[0]
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+@subscribe
+def _on_change(change):
+    if change.kind == "reset":
+        clear()